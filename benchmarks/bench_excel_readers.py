@@ -0,0 +1,100 @@
+# === Benchmark - Backends de lecture Excel (conversion Excel ➔ CSV) ===
+# Ce script génère un classeur synthétique (1M lignes par défaut, au format du
+# fichier web : numériques, textes, dates, lignes et colonnes vides), puis mesure
+# le temps de conversion de chaque backend disponible et du chemin historique
+# pandas (read_excel + dropna + to_csv).
+#
+# Usage : python benchmarks/bench_excel_readers.py [--rows 1000000] [--workdir /tmp/bench_excel]
+
+import sys
+import time
+import argparse
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from excel_readers import available_readers, convert_excel_to_csv  # noqa: E402
+
+# ==============================================================================
+# 🏗️ Génération du classeur synthétique
+# ==============================================================================
+def generate_workbook(path: Path, nb_rows: int):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["sku", "virtual", "average_rating", "total_sales", "tax_class",
+               "post_date", "post_title", "post_status"])
+    start = datetime(2018, 1, 1)
+    for i in range(nb_rows):
+        if i % 100 == 99:
+            ws.append([None] * 8)  # Ligne vide
+            continue
+        ws.append([
+            10000 + i,
+            0,
+            round((i % 50) / 10, 1),
+            None if i % 7 == 0 else i % 30,
+            None,  # Colonne entièrement vide
+            start + timedelta(minutes=i),
+            f"Vin de test numéro {i}",
+            "publish",
+        ])
+    wb.save(path)
+
+# ==============================================================================
+# ⏱️ Mesures
+# ==============================================================================
+def convert_with_pandas(excel_path: Path, csv_path: Path) -> int:
+    df = pd.read_excel(excel_path)
+    df = df.dropna(how="all", axis=0).dropna(how="all", axis=1)
+    df.to_csv(csv_path, index=False)
+    return len(df)
+
+
+def _timed(func, *args) -> tuple:
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result, elapsed, peak_kb * 1024
+
+
+def measure(func, *args) -> tuple:
+    """Exécute la mesure dans un processus dédié pour isoler le pic mémoire (RSS)."""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_timed, func, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des backends de lecture Excel")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workdir", type=Path, default=Path("/tmp/bench_excel"))
+    parser.add_argument("--skip-pandas", action="store_true", help="Ignore le chemin pandas historique")
+    args = parser.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    excel_path = args.workdir / f"synthetic_{args.rows}.xlsx"
+    if not excel_path.exists():
+        print(f"Génération de {excel_path} ({args.rows} lignes)...")
+        generate_workbook(excel_path, args.rows)
+    print(f"Classeur : {excel_path} ({excel_path.stat().st_size / (1024 * 1024):.1f} Mo)\n")
+
+    results = []
+    for reader in available_readers():
+        stats, elapsed, peak = measure(convert_excel_to_csv, excel_path, args.workdir / f"{reader}.csv", reader)
+        results.append((reader, stats["rows"], elapsed, peak))
+    if not args.skip_pandas:
+        rows, elapsed, peak = measure(convert_with_pandas, excel_path, args.workdir / "pandas.csv")
+        results.append(("pandas (historique)", rows, elapsed, peak))
+
+    print(f"{'backend':<22}{'lignes':>10}{'durée (s)':>12}{'lignes/s':>12}{'pic RSS (Mo)':>15}")
+    for name, rows, elapsed, peak in results:
+        print(f"{name:<22}{rows:>10}{elapsed:>12.2f}{rows / elapsed:>12.0f}{peak / (1024 * 1024):>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# === Benchmark - Transferts S3/MinIO (multipart, plages parallèles, concurrence) ===
+# Ce script mesure le débit (Mo/s) des uploads et des téléchargements de storage.py
+# pour plusieurs réglages : taille de part, threads par fichier et fichiers en parallèle.
+# Sans --endpoint, un serveur S3 local moto est démarré (pip install "moto[server]") ;
+# sinon, le MinIO indiqué est utilisé (identifiants MINIO_ACCESS_KEY / MINIO_SECRET_KEY).
+#
+# Usage : python benchmarks/bench_s3_transfers.py [--files 6] [--size-mb 64] [--endpoint http://localhost:9000]
+
+import os
+import sys
+import time
+import argparse
+import itertools
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+MB = 1024 * 1024
+
+# Réglages comparés : (taille de part en Mo, threads par fichier, fichiers en parallèle)
+SETTINGS = list(itertools.product([8, 32], [1, 8], [1, 4]))
+
+
+def start_local_server() -> tuple:
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+
+def generate_files(workdir: Path, nb_files: int, size_mb: int) -> list:
+    workdir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(nb_files):
+        path = workdir / f"bench_{size_mb}mb_{i}.bin"
+        if not path.exists() or path.stat().st_size != size_mb * MB:
+            with open(path, "wb") as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(MB))
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des transferts S3/MinIO")
+    parser.add_argument("--files", type=int, default=6)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--endpoint", default=None, help="Endpoint MinIO (défaut : serveur moto local)")
+    parser.add_argument("--bucket", default="bottleneck-bench")
+    parser.add_argument("--workdir", type=Path, default=Path("/tmp/bench_s3"))
+    args = parser.parse_args()
+
+    server = None
+    if args.endpoint is None:
+        server, args.endpoint = start_local_server()
+        os.environ.setdefault("MINIO_ACCESS_KEY", "bench")
+        os.environ.setdefault("MINIO_SECRET_KEY", "bench")
+    os.environ["MINIO_ENDPOINT"] = args.endpoint
+
+    # Import après la configuration de l'environnement (lue au chargement du module)
+    import storage
+
+    try:
+        storage.ensure_bucket(args.bucket, create=True)
+        paths = generate_files(args.workdir, args.files, args.size_mb)
+        total_mb = args.files * args.size_mb
+        print(f"Endpoint : {args.endpoint} - {args.files} fichiers x {args.size_mb} Mo\n")
+        print("Uploads")
+        print(f"{'part (Mo)':>10}{'threads/fichier':>17}{'fichiers //':>13}{'durée (s)':>11}{'Mo/s':>9}")
+
+        for chunk_mb, concurrency, workers in SETTINGS:
+            config = storage.transfer_config(
+                threshold=chunk_mb * MB, chunksize=chunk_mb * MB, max_concurrency=concurrency,
+            )
+            items = [(path, f"bench/{path.name}") for path in paths]
+            started = time.perf_counter()
+            results = storage.upload_files(items, args.bucket, workers=workers, config=config,
+                                           skip_unchanged=False)
+            elapsed = time.perf_counter() - started
+
+            errors = [error for _, _, _, error in results if error]
+            if errors:
+                print(f"{chunk_mb:>10}{concurrency:>17}{workers:>13}   échec : {errors[0]}")
+                continue
+            print(f"{chunk_mb:>10}{concurrency:>17}{workers:>13}{elapsed:>11.2f}{total_mb / elapsed:>9.1f}")
+
+        print("\nTéléchargements (sans cache local)")
+        print(f"{'part (Mo)':>10}{'threads/fichier':>17}{'fichiers //':>13}{'durée (s)':>11}{'Mo/s':>9}")
+        for chunk_mb, concurrency, workers in SETTINGS:
+            storage.S3_DOWNLOAD_PART_SIZE = chunk_mb * MB
+            storage.S3_DOWNLOAD_CONCURRENCY = concurrency
+            items = [(f"bench/{path.name}", path.with_suffix(".out")) for path in paths]
+            started = time.perf_counter()
+            results = storage.download_files(items, args.bucket, workers=workers, use_cache=False)
+            elapsed = time.perf_counter() - started
+
+            errors = [error for _, _, error in results if error]
+            if errors:
+                print(f"{chunk_mb:>10}{concurrency:>17}{workers:>13}   échec : {errors[0]}")
+                continue
+            print(f"{chunk_mb:>10}{concurrency:>17}{workers:>13}{elapsed:>11.2f}{total_mb / elapsed:>9.1f}")
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -25,10 +25,11 @@ with DAG(
     tags=['bottleneck', 'pipeline', 'airflow'],
 ) as dag:
 
-    # 📦 Téléchargement des données
+    # 📦 Téléchargement des données (code 99 = source inchangée -> tâches suivantes ignorées)
     telechargement_donnees = BashOperator(
         task_id='telechargement_donnees',
         bash_command='python /opt/airflow/scripts/00_download_and_extract.py',
+        skip_on_exit_code=99,
     )
 
     # 📄 Conversion Excel -> CSV
@@ -49,6 +50,12 @@ with DAG(
         bash_command='python /opt/airflow/scripts/03_verify_upload.py',
     )
 
+    # 🦆 Lecture directe des fichiers bruts dans MinIO (ignoré sans S3_DIRECT_READ=1)
+    test_lecture_s3 = BashOperator(
+        task_id='test_lecture_directe_s3',
+        bash_command='python /opt/airflow/tests/test_05_s3_direct_read.py',
+    )
+
     # 🧹 Nettoyage des données
     nettoyage_donnees = BashOperator(
         task_id='nettoyage_donnees',
@@ -85,7 +92,11 @@ with DAG(
             task_id='test_08_aucun_doublon',
             bash_command='python /opt/airflow/tests/test_08_doublons.py',
         )
-        dedoublonnage >> [test_dedoublonnage, test_08_doublons]
+        test_08_diff = BashOperator(
+            task_id='test_08_diff',
+            bash_command='python /opt/airflow/tests/test_08_diff.py',
+        )
+        dedoublonnage >> [test_dedoublonnage, test_08_doublons, test_08_diff]
 
     # 🔗 Fusion
     with TaskGroup('fusion_group', tooltip="Fusion + tests") as fusion_group:
@@ -100,10 +111,20 @@ with DAG(
         fusion >> tests_fusion
 
     # 💾 Snapshot de la base
-    snapshot_base = BashOperator(
-        task_id='snapshot_base',
-        bash_command='python /opt/airflow/scripts/10_create_snapshot.py',
-    )
+    with TaskGroup('snapshot_group', tooltip="Snapshot incrémental DuckDB") as snapshot_group:
+        snapshot_base = BashOperator(
+            task_id='snapshot_base',
+            bash_command='python /opt/airflow/scripts/10_create_snapshot.py',
+        )
+        tests_snapshot = BashOperator(
+            task_id='tests_snapshot',
+            bash_command='python /opt/airflow/tests/test_10_snapshot.py',
+        )
+        tests_fast_copy = BashOperator(
+            task_id='tests_fast_copy',
+            bash_command='python /opt/airflow/tests/test_10_fast_copy.py',
+        )
+        snapshot_base >> [tests_snapshot, tests_fast_copy]
 
     # ✨ Calcul CA & Z-score parallèle
     with TaskGroup('calculs_parallel', tooltip="CA et Z-score") as calculs_parallel:
@@ -127,7 +148,15 @@ with DAG(
                 task_id='test_zscore',
                 bash_command='python /opt/airflow/tests/test_12_validate_zscore.py',
             )
-            calcul_zscore >> test_zscore
+            test_outliers = BashOperator(
+                task_id='test_outliers',
+                bash_command='python /opt/airflow/tests/test_12_validate_outliers.py',
+            )
+            test_streaming = BashOperator(
+                task_id='test_streaming_stats',
+                bash_command='python /opt/airflow/tests/test_12_streaming_stats.py',
+            )
+            calcul_zscore >> [test_zscore, test_outliers, test_streaming]
 
     # 📈 Rapport final
     rapport_final = BashOperator(
@@ -135,6 +164,12 @@ with DAG(
         bash_command='python /opt/airflow/scripts/13_generate_final_report.py',
     )
 
+    # 🔐 Validation du manifeste de l'archive (uniquement si tout le DAG a réussi)
+    validation_manifeste = BashOperator(
+        task_id='validation_manifeste',
+        bash_command='python /opt/airflow/scripts/00_download_and_extract.py --commit-manifest',
+    )
+
     # ☁️ Upload des logs
     upload_logs_final = BashOperator(
         task_id='upload_logs_final',
@@ -150,13 +185,15 @@ with DAG(
         >> conversion_excel_csv
         >> upload_csv_bruts
         >> verification_upload
+        >> test_lecture_s3
         >> nettoyage_donnees
         >> [test_nettoyage, test_nulls]
         >> upload_clean
         >> dedoublonnage_group
         >> fusion_group
-        >> snapshot_base
+        >> snapshot_group
         >> calculs_parallel
         >> rapport_final
+        >> validation_manifeste
         >> upload_logs_final
     )
@@ -1,15 +1,26 @@
 # === Script 00 - Téléchargement et extraction ZIP (Airflow-compatible) ===
-# Ce script télécharge une archive ZIP depuis une URL,
-# extrait les fichiers Excel dans 'data/inputs/', les renomme de manière sécurisée
-# (ASCII-safe), puis vérifie leur présence pour garantir la suite du pipeline.
+# Ce script télécharge une archive ZIP depuis une URL (en streaming, avec reprise
+# via HTTP Range + If-Range), extrait les fichiers Excel dans 'data/inputs/', les renomme de
+# manière sécurisée (ASCII-safe), puis vérifie leur présence pour garantir la suite du pipeline.
+# Si la source n'a pas changé (GET conditionnel ETag/Last-Modified ou empreintes
+# SHA-256 identiques), le script s'arrête avec le code 99 : Airflow marque alors
+# la tâche comme "skipped" et les tâches en aval ne sont pas rejouées.
+# La comparaison se fait avec le manifeste de la dernière exécution réussie : celui
+# d'une nouvelle archive reste en attente jusqu'à la dernière tâche du DAG, qui le
+# valide (--commit-manifest). Un échec en aval n'empêche donc pas la reprise suivante.
 
 import os
 import sys
 import re
+import json
+import time
+import argparse
+import shutil
+import hashlib
 import unicodedata
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from zipfile import ZipFile
-from io import BytesIO
 from pathlib import Path
 from loguru import logger
 
@@ -34,10 +45,35 @@ INPUTS_PATH.mkdir(parents=True, exist_ok=True)
 # ==============================================================================
 # 🌐 Paramètres de l'archive à télécharger
 # ==============================================================================
-ZIP_URL = (
-    "https://s3.eu-west-1.amazonaws.com/course.oc-static.com/projects/922_Data+Engineer/922_P10/bottleneck.zip"
+ZIP_URL = os.getenv(
+    "BOTTLENECK_ZIP_URL",
+    "https://s3.eu-west-1.amazonaws.com/course.oc-static.com/projects/922_Data+Engineer/922_P10/bottleneck.zip",
 )
 
+# Archive conservée sur disque : le fichier '.part' survit aux retries Airflow
+# et permet de reprendre le téléchargement là où il s'était arrêté.
+ZIP_PATH = INPUTS_PATH / "bottleneck.zip"
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 Mo
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "3"))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "60"))  # secondes (connexion / lecture)
+PROGRESS_INTERVAL = 5.0  # secondes entre deux logs de progression
+
+# Extraction : un thread par membre (la décompression zlib libère le GIL),
+# chaque membre étant copié par blocs de taille bornée.
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACT_BUFFER_SIZE = int(os.getenv("EXTRACT_BUFFER_SIZE", str(1024 * 1024)))  # 1 Mo
+
+# Manifeste des fichiers extraits (empreintes SHA-256 + validateurs HTTP) : validé
+# (dernière exécution réussie du DAG) ou en attente (archive en cours de traitement)
+MANIFEST_PATH = INPUTS_PATH / "bottleneck_manifest.json"
+PENDING_MANIFEST_PATH = INPUTS_PATH / "bottleneck_manifest.pending.json"
+FORCE_DOWNLOAD = os.getenv("FORCE_DOWNLOAD", "0") == "1"
+
+# Code de sortie interprété par le BashOperator comme "tâche ignorée"
+# (paramètre 'skip_on_exit_code' d'Airflow, 99 par défaut).
+SKIP_EXIT_CODE = 99
+
 EXPECTED_FILES = [
     "Fichier_erp.xlsx",
     "Fichier_web.xlsx",
@@ -55,38 +91,202 @@ def normalize_filename(filename: str) -> str:
 # ==============================================================================
 # 📥 Téléchargement de l'archive ZIP
 # ==============================================================================
-def download_zip(url: str) -> bytes:
-    logger.info(f"📦 Téléchargement de l'archive : {url}")
+def _log_progress(downloaded: int, total: int, started: float, resumed_from: int):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    throughput = (downloaded - resumed_from) / elapsed / (1024 * 1024)
+    if total:
+        logger.info(
+            f"   ⏬ {downloaded / (1024 * 1024):.1f} / {total / (1024 * 1024):.1f} Mo "
+            f"({downloaded / total:.0%}) - {throughput:.2f} Mo/s"
+        )
+    else:
+        logger.info(f"   ⏬ {downloaded / (1024 * 1024):.1f} Mo - {throughput:.2f} Mo/s")
+
+
+def _response_validators(response) -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def _part_validators_path(part_path: Path) -> Path:
+    return part_path.with_name(part_path.name + ".json")
+
+
+def _discard_part(part_path: Path):
+    part_path.unlink(missing_ok=True)
+    _part_validators_path(part_path).unlink(missing_ok=True)
+
+
+def _if_range(part_path: Path):
+    """
+    Validateur à envoyer en If-Range pour reprendre 'part_path' : ETag fort (les ETag
+    faibles sont interdits dans If-Range), sinon Last-Modified ; None si aucun n'a été conservé.
+    """
     try:
-        response = requests.get(url)
+        validators = json.loads(_part_validators_path(part_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def _stream_to_part(url: str, part_path: Path, chunk_size: int, validators: dict) -> tuple:
+    """
+    Télécharge (ou reprend) l'archive dans 'part_path'.
+    Retourne (taille totale, validateurs HTTP) ; la taille vaut None si le serveur
+    répond 304 Not Modified au GET conditionnel.
+    La reprise envoie Range avec If-Range (validateurs du fichier partiel, conservés à côté
+    de celui-ci) : si la source a changé, le serveur renvoie l'archive complète (200).
+    """
+    resumed_from = part_path.stat().st_size if part_path.exists() else 0
+    if_range = _if_range(part_path) if resumed_from else None
+    if resumed_from and not if_range:
+        logger.warning("⚠️ Fichier partiel sans ETag ni Last-Modified : reprise impossible, téléchargement complet.")
+        resumed_from = 0
+
+    headers = {}
+    if resumed_from:
+        headers["Range"] = f"bytes={resumed_from}-"
+        headers["If-Range"] = if_range
+    else:
+        # GET conditionnel uniquement pour un téléchargement complet
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    with requests.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 304:
+            _discard_part(part_path)
+            return None, _response_validators(response)
+
+        if response.status_code == 416:
+            # Plage non satisfiable : le fichier partiel est déjà complet (ou invalide)
+            total = int(response.headers.get("Content-Range", "*/-1").split("/")[-1])
+            if total == resumed_from:
+                logger.info("ℹ️ Fichier partiel déjà complet, aucune donnée à reprendre.")
+                return total, _response_validators(response)
+            _discard_part(part_path)
+            raise IOError("Fichier partiel incohérent avec la source, téléchargement relancé.")
+
         response.raise_for_status()
-        logger.success("✅ Archive ZIP téléchargée avec succès.")
-        return response.content
-    except Exception as e:
-        logger.error(f"❌ Erreur pendant le téléchargement : {e}")
-        raise
+
+        if resumed_from and response.status_code == 206:
+            logger.info(f"🔁 Reprise du téléchargement à partir de {resumed_from} octets.")
+            mode = "ab"
+        else:
+            if resumed_from:
+                logger.warning("⚠️ Source modifiée depuis le début du téléchargement (ou Range ignoré) : "
+                               "fichier partiel abandonné, téléchargement complet.")
+            resumed_from = 0
+            mode = "wb"
+            _part_validators_path(part_path).write_text(
+                json.dumps(_response_validators(response)), encoding="utf-8"
+            )
+
+        length = int(response.headers.get("Content-Length", 0))
+        total = resumed_from + length if length else 0
+
+        downloaded = resumed_from
+        started = last_log = time.monotonic()
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                downloaded += len(chunk)
+                if time.monotonic() - last_log >= PROGRESS_INTERVAL:
+                    _log_progress(downloaded, total, started, resumed_from)
+                    last_log = time.monotonic()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        transferred = downloaded - resumed_from
+        logger.info(
+            f"📊 {transferred / (1024 * 1024):.2f} Mo transférés en {elapsed:.1f} s "
+            f"({transferred / elapsed / (1024 * 1024):.2f} Mo/s)"
+        )
+
+        if total and downloaded != total:
+            raise IOError(f"Téléchargement incomplet : {downloaded}/{total} octets")
+        return downloaded, _response_validators(response)
+
+
+def download_zip(url: str, dest: Path, chunk_size: int = DOWNLOAD_CHUNK_SIZE, validators: dict = None) -> tuple:
+    """
+    Retourne (chemin de l'archive, validateurs HTTP).
+    Le chemin vaut None si la source n'a pas été modifiée (304).
+    """
+    logger.info(f"📦 Téléchargement de l'archive : {url}")
+    part_path = dest.with_name(dest.name + ".part")
+
+    for attempt in range(1, DOWNLOAD_MAX_RETRIES + 1):
+        try:
+            size, new_validators = _stream_to_part(url, part_path, chunk_size, validators or {})
+            if size is None:
+                logger.info("♻️ Archive non modifiée depuis le dernier téléchargement (304).")
+                return None, new_validators
+            part_path.replace(dest)
+            _part_validators_path(part_path).unlink(missing_ok=True)
+            logger.success(f"✅ Archive ZIP téléchargée avec succès ({size} octets) : {dest}")
+            return dest, new_validators
+        except (requests.RequestException, IOError) as e:
+            if attempt == DOWNLOAD_MAX_RETRIES:
+                logger.error(f"❌ Erreur pendant le téléchargement : {e}")
+                raise
+            logger.warning(f"⚠️ Tentative {attempt}/{DOWNLOAD_MAX_RETRIES} échouée : {e} - reprise...")
 
 # ==============================================================================
 # 📂 Extraction et renommage sécurisé des fichiers
 # ==============================================================================
-def extract_and_normalize(zip_content: bytes, output_dir: Path) -> list:
+class _HashingWriter:
+    """Écrit dans un fichier tout en calculant l'empreinte SHA-256 du flux."""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+
+def _extract_member(zip_path: Path, member_name: str, target_path: Path) -> str:
+    """
+    Extrait un membre en streaming vers 'target_path' et retourne son SHA-256.
+    Chaque worker ouvre sa propre ZipFile ; le CRC est vérifié par ZipExtFile
+    à la lecture complète du membre (BadZipFile en cas d'erreur).
+    """
+    tmp_path = target_path.with_name(target_path.name + ".tmp")
+    try:
+        with ZipFile(zip_path) as zip_ref, zip_ref.open(member_name) as src, open(tmp_path, "wb") as dst:
+            writer = _HashingWriter(dst)
+            shutil.copyfileobj(src, writer, EXTRACT_BUFFER_SIZE)
+        tmp_path.replace(target_path)
+        return writer.digest.hexdigest()
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def extract_and_normalize(zip_path: Path, output_dir: Path, workers: int = EXTRACT_WORKERS) -> dict:
+    """Extrait les fichiers de l'archive et retourne {nom normalisé: SHA-256}."""
     logger.info("📂 Début de l'extraction et du renommage des fichiers...")
-    extracted_files = []
+    extracted_files = {}
 
     try:
-        with ZipFile(BytesIO(zip_content)) as zip_ref:
-            for member in zip_ref.infolist():
-                original_name = Path(member.filename).name
-                if not original_name:
-                    continue  # Ignore les dossiers
+        with ZipFile(zip_path) as zip_ref:
+            members = [m for m in zip_ref.infolist() if Path(m.filename).name]  # Ignore les dossiers
 
-                safe_name = normalize_filename(original_name)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {}
+            for member in members:
+                safe_name = normalize_filename(Path(member.filename).name)
                 target_path = output_dir / safe_name
+                futures[safe_name] = executor.submit(_extract_member, zip_path, member.filename, target_path)
 
-                with open(target_path, "wb") as f:
-                    f.write(zip_ref.read(member))
-
-                extracted_files.append(safe_name)
+            for safe_name, future in futures.items():
+                extracted_files[safe_name] = future.result()
                 logger.info(f"✅ Fichier extrait : {safe_name}")
 
         logger.success(f"📁 Extraction terminée dans : {output_dir.resolve()}")
@@ -96,6 +296,52 @@ def extract_and_normalize(zip_content: bytes, output_dir: Path) -> list:
         logger.error(f"❌ Erreur pendant l'extraction : {e}")
         raise
 
+# ==============================================================================
+# 🔐 Manifeste SHA-256 des fichiers extraits
+# ==============================================================================
+def load_manifest(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Manifeste illisible, il sera régénéré : {e}")
+        return {}
+
+
+def save_manifest(path: Path, url: str, validators: dict, members: dict):
+    manifest = {"url": url, **validators, "members": members}
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def describe_members(hashes: dict, base_dir: Path) -> dict:
+    members = {}
+    for name, sha256 in hashes.items():
+        stat = (base_dir / name).stat()
+        members[name] = {
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+    return members
+
+
+def local_members_intact(manifest: dict, base_dir: Path) -> bool:
+    """Vérifie (via taille + mtime, sans relire les fichiers) que les fichiers extraits sont intacts."""
+    members = manifest.get("members")
+    if not members:
+        return False
+    for name, info in members.items():
+        path = base_dir / name
+        if not path.exists():
+            return False
+        stat = path.stat()
+        if stat.st_size != info.get("size") or stat.st_mtime_ns != info.get("mtime_ns"):
+            return False
+    return True
+
 # ==============================================================================
 # ✅ Validation des fichiers extraits
 # ==============================================================================
@@ -114,21 +360,64 @@ def validate_files(expected: list, actual: list, base_dir: Path):
 # ==============================================================================
 # 🚀 Point d’entrée principal
 # ==============================================================================
-def main():
-    zip_bytes = download_zip(ZIP_URL)
-    extracted = extract_and_normalize(zip_bytes, INPUTS_PATH)
+def download() -> int:
+    manifest = {} if FORCE_DOWNLOAD else load_manifest(MANIFEST_PATH)
+    if manifest.get("url") != ZIP_URL or not local_members_intact(manifest, INPUTS_PATH):
+        manifest = {}
+
+    validators = {k: manifest.get(k) for k in ("etag", "last_modified")}
+    zip_path, validators = download_zip(ZIP_URL, ZIP_PATH, validators=validators)
+    if zip_path is None:
+        logger.success("⏭️ Source inchangée : extraction et étapes suivantes ignorées.")
+        return SKIP_EXIT_CODE
+
+    extracted = extract_and_normalize(zip_path, INPUTS_PATH)
     validate_files(EXPECTED_FILES, extracted, INPUTS_PATH)
+
+    members = describe_members(extracted, INPUTS_PATH)
+    previous = {name: info["sha256"] for name, info in manifest.get("members", {}).items()}
+    if previous and previous == {name: info["sha256"] for name, info in members.items()}:
+        # Contenu déjà traité avec succès : le manifeste validé est simplement rafraîchi
+        save_manifest(MANIFEST_PATH, ZIP_URL, validators, members)
+        PENDING_MANIFEST_PATH.unlink(missing_ok=True)
+        logger.success("⏭️ Contenu identique (SHA-256) : étapes suivantes ignorées.")
+        return SKIP_EXIT_CODE
+
+    save_manifest(PENDING_MANIFEST_PATH, ZIP_URL, validators, members)
     logger.success("🎉 Téléchargement, extraction et validation terminés avec succès.")
+    logger.info("🕒 Manifeste en attente : validé en fin de DAG (--commit-manifest).")
+    return 0
+
+
+def commit_manifest() -> int:
+    """Valide le manifeste en attente : la source est considérée comme traitée avec succès."""
+    if not PENDING_MANIFEST_PATH.exists():
+        logger.info("ℹ️ Aucun manifeste en attente de validation.")
+        return 0
+    PENDING_MANIFEST_PATH.replace(MANIFEST_PATH)
+    logger.success(f"✅ Manifeste validé : {MANIFEST_PATH}")
     return 0
 
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Téléchargement et extraction de l'archive BottleNeck")
+    parser.add_argument("--commit-manifest", action="store_true",
+                        help="Valide le manifeste en attente (dernière tâche du DAG, après succès)")
+    args = parser.parse_args()
+
+    return commit_manifest() if args.commit_manifest else download()
+
 # ==============================================================================
 # 📌 Lancement
 # ==============================================================================
 if __name__ == "__main__":
     try:
-        main()
-        print("✔️ Script terminé avec succès.")
-        sys.exit(0)
+        exit_code = main()
+        if exit_code == SKIP_EXIT_CODE:
+            print(f"⏭️ Script terminé sans traitement : source inchangée (code {SKIP_EXIT_CODE}, étapes suivantes ignorées).")
+        else:
+            print("✔️ Script terminé avec succès.")
+        sys.exit(exit_code)
     except Exception as e:
         logger.error(f"💥 Erreur inattendue : {e}")
         sys.exit(1)
@@ -1,15 +1,24 @@
 # === Script 01 - Conversion Excel ➔ CSV (robuste et compatible Airflow) ===
 # Ce script convertit les fichiers Excel présents dans 'data/inputs/'
 # en fichiers CSV avec un nettoyage minimal (lignes/colonnes vides).
+# La lecture se fait en streaming par lots via un backend configurable
+# (EXCEL_READER = auto | openpyxl | calamine, cf. excel_readers.py).
+# En mode INTERCHANGE_FORMAT=parquet, chaque CSV est converti en Parquet typé
+# (cf. interchange.py) : l'inférence de types n'a lieu qu'une fois, ici.
+# Les classeurs sont convertis en parallèle dans un pool de processus.
 # Il est conçu pour s'intégrer dans un pipeline Airflow.
 
 import os
 import sys
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import pandas as pd
+import duckdb
 from loguru import logger
 
+from excel_readers import EXCEL_READER, convert_excel_to_csv
+from interchange import csv_to_interchange
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -42,48 +51,78 @@ FILES_MAPPING = {
     "fichier_liaison.xlsx": "liaison.csv",
 }
 
-# ==============================================================================
-# 🧹 Nettoyage minimal des DataFrames
-# ==============================================================================
-def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.dropna(how="all", axis=0)  # Supprime les lignes vides
-    df = df.dropna(how="all", axis=1)  # Supprime les colonnes vides
-    return df
+# Nombre de processus de conversion (un classeur par processus)
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", str(len(FILES_MAPPING))))
 
 # ==============================================================================
-# 🚀 Fonction principale
+# 🔄 Conversion d'un classeur (exécutée dans un processus du pool)
 # ==============================================================================
-def main():
-    logger.info("🔄 Démarrage de la conversion des fichiers Excel vers CSV...")
-
-    for excel_file, csv_file in FILES_MAPPING.items():
-        excel_path = INPUTS_PATH / excel_file
-        csv_path = OUTPUTS_PATH / csv_file
-
+def convert_file(excel_file: str, csv_file: str) -> dict:
+    """
+    Convertit un classeur et retourne un compte rendu {fichier, statut, détails}.
+    Les erreurs sont capturées et remontées au processus principal, qui se charge des logs.
+    """
+    excel_path = INPUTS_PATH / excel_file
+    csv_path = OUTPUTS_PATH / csv_file
+    result = {"excel_file": excel_file, "csv_file": csv_file, "ok": False}
+
+    try:
         # Vérification de l'existence du fichier Excel
         if not excel_path.exists():
-            logger.error(f"❌ Fichier manquant : {excel_path}")
-            sys.exit(1)
+            raise FileNotFoundError(f"Fichier manquant : {excel_path}")
 
-        try:
-            # Lecture et nettoyage
-            df = pd.read_excel(excel_path)
-            df = clean_dataframe(df)
+        # Lecture en streaming, nettoyage (lignes/colonnes vides) et export CSV
+        stats = convert_excel_to_csv(excel_path, csv_path, reader=EXCEL_READER)
 
-            # Export CSV
-            df.to_csv(csv_path, index=False)
+        # Contrôles post-export
+        if not csv_path.exists():
+            raise FileNotFoundError(f"Fichier CSV non généré : {csv_path}")
+        if stats["rows"] == 0:
+            raise ValueError(f"Fichier CSV vide généré : {csv_file}")
 
-            # Contrôles post-export
-            if not csv_path.exists():
-                raise FileNotFoundError(f"❌ Fichier CSV non généré : {csv_path}")
-            if df.empty:
-                raise ValueError(f"❌ Fichier CSV vide généré : {csv_file}")
+        # Conversion au format d'échange (no-op en mode CSV)
+        with duckdb.connect() as con:
+            output_path = csv_to_interchange(con, csv_path, Path(csv_file).stem)
 
-            logger.success(f"✅ Conversion réussie : {excel_file} ➔ {csv_file} ({len(df)} lignes)")
+        result.update(stats, ok=True, output_file=output_path.name)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
 
-        except Exception as e:
-            logger.error(f"❌ Erreur lors de la conversion de {excel_file} : {e}")
-            sys.exit(1)
+# ==============================================================================
+# 🚀 Fonction principale
+# ==============================================================================
+def main():
+    logger.info(
+        f"🔄 Démarrage de la conversion des fichiers Excel vers CSV "
+        f"({len(FILES_MAPPING)} fichiers, {CONVERSION_WORKERS} processus)..."
+    )
+
+    with ProcessPoolExecutor(max_workers=max(1, CONVERSION_WORKERS)) as executor:
+        futures = {excel: executor.submit(convert_file, excel, csv) for excel, csv in FILES_MAPPING.items()}
+        results = []
+        for excel_file, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:  # Processus du pool interrompu (OOM, signal...)
+                results.append({"excel_file": excel_file, "ok": False, "error": f"{type(e).__name__}: {e}"})
+
+    # 📋 Compte rendu par fichier
+    for result in results:
+        if not result["ok"]:
+            logger.error(f"❌ Erreur lors de la conversion de {result['excel_file']} : {result['error']}")
+            continue
+        if result["dropped_columns"]:
+            logger.info(f"🧹 {result['excel_file']} - colonnes vides supprimées : {result['dropped_columns']}")
+        logger.success(
+            f"✅ Conversion réussie : {result['excel_file']} ➔ {result['output_file']} "
+            f"({result['rows']} lignes, backend {result['reader']})"
+        )
+
+    failed = [r["excel_file"] for r in results if not r["ok"]]
+    if failed:
+        logger.error(f"💥 {len(failed)}/{len(results)} conversion(s) en échec : {failed}")
+        sys.exit(1)
 
     logger.success("🎯 Tous les fichiers Excel ont été convertis avec succès.")
 
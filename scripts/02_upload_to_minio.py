@@ -7,9 +7,11 @@ import sys
 import warnings
 from pathlib import Path
 from loguru import logger
-import boto3
 from botocore.exceptions import ClientError
 
+from interchange import data_file
+from storage import BUCKET_NAME, ensure_bucket, get_s3_client, log_transfer_summary, upload_files
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -29,31 +31,21 @@ CSV_PATH = Path("/opt/airflow/data/inputs")
 CSV_PATH.mkdir(parents=True, exist_ok=True)
 
 # ==============================================================================
-# ☁️ Configuration MinIO
+# ☁️ Configuration MinIO (connexion : cf. storage.py)
 # ==============================================================================
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
 DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/inputs/")
 
-FILES_TO_UPLOAD = ["erp.csv", "web.csv", "liaison.csv"]
+FILES_TO_UPLOAD = [data_file("erp"), data_file("web"), data_file("liaison")]
 
 # ==============================================================================
 # 📤 Fonction d’upload vers MinIO
 # ==============================================================================
 def upload_to_minio():
-    logger.info("🚀 Démarrage de l'upload des fichiers CSV vers MinIO...")
+    logger.info("🚀 Démarrage de l'upload des fichiers bruts vers MinIO...")
 
     # Connexion MinIO
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO réussie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
@@ -61,38 +53,36 @@ def upload_to_minio():
 
     # Vérification ou création du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
-        logger.success(f"✅ Bucket '{BUCKET_NAME}' disponible.")
-    except ClientError as e:
-        error_code = e.response["Error"]["Code"]
-        if error_code == "404":
-            try:
-                s3_client.create_bucket(Bucket=BUCKET_NAME)
-                logger.warning(f"📁 Bucket '{BUCKET_NAME}' créé automatiquement.")
-            except Exception as e2:
-                logger.error(f"❌ Erreur lors de la création du bucket : {e2}")
-                sys.exit(1)
+        if ensure_bucket(BUCKET_NAME, create=True):
+            logger.warning(f"📁 Bucket '{BUCKET_NAME}' créé automatiquement.")
         else:
-            logger.error(f"❌ Accès refusé au bucket : {e}")
-            sys.exit(1)
-
-    # Upload des fichiers
-    for filename in FILES_TO_UPLOAD:
-        local_file = CSV_PATH / filename
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
+            logger.success(f"✅ Bucket '{BUCKET_NAME}' disponible.")
+    except ClientError as e:
+        logger.error(f"❌ Accès refusé au bucket : {e}")
+        sys.exit(1)
 
-        if not local_file.exists():
-            logger.error(f"❌ Fichier introuvable localement : {filename}")
-            sys.exit(1)
+    # Vérification des fichiers locaux
+    missing = [f for f in FILES_TO_UPLOAD if not (CSV_PATH / f).exists()]
+    if missing:
+        logger.error(f"❌ Fichier(s) introuvable(s) localement : {missing}")
+        sys.exit(1)
 
-        try:
-            s3_client.upload_file(str(local_file), BUCKET_NAME, s3_key)
-            logger.success(f"📤 Fichier uploadé : {filename} ➔ {s3_key}")
-        except Exception as e:
-            logger.error(f"❌ Échec de l'upload de {filename} : {e}")
-            sys.exit(1)
+    # Upload des fichiers (en parallèle)
+    items = [(CSV_PATH / f, f"{DESTINATION_PREFIX}{f}") for f in FILES_TO_UPLOAD]
+    failed = False
+    for local_file, s3_key, unchanged, error in upload_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Échec de l'upload de {local_file.name} : {error}")
+            failed = True
+        elif unchanged:
+            logger.info(f"⏭️ Inchangé, upload ignoré : {local_file.name} ➔ {s3_key}")
+        else:
+            logger.success(f"📤 Fichier uploadé : {local_file.name} ➔ {s3_key}")
+    if failed:
+        sys.exit(1)
 
-    logger.success("🎯 Tous les fichiers CSV ont été uploadés avec succès dans MinIO.")
+    log_transfer_summary()
+    logger.success("🎯 Tous les fichiers bruts ont été uploadés avec succès dans MinIO.")
 
 # ==============================================================================
 # 🚀 Point d’entrée
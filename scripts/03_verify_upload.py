@@ -1,15 +1,23 @@
-# === Script 03 - Vérification de la présence des fichiers dans MinIO ===
+# === Script 03 - Vérification des fichiers uploadés dans MinIO ===
 # Ce script vérifie que les fichiers CSV attendus (erp, web, liaison)
-# sont bien présents dans le bucket MinIO après l’upload initial.
+# sont bien présents dans le bucket MinIO après l’upload initial, avec une
+# taille et une empreinte identiques aux fichiers locaux (upload tronqué détecté).
+# Mode "head" (défaut) : un head_object parallèle par fichier attendu, quelle que
+# soit la taille du bucket. Mode "list" : listing paginé du préfixe.
 
 import os
 import sys
 import warnings
 from pathlib import Path
 from loguru import logger
-import boto3
 from botocore.exceptions import ClientError
 
+from interchange import data_file
+from storage import (
+    BUCKET_NAME, checksum_matches, comparable_digest, ensure_bucket, file_digests, get_s3_client, head_objects,
+    list_objects,
+)
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -25,20 +33,42 @@ logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
 # ==============================================================================
-# ☁️ Configuration MinIO
+# ☁️ Configuration MinIO (connexion : cf. storage.py)
 # ==============================================================================
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
 DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/inputs/")
+VERIFY_MODE = os.getenv("VERIFY_MODE", "head")  # head | list
+
+# 📁 Répertoire des CSV uploadés par le script 02 (référence taille/empreinte)
+CSV_PATH = Path("/opt/airflow/data/inputs")
 
 EXPECTED_FILES = {
-    f"{DESTINATION_PREFIX}erp.csv",
-    f"{DESTINATION_PREFIX}web.csv",
-    f"{DESTINATION_PREFIX}liaison.csv",
+    f"{DESTINATION_PREFIX}{data_file('erp')}": CSV_PATH / data_file("erp"),
+    f"{DESTINATION_PREFIX}{data_file('web')}": CSV_PATH / data_file("web"),
+    f"{DESTINATION_PREFIX}{data_file('liaison')}": CSV_PATH / data_file("liaison"),
 }
 
+# ==============================================================================
+# 🧮 Comparaison d'un objet distant au fichier local
+# ==============================================================================
+def check_object(key: str, remote: dict, local_path: Path) -> str:
+    """Retourne un message d'anomalie, ou une chaîne vide si l'objet est conforme."""
+    if remote is None:
+        return "absent du bucket"
+    if not local_path.exists():
+        return f"fichier local de référence {local_path} absent (taille et empreinte non vérifiables)"
+
+    size = local_path.stat().st_size
+    if remote["ContentLength"] != size:
+        return f"taille distante {remote['ContentLength']} ≠ locale {size}"
+
+    algorithm = comparable_digest(remote)
+    match = checksum_matches(remote, file_digests(local_path, [algorithm] if algorithm else []))
+    if match is None:
+        logger.warning(f"⚠️ {key} : aucune empreinte comparable (ETag multipart), taille seule vérifiée.")
+    elif not match:
+        return "empreinte différente du fichier local"
+    return ""
+
 # ==============================================================================
 # 🔎 Fonction de vérification
 # ==============================================================================
@@ -47,13 +77,7 @@ def verify_minio_upload():
 
     # Connexion MinIO
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO réussie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
@@ -61,37 +85,40 @@ def verify_minio_upload():
 
     # Vérification de l'existence du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME)
         logger.success(f"✅ Bucket '{BUCKET_NAME}' accessible.")
     except ClientError as e:
         logger.error(f"❌ Bucket inaccessible : {e}")
         sys.exit(1)
 
-    # Listing et contrôle des fichiers
+    # Récupération des métadonnées des objets attendus
     try:
-        response = s3_client.list_objects_v2(Bucket=BUCKET_NAME, Prefix=DESTINATION_PREFIX)
-        contents = response.get("Contents", [])
-
-        if not contents:
-            logger.error(f"❌ Aucun fichier trouvé dans {BUCKET_NAME}/{DESTINATION_PREFIX}")
-            sys.exit(1)
-
-        found_files = {obj["Key"] for obj in contents}
-        logger.info(f"📦 Fichiers trouvés : {len(found_files)}")
-        for f in found_files:
-            logger.info(f"   - {f}")
-
-        missing = EXPECTED_FILES - found_files
-        if missing:
-            logger.error(f"❌ Fichiers manquants : {missing}")
-            sys.exit(1)
-
-        logger.success("🎯 Tous les fichiers attendus sont présents dans MinIO.")
-
+        if VERIFY_MODE == "list":
+            found = list_objects(DESTINATION_PREFIX, BUCKET_NAME)
+            logger.info(f"📦 Objets listés sous {DESTINATION_PREFIX} : {len(found)}")
+            remotes = {key: found.get(key) for key in EXPECTED_FILES}
+        else:
+            remotes = head_objects(EXPECTED_FILES, BUCKET_NAME)
     except Exception as e:
-        logger.error(f"❌ Erreur lors du listing MinIO : {e}")
+        logger.error(f"❌ Erreur lors de l'interrogation de MinIO : {e}")
         sys.exit(1)
 
+    # Contrôle présence / taille / empreinte
+    anomalies = {}
+    for key, local_path in EXPECTED_FILES.items():
+        problem = check_object(key, remotes[key], local_path)
+        if problem:
+            anomalies[key] = problem
+            logger.error(f"❌ {key} : {problem}")
+        else:
+            logger.info(f"   - {key} ✔️")
+
+    if anomalies:
+        logger.error(f"❌ {len(anomalies)} fichier(s) manquant(s) ou non conforme(s).")
+        sys.exit(1)
+
+    logger.success("🎯 Tous les fichiers attendus sont présents et identiques dans MinIO.")
+
 # ==============================================================================
 # 🚀 Point d’entrée
 # ==============================================================================
@@ -7,8 +7,9 @@ import sys
 import warnings
 from pathlib import Path
 from loguru import logger
-import boto3
-from botocore.exceptions import ClientError
+
+from interchange import data_file
+from storage import BUCKET_NAME, S3_DIRECT_READ, download_files, get_s3_client, log_transfer_summary
 
 warnings.filterwarnings("ignore")
 
@@ -25,15 +26,11 @@ logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
 # ==============================================================================
-# ☁️ Configuration MinIO
+# ☁️ Configuration MinIO (connexion : cf. storage.py)
 # ==============================================================================
-MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
 DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/inputs/")
 
-FILES_TO_DOWNLOAD = ["erp.csv", "web.csv", "liaison.csv"]
+FILES_TO_DOWNLOAD = [data_file("erp"), data_file("web"), data_file("liaison")]
 LOCAL_INPUTS_PATH = Path("/opt/airflow/data/inputs")
 LOCAL_INPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
@@ -41,35 +38,34 @@ LOCAL_INPUTS_PATH.mkdir(parents=True, exist_ok=True)
 # 📥 Téléchargement MinIO ➝ local
 # ==============================================================================
 def download_from_minio():
+    if S3_DIRECT_READ:
+        logger.info("⏭️ S3_DIRECT_READ=1 : DuckDB lit les fichiers en place dans MinIO, téléchargement ignoré.")
+        return
+
     logger.info("📥 Démarrage du téléchargement depuis MinIO...")
 
     # Connexion MinIO
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO établie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
         sys.exit(1)
 
-    # Téléchargement des fichiers un par un
-    for filename in FILES_TO_DOWNLOAD:
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
-        local_path = LOCAL_INPUTS_PATH / filename
-
-        try:
-            s3_client.download_file(BUCKET_NAME, s3_key, str(local_path))
-            logger.success(f"📦 Fichier téléchargé avec succès : {filename}")
-        except ClientError as e:
-            logger.error(f"❌ Erreur lors du téléchargement de {filename} : {e}")
-            sys.exit(1)
+    # Téléchargement des fichiers (en parallèle)
+    items = [(f"{DESTINATION_PREFIX}{filename}", LOCAL_INPUTS_PATH / filename) for filename in FILES_TO_DOWNLOAD]
+    failed = False
+    for s3_key, local_path, error in download_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Erreur lors du téléchargement de {local_path.name} : {error}")
+            failed = True
+        else:
+            logger.success(f"📦 Fichier téléchargé avec succès : {local_path.name}")
+    if failed:
+        sys.exit(1)
 
-    logger.success("🎯 Tous les fichiers CSV ont été téléchargés dans 'data/inputs/'.")
+    log_transfer_summary()
+    logger.success("🎯 Tous les fichiers bruts ont été téléchargés dans 'data/inputs/'.")
 
 # ==============================================================================
 # 🚀 Point d’entrée
@@ -1,7 +1,13 @@
 # === Script 05 - Nettoyage complet des fichiers bruts CSV avec DuckDB ===
 # Ce script lit les fichiers CSV bruts depuis 'data/inputs/', applique des règles métier
 # de nettoyage (valeurs nulles, seuils, cohérences), puis enregistre les résultats nettoyés
-# dans 'data/outputs/' au format CSV et en base DuckDB. Un résumé statistique est aussi généré.
+# dans 'data/outputs/' au format d'échange (CSV ou Parquet) et en base DuckDB.
+# Avec S3_DIRECT_READ=1, les fichiers bruts sont lus directement dans MinIO
+# (s3://<bucket>/data/inputs/) via l'extension httpfs de DuckDB.
+# Chaque fichier brut n'est lu qu'une fois (table temporaire DuckDB) : comptages,
+# profil des valeurs nulles, tables nettoyées et résumé statistique en découlent.
+# Les règles sont déclarées dans cleaning_rules.py ; les lignes rejetées sont conservées
+# en quarantaine (<source>_quarantine) avec le masque de bits et la liste des règles enfreintes.
 
 import os
 import sys
@@ -11,6 +17,10 @@ import pandas as pd
 import duckdb
 from loguru import logger
 
+from cleaning_rules import CLEAN_RULES, rejection_mask_sql, rejection_reasons_sql, rule_counts_sql
+from interchange import CLEAN_EXPORT, SCHEMAS, data_file, export_table, read_sql
+from storage import S3_DIRECT_READ, configure_duckdb_s3, s3_uri
+
 # ==============================================================================
 # 🔧 Configuration des chemins et du logger
 # ==============================================================================
@@ -25,6 +35,34 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+# ==============================================================================
+# 📊 Profil d'une table brute en un seul parcours
+# ==============================================================================
+def profile_table(con, table: str, rules: list) -> dict:
+    """
+    Calcule en une agrégation : nombre de lignes, lignes entièrement vides,
+    valeurs nulles par colonne, lignes conservées et rejets par règle
+    (la table porte la colonne 'rejection_mask').
+    """
+    columns = [row[0] for row in con.execute(f"DESCRIBE {table}").fetchall() if row[0] != "rejection_mask"]
+    all_null = " AND ".join(f'"{c}" IS NULL' for c in columns)
+    null_counts = ", ".join(f'COUNT(*) - COUNT("{c}")' for c in columns)
+    row = con.execute(f"""
+        SELECT COUNT(*),
+               COUNT(*) FILTER (WHERE {all_null}),
+               COUNT(*) FILTER (WHERE rejection_mask = 0),
+               {rule_counts_sql(rules)},
+               {null_counts}
+        FROM {table}
+    """).fetchone()
+    return {
+        "rows": row[0],
+        "empty_rows": row[1],
+        "kept": row[2],
+        "rejections": {rule["name"]: n for rule, n in zip(rules, row[3:3 + len(rules)]) if n},
+        "nulls": {c: n for c, n in zip(columns, row[3 + len(rules):]) if n},
+    }
+
 # ==============================================================================
 # 🧹 Fonction principale
 # ==============================================================================
@@ -33,23 +71,11 @@ def main():
     INPUTS_PATH = Path("/opt/airflow/data/inputs")
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+    INPUTS_PREFIX = "data/inputs/"  # Préfixe MinIO des fichiers bruts (cf. script 02)
 
     INPUTS_PATH.mkdir(parents=True, exist_ok=True)
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    # 📥 Chargement des fichiers CSV bruts
-    try:
-        df_erp = pd.read_csv(INPUTS_PATH / "erp.csv")
-        df_web = pd.read_csv(INPUTS_PATH / "web.csv")
-        df_liaison = pd.read_csv(INPUTS_PATH / "liaison.csv")
-
-        logger.info(f"ERP     : {len(df_erp)} lignes (lignes vides : {df_erp.isnull().all(axis=1).sum()})")
-        logger.info(f"WEB     : {len(df_web)} lignes (lignes vides : {df_web.isnull().all(axis=1).sum()})")
-        logger.info(f"LIAISON : {len(df_liaison)} lignes (lignes vides : {df_liaison.isnull().all(axis=1).sum()})")
-    except Exception as e:
-        logger.error(f"❌ Erreur lors du chargement initial des CSV : {e}")
-        sys.exit(1)
-
     # 🦆 Connexion à DuckDB
     if not DUCKDB_PATH.exists():
         logger.info("ℹ️ Fichier DuckDB non trouvé, il sera créé.")
@@ -60,56 +86,81 @@ def main():
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
         sys.exit(1)
 
-    # 🧼 Nettoyage métier avec DuckDB (valeurs nulles, seuils, cohérence)
+    # 📍 Emplacement des fichiers bruts : disque local ou MinIO (lecture en place)
+    if S3_DIRECT_READ:
+        try:
+            configure_duckdb_s3(con)
+            logger.success("✅ Lecture directe depuis MinIO activée (httpfs).")
+        except Exception as e:
+            logger.error(f"❌ Configuration de l'accès S3 de DuckDB impossible : {e}")
+            sys.exit(1)
+        sources = {name: s3_uri(f"{INPUTS_PREFIX}{data_file(name)}") for name in SCHEMAS}
+    else:
+        sources = {name: INPUTS_PATH / data_file(name) for name in SCHEMAS}
+
+    # 📥 Chargement unique des fichiers bruts (tables temporaires), évaluation des règles et profil
+    profiles = {}
     try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE erp_clean AS
-            SELECT * FROM read_csv_auto('{INPUTS_PATH}/erp.csv')
-            WHERE product_id IS NOT NULL
-              AND onsale_web IS NOT NULL
-              AND price IS NOT NULL AND price > 0
-              AND stock_quantity IS NOT NULL
-              AND stock_status IS NOT NULL
-        """)
-        logger.success("✅ Table 'erp_clean' créée avec règles de filtrage.")
-
-        con.execute(f"""
-            CREATE OR REPLACE TABLE web_clean AS
-            SELECT * FROM read_csv_auto('{INPUTS_PATH}/web.csv')
-            WHERE sku IS NOT NULL
-        """)
-        logger.success("✅ Table 'web_clean' créée avec filtrage sur SKU.")
-
-        con.execute(f"""
-            CREATE OR REPLACE TABLE liaison_clean AS
-            SELECT * FROM read_csv_auto('{INPUTS_PATH}/liaison.csv')
-            WHERE product_id IS NOT NULL AND id_web IS NOT NULL
-        """)
-        logger.success("✅ Table 'liaison_clean' créée avec filtres de jointure.")
+        # Types inférés en CSV (comportement historique) ; en Parquet, SCHEMAS a été appliqué par 01
+        for name in SCHEMAS:
+            con.execute(f"""
+                CREATE OR REPLACE TEMP TABLE {name}_raw AS
+                SELECT *, {rejection_mask_sql(CLEAN_RULES[name])} AS rejection_mask
+                FROM {read_sql(sources[name])}
+            """)
+            profiles[name] = profile_table(con, f"{name}_raw", CLEAN_RULES[name])
+            profile = profiles[name]
+            logger.info(f"{name.upper():<8}: {profile['rows']} lignes (lignes vides : {profile['empty_rows']})")
+            if profile["nulls"]:
+                logger.info(f"          valeurs nulles par colonne : {profile['nulls']}")
     except Exception as e:
-        logger.error(f"❌ Erreur lors de la création des tables nettoyées : {e}")
+        logger.error(f"❌ Erreur lors du chargement initial des fichiers bruts : {e}")
         sys.exit(1)
 
-    # 💾 Export des résultats nettoyés au format CSV
+    # 🧼 Nettoyage métier avec DuckDB (valeurs nulles, seuils, cohérence) et quarantaine des rejets
     try:
-        con.execute(f"COPY erp_clean TO '{OUTPUTS_PATH}/erp_clean.csv' (HEADER, DELIMITER ',')")
-        con.execute(f"COPY web_clean TO '{OUTPUTS_PATH}/web_clean.csv' (HEADER, DELIMITER ',')")
-        con.execute(f"COPY liaison_clean TO '{OUTPUTS_PATH}/liaison_clean.csv' (HEADER, DELIMITER ',')")
-        logger.success("✅ Données nettoyées exportées vers 'data/outputs/'.")
+        for name, rules in CLEAN_RULES.items():
+            con.execute(f"""
+                CREATE OR REPLACE TABLE {name}_clean AS
+                SELECT * EXCLUDE (rejection_mask) FROM {name}_raw
+                WHERE rejection_mask = 0
+            """)
+            con.execute(f"""
+                CREATE OR REPLACE TABLE {name}_quarantine AS
+                SELECT *, {rejection_reasons_sql(rules)} AS rejection_reasons
+                FROM {name}_raw
+                WHERE rejection_mask <> 0
+            """)
+            profile = profiles[name]
+            reasons = ", ".join(f"{rule} : {n}" for rule, n in profile["rejections"].items())
+            logger.success(
+                f"✅ Table '{name}_clean' créée : {profile['kept']} lignes conservées, "
+                f"{profile['rows'] - profile['kept']} en quarantaine" + (f" ({reasons})" if reasons else "")
+            )
     except Exception as e:
-        logger.error(f"❌ Erreur lors de l'export des fichiers CSV : {e}")
+        logger.error(f"❌ Erreur lors de la création des tables nettoyées : {e}")
         sys.exit(1)
 
+    # 💾 Export des résultats nettoyés au format d'échange (optionnel : 08 lit les tables DuckDB)
+    if CLEAN_EXPORT:
+        try:
+            for table in ["erp_clean", "web_clean", "liaison_clean"]:
+                export_table(con, table, OUTPUTS_PATH, table)
+            for table in ["erp_quarantine", "web_quarantine", "liaison_quarantine"]:
+                export_table(con, table, OUTPUTS_PATH, table)
+            logger.success("✅ Données nettoyées et quarantaines exportées vers 'data/outputs/'.")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'export des fichiers nettoyés : {e}")
+            sys.exit(1)
+    else:
+        logger.info("⏭️ CLEAN_EXPORT=0 : tables nettoyées et quarantaines conservées dans DuckDB uniquement.")
+
     # 📊 Résumé statistique des exclusions
     try:
         resume_df = pd.DataFrame({
             "source": ["erp", "web", "liaison"],
-            "nb_lignes_initiales": [len(df_erp), len(df_web), len(df_liaison)],
-            "nb_apres_nettoyage": [
-                con.execute("SELECT COUNT(*) FROM erp_clean").fetchone()[0],
-                con.execute("SELECT COUNT(*) FROM web_clean").fetchone()[0],
-                con.execute("SELECT COUNT(*) FROM liaison_clean").fetchone()[0]
-            ]
+            "nb_lignes_initiales": [profiles[name]["rows"] for name in ["erp", "web", "liaison"]],
+            "nb_apres_nettoyage": [profiles[name]["kept"] for name in ["erp", "web", "liaison"]],
         })
         resume_df["nb_exclues"] = resume_df["nb_lignes_initiales"] - resume_df["nb_apres_nettoyage"]
         resume_df.to_csv(OUTPUTS_PATH / "resume_stats.csv", index=False)
@@ -6,10 +6,12 @@ import os
 import sys
 import warnings
 from pathlib import Path
-import boto3
 from botocore.exceptions import ClientError
 from loguru import logger
 
+from interchange import CLEAN_EXPORT, data_file
+from storage import BUCKET_NAME, ensure_bucket, get_s3_client, log_transfer_summary, upload_files
+
 # ==============================================================================
 # 🔧 Initialisation du logger et des chemins
 # ==============================================================================
@@ -28,28 +30,22 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 🚀 Fonction principale d’upload vers MinIO
 # ==============================================================================
 def main():
-    # 🌍 Paramètres de connexion MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+    if not CLEAN_EXPORT:
+        logger.info("⏭️ CLEAN_EXPORT=0 : aucun fichier nettoyé exporté par 05, upload ignoré.")
+        return
+
+    # 🌍 Paramètres MinIO (connexion : cf. storage.py)
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     # 📁 Répertoire des fichiers à envoyer
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    files_to_upload = ["erp_clean.csv", "web_clean.csv", "liaison_clean.csv"]
+    files_to_upload = [data_file("erp_clean"), data_file("web_clean"), data_file("liaison_clean")]
 
     # 🔌 Connexion au client S3 (MinIO)
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1"
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO établie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
@@ -57,7 +53,7 @@ def main():
 
     # 📦 Vérification de l'existence du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME)
         logger.success(f"✅ Bucket '{BUCKET_NAME}' trouvé.")
     except ClientError as e:
         logger.error(f"❌ Le bucket '{BUCKET_NAME}' est inaccessible ou inexistant : {e}")
@@ -66,25 +62,25 @@ def main():
     # 📤 Envoi des fichiers
     logger.info("📤 Démarrage de l’upload des fichiers nettoyés vers MinIO...")
 
-    for filename in files_to_upload:
-        local_path = OUTPUTS_PATH / filename
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
-
-        if not local_path.exists():
-            logger.error(f"❌ Fichier introuvable localement : {local_path}")
-            sys.exit(1)
-
-        try:
-            s3_client.upload_file(
-                Filename=str(local_path),
-                Bucket=BUCKET_NAME,
-                Key=s3_key
-            )
-            logger.success(f"✅ Upload réussi : {filename} ➔ {s3_key}")
-        except Exception as e:
-            logger.error(f"❌ Échec de l’upload de {filename} : {e}")
-            sys.exit(1)
+    missing = [OUTPUTS_PATH / f for f in files_to_upload if not (OUTPUTS_PATH / f).exists()]
+    if missing:
+        logger.error(f"❌ Fichier(s) introuvable(s) localement : {missing}")
+        sys.exit(1)
+
+    items = [(OUTPUTS_PATH / f, f"{DESTINATION_PREFIX}{f}") for f in files_to_upload]
+    failed = False
+    for local_path, s3_key, unchanged, error in upload_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Échec de l’upload de {local_path.name} : {error}")
+            failed = True
+        elif unchanged:
+            logger.info(f"⏭️ Inchangé, upload ignoré : {local_path.name} ➔ {s3_key}")
+        else:
+            logger.success(f"✅ Upload réussi : {local_path.name} ➔ {s3_key}")
+    if failed:
+        sys.exit(1)
 
+    log_transfer_summary()
     logger.success("🎯 Tous les fichiers nettoyés ont été uploadés avec succès.")
 
 # ==============================================================================
@@ -6,10 +6,12 @@ import os
 import sys
 import warnings
 from pathlib import Path
-import boto3
 from botocore.exceptions import ClientError
 from loguru import logger
 
+from interchange import CLEAN_EXPORT, data_file
+from storage import BUCKET_NAME, S3_DIRECT_READ, download_files, ensure_bucket, get_s3_client, log_transfer_summary
+
 # ==============================================================================
 # 🔧 Configuration des logs
 # ==============================================================================
@@ -28,28 +30,25 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 📥 Fonction principale de téléchargement depuis MinIO
 # ==============================================================================
 def main():
-    # 🌍 Paramètres de connexion MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+    if S3_DIRECT_READ:
+        logger.info("⏭️ S3_DIRECT_READ=1 : DuckDB lit les fichiers en place dans MinIO, téléchargement ignoré.")
+        return
+    if not CLEAN_EXPORT:
+        logger.info("⏭️ CLEAN_EXPORT=0 : aucun fichier nettoyé exporté par 05, téléchargement ignoré.")
+        return
+
+    # 🌍 Paramètres MinIO (connexion : cf. storage.py)
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     # 📁 Dossier local cible
     LOCAL_OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     LOCAL_OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    files_to_download = ["erp_clean.csv", "web_clean.csv", "liaison_clean.csv"]
+    files_to_download = [data_file("erp_clean"), data_file("web_clean"), data_file("liaison_clean")]
 
     # 🔌 Connexion à MinIO
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1"
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO réussie.")
     except Exception as e:
         logger.error(f"❌ Échec de connexion à MinIO : {e}")
@@ -57,7 +56,7 @@ def main():
 
     # ✅ Vérification du bucket
     try:
-        s3_client.head_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME)
         logger.success(f"✅ Bucket '{BUCKET_NAME}' disponible.")
     except ClientError as e:
         logger.error(f"❌ Bucket inaccessible ou inexistant : {e}")
@@ -66,21 +65,18 @@ def main():
     # 📥 Téléchargement des fichiers
     logger.info("📥 Démarrage du téléchargement des fichiers nettoyés depuis MinIO...")
 
-    for filename in files_to_download:
-        s3_key = f"{DESTINATION_PREFIX}{filename}"
-        local_path = LOCAL_OUTPUTS_PATH / filename
-
-        try:
-            s3_client.download_file(
-                Bucket=BUCKET_NAME,
-                Key=s3_key,
-                Filename=str(local_path)
-            )
-            logger.success(f"✅ Fichier téléchargé : {filename} ➔ {local_path}")
-        except ClientError as e:
-            logger.error(f"❌ Échec du téléchargement de {filename} : {e}")
-            sys.exit(1)
+    items = [(f"{DESTINATION_PREFIX}{filename}", LOCAL_OUTPUTS_PATH / filename) for filename in files_to_download]
+    failed = False
+    for s3_key, local_path, error in download_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Échec du téléchargement de {local_path.name} : {error}")
+            failed = True
+        else:
+            logger.success(f"✅ Fichier téléchargé : {local_path.name} ➔ {local_path}")
+    if failed:
+        sys.exit(1)
 
+    log_transfer_summary()
     logger.success("🎯 Tous les fichiers ont été téléchargés avec succès depuis MinIO.")
 
 # ==============================================================================
@@ -1,6 +1,15 @@
 # === Script 08 - Dédoublonnage des fichiers nettoyés avec DuckDB ===
 # Ce script applique des règles de dédoublonnage spécifiques sur les fichiers nettoyés.
 # Il crée trois tables DuckDB (erp_dedup, web_dedup, liaison_dedup) et vérifie leur validité.
+# Par défaut, il lit directement les tables nettoyées de la base (sans aller-retour fichier) ;
+# DEDUP_SOURCE=files relit les fichiers exportés par 05 (local, ou MinIO avec S3_DIRECT_READ=1).
+# DEDUP_MODE=diff compare la source complète (recréée à chaque exécution par 05) à l'état
+# de l'exécution précédente (watermark post_modified pour le web, empreinte de ligne pour
+# ERP et liaison) et ne réécrit que les clés touchées par des lignes nouvelles, modifiées
+# ou supprimées, avec les mêmes règles que la reconstruction complète. La source reste lue
+# en entier (coût proportionnel à l'historique) ; seules les écritures sont limitées au delta.
+# Les tables sont déclarées avec une clé primaire (product_id, sku) : l'unicité est
+# garantie à l'écriture ; id_web (clé de jointure de la fusion) est indexé.
 
 import os
 import sys
@@ -9,6 +18,10 @@ from pathlib import Path
 import duckdb
 from loguru import logger
 
+from duckdb_tables import build_keyed_table, create_indexes, create_keyed_table, drop_indexes
+from interchange import data_file, read_sql
+from storage import S3_DIRECT_READ, configure_duckdb_s3, s3_uri
+
 # ==============================================================================
 # 🔧 Initialisation des logs
 # ==============================================================================
@@ -23,6 +36,265 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+DEDUP_SOURCE = os.getenv("DEDUP_SOURCE", "duckdb")  # duckdb | files
+DEDUP_MODE = os.getenv("DEDUP_MODE", "full")  # full | diff ("incremental" : ancien nom de diff)
+
+# ==============================================================================
+# 📏 Règles de dédoublonnage (requête appliquée à la source complète, ou au delta)
+# ==============================================================================
+def erp_dedup_sql(source: str) -> str:
+    return f"""
+        SELECT 
+            product_id,
+            MAX(onsale_web)     AS onsale_web,
+            MAX(price)          AS price,
+            MAX(stock_quantity) AS stock_quantity,
+            MAX(stock_status)   AS stock_status
+        FROM {source}
+        GROUP BY product_id
+    """
+
+
+def liaison_dedup_sql(source: str) -> str:
+    return f"""
+        SELECT 
+            product_id,
+            MIN(id_web) AS id_web
+        FROM {source}
+        GROUP BY product_id
+    """
+
+
+# Ligne web retenue par sku : la plus récente par post_date puis, à post_date égale,
+# par post_modified. Sans ce départage (ordre d'origine : post_date seule), le choix
+# entre deux lignes de même post_date dépendait de l'ordre de lecture, et le mode diff
+# ne pouvait pas reproduire la reconstruction complète.
+def web_dedup_sql(source: str) -> str:
+    return f"""
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY sku
+                ORDER BY post_date DESC, post_modified DESC
+            ) AS rn
+            FROM {source}
+            WHERE post_type = 'product'
+        )
+        WHERE rn = 1
+    """
+
+
+# Tables dédoublonnées : clé primaire, index secondaires et détection du delta en mode
+# diff ("watermark" : colonne de date, les colonnes "match_on" identifiant la ligne
+# retenue ; sinon empreinte de ligne). Le mode diff recalcule, avec la même requête
+# que la reconstruction complète, chaque clé touchée par le delta à partir de toutes ses
+# lignes sources : le résultat est identique à une reconstruction complète.
+DEDUP_TABLES = {
+    "erp_dedup": {"source": "erp_clean", "query": erp_dedup_sql, "key": "product_id"},
+    "liaison_dedup": {
+        "source": "liaison_clean", "query": liaison_dedup_sql, "key": "product_id",
+        "indexes": ["id_web"],
+    },
+    "web_dedup": {
+        "source": "web_clean", "query": web_dedup_sql, "key": "sku",
+        "watermark": "post_modified", "match_on": ["post_type", "post_date", "post_modified"],
+    },
+}
+
+# Au-delà de ce nombre de clés recalculées, les index secondaires sont supprimés puis
+# reconstruits après l'écriture (chargement en masse) ; en deçà, ils restent en place.
+DEDUP_INDEX_REBUILD_THRESHOLD = int(os.getenv("DEDUP_INDEX_REBUILD_THRESHOLD", "10000"))
+
+# ==============================================================================
+# 🔁 Mode diff : état, clés touchées et recalcul
+# ==============================================================================
+def ensure_state_tables(con):
+    # Ancien format de dedup_seen (sans clé) : l'état est réinitialisé, les tables reconstruites
+    columns = [row[0] for row in con.execute(
+        "SELECT column_name FROM duckdb_columns() WHERE table_name = 'dedup_seen'"
+    ).fetchall()]
+    if columns and "row_key" not in columns:
+        drop_state_tables(con)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS dedup_state (
+            table_name VARCHAR PRIMARY KEY,
+            watermark  TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS dedup_seen (
+            table_name VARCHAR,
+            row_key    VARCHAR,
+            row_hash   UBIGINT,
+            PRIMARY KEY (table_name, row_hash)
+        )
+    """)
+
+
+def drop_state_tables(con):
+    """Une reconstruction complète invalide l'état du mode diff (empreintes et watermarks)."""
+    con.execute("DROP TABLE IF EXISTS dedup_state")
+    con.execute("DROP TABLE IF EXISTS dedup_seen")
+
+
+def touched_keys_by_hash(con, table: str, spec: dict, source: str, fresh: bool):
+    """
+    Clés (en texte) dont une ligne source est apparue ou a disparu depuis la dernière
+    exécution, d'après les empreintes de dedup_seen (empreintes courantes dans {table}_hashes).
+    Sans état ('fresh'), toutes les clés de la source sont touchées.
+    """
+    key = spec["key"]
+    columns = ", ".join(f'"{row[0]}"' for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall())
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {table}_hashes AS
+        SELECT DISTINCT CAST({key} AS VARCHAR) AS row_key, hash({columns}) AS row_hash FROM {source}
+    """)
+    if fresh:
+        con.execute(f"CREATE OR REPLACE TEMP TABLE {table}_keys AS SELECT DISTINCT row_key FROM {table}_hashes")
+        return
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {table}_keys AS
+        SELECT row_key FROM {table}_hashes
+        WHERE row_hash NOT IN (SELECT row_hash FROM dedup_seen WHERE table_name = '{table}')
+        UNION
+        SELECT row_key FROM dedup_seen
+        WHERE table_name = '{table}' AND row_hash NOT IN (SELECT row_hash FROM {table}_hashes)
+    """)
+
+
+def record_hashes(con, table: str):
+    """dedup_seen ramené aux empreintes des lignes présentes dans la source ({table}_hashes)."""
+    con.execute(f"""
+        DELETE FROM dedup_seen
+        WHERE table_name = '{table}' AND row_hash NOT IN (SELECT row_hash FROM {table}_hashes)
+    """)
+    con.execute(f"""
+        INSERT INTO dedup_seen SELECT '{table}', row_key, row_hash FROM {table}_hashes
+        WHERE row_hash NOT IN (SELECT row_hash FROM dedup_seen WHERE table_name = '{table}')
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def touched_keys_by_watermark(con, table: str, spec: dict, source: str, watermark, fresh: bool):
+    """
+    Clés (en texte) ayant une ligne source modifiée après le watermark, ou dont la ligne
+    retenue dans 'table' n'existe plus telle quelle dans la source (suppression).
+    Sans état ('fresh'), toutes les clés de la source sont touchées. Retourne le nouveau watermark.
+    """
+    key, watermark_col = spec["key"], spec["watermark"]
+    latest = con.execute(f"SELECT MAX({watermark_col}) FROM {source}").fetchone()[0]
+    if fresh:
+        con.execute(f"CREATE OR REPLACE TEMP TABLE {table}_keys AS SELECT DISTINCT CAST({key} AS VARCHAR) AS row_key FROM {source}")
+        return latest
+    condition = "TRUE" if watermark is None else f"{watermark_col} > '{watermark}' OR {watermark_col} IS NULL"
+    matched = " AND ".join(f"s.{col} IS NOT DISTINCT FROM t.{col}" for col in [key] + spec["match_on"])
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {table}_keys AS
+        SELECT CAST({key} AS VARCHAR) AS row_key FROM {source} WHERE {condition}
+        UNION
+        SELECT CAST(t.{key} AS VARCHAR) FROM {table} t
+        WHERE NOT EXISTS (SELECT 1 FROM {source} s WHERE {matched})
+    """)
+    return latest if watermark is None or (latest is not None and latest > watermark) else watermark
+
+
+def rebuilt_rows(con, table: str, spec: dict, source: str, fresh: bool) -> bool:
+    """
+    Calcule dans {table}_rebuilt la requête de reconstruction appliquée à toutes les lignes
+    sources des clés de {table}_keys. Retourne True si les index secondaires doivent être
+    retirés pendant l'écriture : gros delta (chargement en masse), ou valeur indexée d'une
+    clé existante modifiée (DuckDB 0.10 refuse de modifier une colonne indexée). Une table
+    recréée ('fresh') est chargée sans index.
+    """
+    key, indexed = spec["key"], spec.get("indexes", [])
+    touched = f"(SELECT * FROM {source} WHERE CAST({key} AS VARCHAR) IN (SELECT row_key FROM {table}_keys))"
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {table}_rebuilt AS {spec['query'](touched)}")
+    if fresh or not indexed:
+        return False
+    nb_rebuilt = con.execute(f"SELECT COUNT(*) FROM {table}_rebuilt").fetchone()[0]
+    return nb_rebuilt > DEDUP_INDEX_REBUILD_THRESHOLD or con.execute(f"""
+        SELECT COUNT(*) FROM {table}_rebuilt r JOIN {table} t USING ({key})
+        WHERE {" OR ".join(f"r.{col} IS DISTINCT FROM t.{col}" for col in indexed)}
+    """).fetchone()[0] > 0
+
+
+def apply_rebuilt(con, table: str, spec: dict, indexes_dropped: bool):
+    """Remplace les lignes des clés touchées par {table}_rebuilt ; les clés disparues sont supprimées."""
+    key = spec["key"]
+    con.execute(f"""
+        DELETE FROM {table}
+        WHERE CAST({key} AS VARCHAR) IN (SELECT row_key FROM {table}_keys)
+          AND {key} NOT IN (SELECT {key} FROM {table}_rebuilt)
+    """)
+    # Index en place : leurs colonnes sont inchangées pour les clés existantes (cf. rebuilt_rows)
+    fixed = [key] + ([] if indexes_dropped else spec.get("indexes", []))
+    columns = [row[0] for row in con.execute(f"DESCRIBE {table}").fetchall() if row[0] not in fixed]
+    action = (
+        "DO UPDATE SET " + ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in columns)
+        if columns else "DO NOTHING"
+    )
+    con.execute(f"INSERT INTO {table} SELECT * FROM {table}_rebuilt ON CONFLICT ({key}) {action}")
+
+
+def diff_dedup(con, table: str, spec: dict, source: str) -> tuple:
+    """
+    Recalcule dans 'table' les clés touchées par les lignes sources nouvelles, modifiées
+    ou supprimées ; retourne (nombre de clés recalculées, index reconstruits ou non).
+    Sans état pour 'table', celle-ci est recréée avec sa clé primaire et toutes les clés
+    sont recalculées. Trois étapes :
+      1. analyse (tables temporaires uniquement) : clés touchées et lignes recalculées ;
+      2. si nécessaire, suppression des index secondaires (validée à part : DuckDB 0.10
+         n'en tient compte qu'après COMMIT) ;
+      3. une seule transaction pour les lignes, dedup_seen et dedup_state : un échec
+         laisse la table et son état tels qu'à l'exécution précédente.
+    Les index sont ensuite (re)créés hors transaction ; un index manquant après un échec
+    est reconstruit à l'exécution suivante.
+    """
+    indexed = spec.get("indexes", [])
+    state = con.execute(
+        "SELECT watermark FROM dedup_state WHERE table_name = ?", [table]
+    ).fetchone()
+    fresh = state is None
+
+    # 1. Analyse
+    new_watermark = None
+    if spec.get("watermark"):
+        new_watermark = touched_keys_by_watermark(con, table, spec, source, None if fresh else state[0], fresh)
+    else:
+        touched_keys_by_hash(con, table, spec, source, fresh)
+    nb_keys = con.execute(f"SELECT COUNT(*) FROM {table}_keys").fetchone()[0]
+    drop = rebuilt_rows(con, table, spec, source, fresh)
+
+    # 2. Index retirés pour l'écriture
+    if drop:
+        drop_indexes(con, table, indexed)
+
+    # 3. Écriture atomique des lignes et de l'état
+    con.begin()
+    try:
+        if fresh:
+            create_keyed_table(con, table, spec["query"](source), spec["key"])
+            con.execute("DELETE FROM dedup_seen WHERE table_name = ?", [table])
+        if nb_keys:
+            apply_rebuilt(con, table, spec, drop or fresh)
+        if not spec.get("watermark"):
+            record_hashes(con, table)
+        con.execute("""
+            INSERT INTO dedup_state VALUES (?, ?, now()::TIMESTAMP)
+            ON CONFLICT (table_name) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = EXCLUDED.updated_at
+        """, [table, new_watermark])
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    finally:
+        for temp in ("keys", "rebuilt", "hashes"):
+            con.execute(f"DROP TABLE IF EXISTS {table}_{temp}")
+
+    # Index (re)créés hors transaction d'écriture ; sans effet s'ils sont déjà en place
+    create_indexes(con, table, indexed)
+    return nb_keys, drop
+
 # ==============================================================================
 # 💼 Fonction principale
 # ==============================================================================
@@ -31,6 +303,7 @@ def main():
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
+    OUTPUTS_PREFIX = "data/outputs/"  # Préfixe MinIO des fichiers nettoyés (cf. script 06)
 
     if not DUCKDB_PATH.exists():
         logger.error(f"❌ Base DuckDB introuvable à {DUCKDB_PATH}")
@@ -44,57 +317,67 @@ def main():
         logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
         sys.exit(1)
 
-    # 🧹 Dédoublonnage ERP
-    try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE erp_dedup AS
-            SELECT 
-                product_id,
-                MAX(onsale_web)     AS onsale_web,
-                MAX(price)          AS price,
-                MAX(stock_quantity) AS stock_quantity,
-                MAX(stock_status)   AS stock_status
-            FROM read_csv_auto('{OUTPUTS_PATH}/erp_clean.csv')
-            GROUP BY product_id
-        """)
-        logger.success("✅ Table erp_dedup créée avec regroupement par product_id.")
-    except Exception as e:
-        logger.error(f"❌ Erreur de dédoublonnage ERP : {e}")
-        sys.exit(1)
+    # 📍 Source des données nettoyées : tables DuckDB créées par 05 (défaut), ou fichiers
+    #    exportés (DEDUP_SOURCE=files), lus en local ou en place dans MinIO (S3_DIRECT_READ=1)
+    def source(stem: str) -> str:
+        if DEDUP_SOURCE == "duckdb":
+            return stem
+        if S3_DIRECT_READ:
+            return read_sql(s3_uri(f"{OUTPUTS_PREFIX}{data_file(stem)}"))
+        return read_sql(OUTPUTS_PATH / data_file(stem))
 
-    # 🔗 Dédoublonnage Liaison
-    try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE liaison_dedup AS
-            SELECT 
-                product_id,
-                MIN(id_web) AS id_web
-            FROM read_csv_auto('{OUTPUTS_PATH}/liaison_clean.csv')
-            GROUP BY product_id
-        """)
-        logger.success("✅ Table liaison_dedup créée avec MIN(id_web) par product_id.")
-    except Exception as e:
-        logger.error(f"❌ Erreur de dédoublonnage Liaison : {e}")
-        sys.exit(1)
+    if DEDUP_SOURCE == "duckdb":
+        logger.info("🦆 Dédoublonnage sur les tables nettoyées de la base DuckDB.")
+    elif S3_DIRECT_READ:
+        try:
+            configure_duckdb_s3(con)
+            logger.success("✅ Lecture directe depuis MinIO activée (httpfs).")
+        except Exception as e:
+            logger.error(f"❌ Configuration de l'accès S3 de DuckDB impossible : {e}")
+            sys.exit(1)
 
-    # 🌐 Dédoublonnage Web
-    try:
-        con.execute(f"""
-            CREATE OR REPLACE TABLE web_dedup AS
-            SELECT * FROM (
-                SELECT *, ROW_NUMBER() OVER (
-                    PARTITION BY sku
-                    ORDER BY post_date DESC
-                ) AS rn
-                FROM read_csv_auto('{OUTPUTS_PATH}/web_clean.csv')
-                WHERE post_type = 'product'
-            )
-            WHERE rn = 1
-        """)
-        logger.success("✅ Table web_dedup créée avec filtre post_type='product' et ROW_NUMBER.")
-    except Exception as e:
-        logger.error(f"❌ Erreur de dédoublonnage Web : {e}")
-        sys.exit(1)
+    # 🔁 Mode diff : seules les clés touchées par des lignes modifiées sont réécrites
+    if DEDUP_MODE in ("diff", "incremental"):
+        if DEDUP_MODE == "incremental":
+            logger.warning("⚠️ DEDUP_MODE=incremental est l'ancien nom de DEDUP_MODE=diff (source relue en entier).")
+        try:
+            ensure_state_tables(con)
+            for table, spec in DEDUP_TABLES.items():
+                nb_keys, rebuilt_indexes = diff_dedup(con, table, spec, source(spec["source"]))
+                suffix = " (index reconstruits)" if rebuilt_indexes else ""
+                logger.success(f"✅ {table} : {nb_keys} clé(s) touchée(s) par le delta recalculée(s){suffix}.")
+        except Exception as e:
+            logger.error(f"❌ Erreur de dédoublonnage (mode diff) : {e}")
+            sys.exit(1)
+
+    # 🧹 Reconstruction complète (mode par défaut)
+    else:
+        try:
+            spec = DEDUP_TABLES["erp_dedup"]
+            build_keyed_table(con, "erp_dedup", erp_dedup_sql(source("erp_clean")), spec["key"])
+            logger.success("✅ Table erp_dedup créée avec regroupement par product_id (clé primaire).")
+        except Exception as e:
+            logger.error(f"❌ Erreur de dédoublonnage ERP : {e}")
+            sys.exit(1)
+
+        try:
+            spec = DEDUP_TABLES["liaison_dedup"]
+            build_keyed_table(con, "liaison_dedup", liaison_dedup_sql(source("liaison_clean")),
+                              spec["key"], spec["indexes"])
+            logger.success("✅ Table liaison_dedup créée avec MIN(id_web) par product_id (clé primaire, index id_web).")
+        except Exception as e:
+            logger.error(f"❌ Erreur de dédoublonnage Liaison : {e}")
+            sys.exit(1)
+
+        try:
+            spec = DEDUP_TABLES["web_dedup"]
+            build_keyed_table(con, "web_dedup", web_dedup_sql(source("web_clean")), spec["key"])
+            logger.success("✅ Table web_dedup créée avec filtre post_type='product' et ROW_NUMBER (clé primaire sku).")
+        except Exception as e:
+            logger.error(f"❌ Erreur de dédoublonnage Web : {e}")
+            sys.exit(1)
+
+        drop_state_tables(con)
 
     # ✅ Validation finale des données
     try:
@@ -1,15 +1,23 @@
 # === Script 09 - Fusion des tables dédoublonnées en une table finale ===
 # Ce script fusionne les tables erp_dedup, liaison_dedup et web_dedup dans DuckDB.
-# Il vérifie que le nombre de lignes correspond à 714 et exporte la table fusionnée en CSV.
+# Il vérifie que le nombre de lignes correspond à 714 et exporte la table fusionnée
+# au format d'échange (CSV ou Parquet). La table est déclarée avec une clé primaire
+# (product_id) : un doublon issu des jointures fait échouer l'étape.
+# L'export est un COPY DuckDB en streaming (export_table), sans passer par pandas.
+# Avec FUSION_PARTITION_BY=stock_status,..., fusion.<format> devient un dossier
+# partitionné (Hive) ; les lecteurs (interchange.read_sql, ZSCORE_SOURCE du moteur
+# streaming) le lisent comme un seul jeu de données.
 
 import os
 import sys
 import warnings
 from pathlib import Path
 import duckdb
-import pandas as pd
 from loguru import logger
 
+from duckdb_tables import build_keyed_table
+from interchange import export_table
+
 # ==============================================================================
 # 🔧 Initialisation des logs
 # ==============================================================================
@@ -24,12 +32,14 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+FUSION_PARTITION_BY = [c.strip() for c in os.getenv("FUSION_PARTITION_BY", "").split(",") if c.strip()]
+
 # ==============================================================================
 # 🔗 Fonction principale : fusion logique
 # ==============================================================================
 def main():
     DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
-    OUTPUT_PATH = Path("/opt/airflow/data/outputs/fusion.csv")
+    OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
 
     if not DUCKDB_PATH.exists():
         logger.error(f"❌ Base DuckDB introuvable à {DUCKDB_PATH}")
@@ -45,8 +55,7 @@ def main():
 
     # 🔄 Création de la table fusionnée
     try:
-        con.execute("""
-            CREATE OR REPLACE TABLE fusion AS
+        build_keyed_table(con, "fusion", """
             SELECT
                 e.product_id,
                 e.onsale_web,
@@ -62,8 +71,8 @@ def main():
             FROM erp_dedup e
             JOIN liaison_dedup l ON e.product_id = l.product_id
             JOIN web_dedup w ON l.id_web = w.sku
-        """)
-        logger.success("✅ Table 'fusion' créée avec succès à partir des jointures.")
+        """, "product_id")
+        logger.success("✅ Table 'fusion' créée avec succès à partir des jointures (clé primaire product_id).")
     except Exception as e:
         logger.error(f"❌ Erreur lors de la création de la table fusion : {e}")
         sys.exit(1)
@@ -76,9 +85,8 @@ def main():
         else:
             logger.info("✔️ Nombre de lignes attendu : 714")
 
-        fusion_df = con.execute("SELECT * FROM fusion").fetchdf()
-        fusion_df.to_csv(OUTPUT_PATH, index=False)
-        logger.success(f"📁 Table fusion exportée avec succès : {OUTPUT_PATH}")
+        for path in export_table(con, "fusion", OUTPUTS_PATH, "fusion", FUSION_PARTITION_BY):
+            logger.success(f"📁 Table fusion exportée avec succès : {path}")
     except Exception as e:
         logger.error(f"❌ Erreur lors de la validation ou de l'export : {e}")
         sys.exit(1)
@@ -1,13 +1,31 @@
 # === Script 10 - Snapshot de la base DuckDB après fusion ===
-# Ce script copie le fichier de base de données DuckDB après fusion
-# pour créer une sauvegarde figée dans '/opt/airflow/data/snapshots/'.
+# Ce script crée un snapshot incrémental de la base DuckDB après fusion dans le
+# magasin '/opt/airflow/data/snapshots/' (voir snapshot_store.py) : CHECKPOINT,
+# export Parquet compressé des seules tables modifiées depuis les snapshots précédents,
+# manifeste horodaté, puis application de la politique de rétention.
+# Avec SNAPSHOT_MODE=clone, le fichier DuckDB entier est cloné (reflink si le système de
+# fichiers le permet, sinon copie zero-copy puis copie tamponnée) ; la stratégie
+# utilisée et sa durée sont journalisées. Sans reflink, chaque clone est une copie
+# complète : la rétention des clones passe alors à SNAPSHOT_CLONE_KEEP_LAST.
+#
+# Restauration à un instant donné :
+#   python 10_create_snapshot.py --restore <id | date ISO 8601> --target /chemin/restauration.duckdb
+# Liste des snapshots :
+#   python 10_create_snapshot.py --list
 
 import os
 import sys
-import shutil
+import argparse
+import duckdb
 from pathlib import Path
 from loguru import logger
 
+from fast_copy import copy_file
+from snapshot_store import (
+    SNAPSHOT_CLONE_KEEP_LAST, SNAPSHOT_DIR, SNAPSHOT_MODE, apply_retention, clone_database, create_snapshot,
+    list_clones, list_snapshots, resolve_clone, resolve_snapshot, restore_snapshot,
+)
+
 # ==============================================================================
 # 🔧 Initialisation des logs
 # ==============================================================================
@@ -20,33 +38,125 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+DATA_PATH = Path("/opt/airflow/data")
+SOURCE_DUCKDB = DATA_PATH / "bottleneck.duckdb"
+
+MB = 1024 * 1024
+
 # ==============================================================================
-# 💾 Fonction principale : snapshot DuckDB
+# 💾 Création du snapshot
 # ==============================================================================
-def main():
-    DATA_PATH = Path("/opt/airflow/data")
-    SOURCE_DUCKDB = DATA_PATH / "bottleneck.duckdb"
-    SNAPSHOT_DIR = DATA_PATH / "snapshots"
-    SNAPSHOT_FILE = SNAPSHOT_DIR / "bottleneck_fusion_ok.duckdb"
-
+def snapshot():
     # ✅ Vérification de la base source
     if not SOURCE_DUCKDB.exists():
         logger.error(f"❌ Fichier source introuvable : {SOURCE_DUCKDB}")
         sys.exit(1)
 
+    clone_keep_last = None
     try:
-        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(SOURCE_DUCKDB, SNAPSHOT_FILE)
-        logger.success(f"✅ Snapshot créé avec succès : {SNAPSHOT_FILE}")
+        con = duckdb.connect(str(SOURCE_DUCKDB))
+        if SNAPSHOT_MODE == "clone":
+            con.execute("CHECKPOINT")
+            con.close()
+            clone = clone_database(SOURCE_DUCKDB)
+            logger.success(
+                f"✅ Clone {clone['id']} créé : {clone['path']} ({clone['bytes'] / MB:.2f} Mo) "
+                f"- stratégie {clone['strategy']} en {clone['seconds']:.3f} s"
+            )
+            if clone["strategy"] != "reflink":
+                clone_keep_last = SNAPSHOT_CLONE_KEEP_LAST
+                logger.warning(
+                    f"⚠️ Clone sans reflink : copie complète de la base à chaque exécution, "
+                    f"rétention limitée à {SNAPSHOT_CLONE_KEEP_LAST or 'illimité'} clone(s) (SNAPSHOT_CLONE_KEEP_LAST)."
+                )
+        else:
+            log_manifest(create_snapshot(con, source=str(SOURCE_DUCKDB)))
+            con.close()
     except Exception as e:
         logger.error(f"❌ Erreur lors de la création du snapshot : {e}")
         sys.exit(1)
 
+    try:
+        removed = apply_retention(clone_keep_last=clone_keep_last)
+        if removed["snapshots"] or removed["clones"] or removed["objects"]:
+            logger.info(
+                f"🧹 Rétention : {len(removed['snapshots'])} snapshot(s), {len(removed['clones'])} clone(s) "
+                f"et {len(removed['objects'])} objet(s) supprimés ({removed['bytes_freed'] / MB:.2f} Mo libérés)."
+            )
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de l'application de la rétention : {e}")
+        sys.exit(1)
+
     logger.success("🎯 Sauvegarde de la base DuckDB terminée.")
 
+
+def log_manifest(manifest: dict):
+    stats = manifest["stats"]
+    logger.success(f"✅ Snapshot {manifest['id']} créé : {len(manifest['tables'])} tables.")
+    logger.info(
+        f"📦 {len(stats['exported'])} table(s) exportée(s) "
+        f"({stats['bytes_written'] / MB:.2f} Mo écrits), {len(stats['reused'])} réutilisée(s)."
+    )
+    if stats["exported"]:
+        logger.info(f"   Tables modifiées : {', '.join(stats['exported'])}")
+
+# ==============================================================================
+# ♻️ Restauration et liste
+# ==============================================================================
+def restore(at: str, target: Path):
+    try:
+        if SNAPSHOT_MODE == "clone":
+            clone = resolve_clone(at)
+            logger.info(f"📂 Clone retenu : {clone.name}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            strategy, seconds = copy_file(clone, target)
+            logger.success(f"✅ Base restaurée dans {target} - stratégie {strategy} en {seconds:.3f} s")
+            return
+
+        manifest = resolve_snapshot(at)
+        logger.info(f"📂 Snapshot retenu : {manifest['id']} ({manifest['created_at']})")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        con = duckdb.connect(str(target))
+        restored = restore_snapshot(con, manifest)
+        con.close()
+        for table, rows in restored.items():
+            logger.info(f"   {table} : {rows} lignes")
+        logger.success(f"✅ {len(restored)} tables restaurées dans {target}")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la restauration : {e}")
+        sys.exit(1)
+
+
+def show_snapshots():
+    snapshots, clones = list_snapshots(), list_clones()
+    if not snapshots and not clones:
+        logger.info(f"📭 Aucun snapshot dans {SNAPSHOT_DIR}")
+    for manifest in snapshots:
+        rows = sum(entry["rows"] for entry in manifest["tables"].values())
+        logger.info(f"📸 {manifest['id']} - {manifest['created_at']} - {len(manifest['tables'])} tables, {rows} lignes")
+    for clone_id in clones:
+        logger.info(f"🧬 {clone_id} - clone complet")
+
 # ==============================================================================
 # 🚀 Point d’entrée
 # ==============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots incrémentaux de la base DuckDB")
+    parser.add_argument("--list", action="store_true", help="Liste les snapshots disponibles")
+    parser.add_argument("--restore", metavar="AT", default=None,
+                        help="Identifiant de snapshot ou date ISO 8601 (dernier snapshot à cet instant)")
+    parser.add_argument("--target", type=Path, default=DATA_PATH / "restored.duckdb",
+                        help="Base DuckDB de destination de la restauration")
+    args = parser.parse_args()
+
+    if args.list:
+        show_snapshots()
+    elif args.restore:
+        restore(args.restore, args.target)
+    else:
+        snapshot()
+
+
 if __name__ == "__main__":
     try:
         main()
@@ -1,16 +1,17 @@
 # === Script 11 - Calcul du chiffre d'affaires et upload dans MinIO ===
 # Ce script calcule le CA par produit à partir de la table 'fusion',
-# exporte les résultats en CSV/XLSX, et les upload dans MinIO.
+# exporte les résultats au format d'échange (CSV ou Parquet) et en XLSX, et les upload dans MinIO.
+# Les exports sont écrits en streaming depuis DuckDB (COPY, XLSX par lots), sans DataFrame pandas.
 
 import os
 import sys
 from pathlib import Path
 import duckdb
-import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
 from loguru import logger
 
+from interchange import export_table, export_xlsx
+from storage import BUCKET_NAME, get_s3_client, log_transfer_summary, upload_files
+
 # ==============================================================================
 # 🔧 Initialisation des logs
 # ==============================================================================
@@ -69,58 +70,44 @@ def main():
         logger.error(f"❌ Erreur lors du calcul CA : {e}")
         sys.exit(1)
 
-    # 💾 Export local en CSV/XLSX
+    # 💾 Export local (format d'échange + XLSX)
     try:
-        df_ca = con.execute("SELECT * FROM ca_par_produit").fetchdf()
-        df_total = con.execute("SELECT * FROM ca_total").fetchdf()
-
-        local_files = {
-            "ca_par_produit.csv": df_ca,
-            "ca_total.csv": df_total,
-            "ca_par_produit.xlsx": df_ca,
-        }
-
-        for filename, df in local_files.items():
-            local_path = OUTPUTS_PATH / filename
-            if filename.endswith(".csv"):
-                df.to_csv(local_path, index=False)
-            elif filename.endswith(".xlsx"):
-                df.to_excel(local_path, index=False)
-            logger.success(f"📁 Fichier généré localement : {local_path}")
+        local_files = []
+        for table in ["ca_par_produit", "ca_total"]:
+            local_files += [path.name for path in export_table(con, table, OUTPUTS_PATH, table)]
+
+        local_files.append(export_xlsx(con, "ca_par_produit", OUTPUTS_PATH / "ca_par_produit.xlsx").name)
+
+        for filename in local_files:
+            logger.success(f"📁 Fichier généré localement : {OUTPUTS_PATH / filename}")
     except Exception as e:
         logger.error(f"❌ Erreur lors de la génération des fichiers CA : {e}")
         sys.exit(1)
 
     # ☁️ Upload dans MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO réussie.")
     except Exception as e:
         logger.error(f"❌ Échec de la connexion à MinIO : {e}")
         sys.exit(1)
 
-    try:
-        for filename in local_files:
-            local_path = OUTPUTS_PATH / filename
-            s3_key = f"{DESTINATION_PREFIX}{filename}"
-            s3_client.upload_file(str(local_path), BUCKET_NAME, s3_key)
-            logger.success(f"🚀 Upload réussi : {filename} ➔ {s3_key}")
-    except ClientError as e:
-        logger.error(f"❌ Erreur d'upload MinIO : {e}")
+    items = [(OUTPUTS_PATH / f, f"{DESTINATION_PREFIX}{f}") for f in local_files]
+    failed = False
+    for local_path, s3_key, unchanged, error in upload_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Erreur d'upload MinIO ({local_path.name}) : {error}")
+            failed = True
+        elif unchanged:
+            logger.info(f"⏭️ Inchangé, upload ignoré : {local_path.name} ➔ {s3_key}")
+        else:
+            logger.success(f"🚀 Upload réussi : {local_path.name} ➔ {s3_key}")
+    if failed:
         sys.exit(1)
 
+    log_transfer_summary()
     logger.success("🎯 Tous les fichiers de CA ont été uploadés avec succès.")
 
 # ==============================================================================
@@ -1,17 +1,31 @@
 # === Script 12 - Calcul du Z-score et upload dans MinIO ===
 # Ce script identifie les vins "millésimés" via un Z-score sur le prix.
+# Les scores (Z-score, MAD, IQR) sont calculés en SQL DuckDB pour toutes les
+# segmentations de outlier_scoring.py (global, stock_status, tranche de prix) et
+# stockés dans les tables outlier_stats / outlier_scores. Le classement millésimé /
+# ordinaire reprend le Z-score global, queue haute uniquement (prix anormalement
+# élevés) : OUTLIER_TAIL ne s'applique qu'aux indicateurs du rapport d'anomalies.
 # Les résultats sont exportés localement puis uploadés dans MinIO.
+# Avec ZSCORE_ENGINE=streaming, le classement est calculé hors mémoire sur lots Arrow
+# (streaming_stats.py) : moyenne/variance de Welford au premier passage (réparti sur
+# STREAM_WORKERS processus), puis classement et écriture des deux fichiers au second.
+# Ce moteur n'ouvre la base qu'en lecture et ne calcule pas les scores segmentés,
+# sauf avec OUTLIER_SCORING=1.
 
 import os
 import sys
 import warnings
 from pathlib import Path
 import duckdb
-import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
+import pyarrow as pa
+import pyarrow.compute as pc
 from loguru import logger
 
+from interchange import export_table, open_batch_writers
+from outlier_scoring import OUTLIER_TAIL, OUTLIER_THRESHOLDS, outlier_sql, score_outliers
+from streaming_stats import STREAM_WORKERS, exceeds, parallel_moments, std, stream_zscores
+from storage import BUCKET_NAME, get_s3_client, upload_files
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -26,6 +40,79 @@ logger.remove()
 logger.add(sys.stdout, level="INFO")
 logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 
+ZSCORE_ENGINE = os.getenv("ZSCORE_ENGINE", "duckdb")   # duckdb | streaming
+ZSCORE_SOURCE = os.getenv("ZSCORE_SOURCE", "fusion")   # table DuckDB ou fichier/glob Parquet (streaming)
+# Scores segmentés : toujours avec le moteur DuckDB (son classement les reprend),
+# avec le moteur streaming seulement si OUTLIER_SCORING=1
+OUTLIER_SCORING = ZSCORE_ENGINE != "streaming" or os.getenv("OUTLIER_SCORING", "0") == "1"
+MILLESIME_TAIL = "upper"  # Millésimé = prix anormalement élevé, quel que soit OUTLIER_TAIL
+
+ZSCORE_SQL = f"""
+    CREATE OR REPLACE TEMP TABLE zscore_vins AS
+    SELECT f.product_id, f.post_title, f.price, s.score_zscore AS z_score,
+           CASE WHEN {outlier_sql("s.score_zscore", OUTLIER_THRESHOLDS["zscore"], MILLESIME_TAIL)}
+                THEN 'millésimé' ELSE 'ordinaire' END AS type
+    FROM outlier_scores s
+    JOIN fusion f USING (product_id)
+    WHERE s.segmentation = 'global'
+"""
+
+# ==============================================================================
+# 📊 Classement millésimé / ordinaire et export local
+# Chaque moteur retourne (nb millésimés, nb total, nb z_score invalides, fichiers écrits).
+# ==============================================================================
+def classify_duckdb(con, outputs_path: Path) -> tuple:
+    con.execute(ZSCORE_SQL)
+    nb_millesimes, nb_total, nb_invalides = con.execute("""
+        SELECT COUNT(*) FILTER (WHERE type = 'millésimé'),
+               COUNT(*),
+               COUNT(*) FILTER (WHERE z_score IS NULL OR isinf(z_score) OR isnan(z_score))
+        FROM zscore_vins
+    """).fetchone()
+
+    exported = export_table(con, "(SELECT * FROM zscore_vins WHERE type = 'millésimé')",
+                            outputs_path, "vins_millesimes")
+    exported += export_table(con, "(SELECT * FROM zscore_vins WHERE type = 'ordinaire')",
+                             outputs_path, "vins_ordinaires")
+    return nb_millesimes, nb_total, nb_invalides, exported
+
+
+def classify_streaming(db_path: Path, outputs_path: Path) -> tuple:
+    db = None if ZSCORE_SOURCE.endswith(".parquet") else db_path
+    moments = parallel_moments(db, ZSCORE_SOURCE, "price")
+    logger.info(
+        f"🌊 Passage 1 ({STREAM_WORKERS} processus) : n={moments[0]}, "
+        f"moyenne={moments[1]:.4f}, écart-type={std(moments):.4f}"
+    )
+
+    nb_millesimes = nb_total = nb_invalides = 0
+    writers = {}
+    try:
+        for batch in stream_zscores(db, ZSCORE_SOURCE, ["product_id", "post_title", "price"], "price", moments):
+            z_scores = batch.column(batch.schema.get_field_index("z_score"))
+            mask = exceeds(z_scores, OUTLIER_THRESHOLDS["zscore"], MILLESIME_TAIL)
+            batch = pa.RecordBatch.from_arrays(
+                batch.columns + [pc.if_else(mask, "millésimé", "ordinaire")],
+                names=batch.schema.names + ["type"],
+            )
+            if not writers:
+                writers = {stem: open_batch_writers(outputs_path, stem, batch.schema)
+                           for stem in ("vins_millesimes", "vins_ordinaires")}
+            for stem, selection in (("vins_millesimes", mask), ("vins_ordinaires", pc.invert(mask))):
+                for _, writer in writers[stem]:
+                    writer.write_batch(batch.filter(selection))
+
+            nb_total += batch.num_rows
+            nb_millesimes += pc.sum(mask).as_py() or 0
+            nb_invalides += z_scores.null_count + (pc.sum(pc.invert(pc.is_finite(z_scores))).as_py() or 0)
+    finally:
+        for stem_writers in writers.values():
+            for _, writer in stem_writers:
+                writer.close()
+
+    exported = [path for stem_writers in writers.values() for path, _ in stem_writers]
+    return nb_millesimes, nb_total, nb_invalides, exported
+
 # ==============================================================================
 # 🍷 Fonction principale : calcul du Z-score et upload MinIO
 # ==============================================================================
@@ -34,86 +121,78 @@ def main():
     OUTPUTS_PATH = Path("/opt/airflow/data/outputs")
     OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
-    # 🦆 Connexion à DuckDB
-    if not DUCKDB_PATH.exists():
+    # 🦆 Connexion à DuckDB (inutile au moteur streaming sur une source Parquet sans scores)
+    con = None
+    if (OUTLIER_SCORING or not ZSCORE_SOURCE.endswith(".parquet")) and not DUCKDB_PATH.exists():
         logger.error(f"❌ Base DuckDB introuvable : {DUCKDB_PATH}")
         sys.exit(1)
-
-    try:
-        con = duckdb.connect(str(DUCKDB_PATH))
-        logger.success("✅ Connexion à DuckDB établie.")
-    except Exception as e:
-        logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
-        sys.exit(1)
-
-    # 📊 Calcul du Z-score
+    if OUTLIER_SCORING:
+        try:
+            con = duckdb.connect(str(DUCKDB_PATH))
+            logger.success("✅ Connexion à DuckDB établie.")
+        except Exception as e:
+            logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
+            sys.exit(1)
+
+    # 📊 Calcul des scores d'anomalie (toutes segmentations)
+    if OUTLIER_SCORING:
+        try:
+            outliers = score_outliers(con, "fusion", "product_id", "price")
+            thresholds = ", ".join(f"{method} > {threshold:g}" for method, threshold in OUTLIER_THRESHOLDS.items())
+            logger.info(f"📐 Anomalies de prix (seuils : {thresholds}, queue : {OUTLIER_TAIL})")
+            for segmentation in sorted({seg for seg, _ in outliers}):
+                counts = ", ".join(f"{m} {n}" for (seg, m), n in outliers.items() if seg == segmentation)
+                logger.info(f"   {segmentation} : {counts}")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du calcul des scores d'anomalie : {e}")
+            sys.exit(1)
+    else:
+        logger.info("⏭️ Moteur streaming : scores d'anomalie segmentés non calculés (OUTLIER_SCORING=0).")
+
+    # 🍷 Classement par Z-score global et export local
     try:
-        df = con.execute("""
-            SELECT product_id, post_title, price
-            FROM fusion
-            WHERE price IS NOT NULL
-        """).fetchdf()
-
-        df["z_score"] = (df["price"] - df["price"].mean()) / df["price"].std()
-        df["type"] = df["z_score"].apply(lambda z: "millésimé" if z > 2 else "ordinaire")
-
-        nb_millesimes = (df["type"] == "millésimé").sum()
-        nb_total = len(df)
+        if ZSCORE_ENGINE == "streaming":
+            if con is not None:
+                con.close()  # Le premier passage peut ouvrir la base en lecture depuis plusieurs processus
+            nb_millesimes, nb_total, nb_invalides, exported = classify_streaming(DUCKDB_PATH, OUTPUTS_PATH)
+        else:
+            nb_millesimes, nb_total, nb_invalides, exported = classify_duckdb(con, OUTPUTS_PATH)
 
         logger.info(f"🍷 Vins millésimés détectés : {nb_millesimes} (attendu : 30)")
         logger.info(f"📦 Vins ordinaires : {nb_total - nb_millesimes}")
+        logger.success(f"📄 Export local terminé : {', '.join(str(p) for p in exported)}")
     except Exception as e:
         logger.error(f"❌ Erreur lors du calcul du Z-score : {e}")
         sys.exit(1)
 
-    # 💾 Export local
-    try:
-        vins_millesimes_path = OUTPUTS_PATH / "vins_millesimes.csv"
-        vins_ordinaires_path = OUTPUTS_PATH / "vins_ordinaires.csv"
-
-        df[df["type"] == "millésimé"].to_csv(vins_millesimes_path, index=False)
-        df[df["type"] == "ordinaire"].to_csv(vins_ordinaires_path, index=False)
-
-        logger.success(f"📄 Export local terminé : {vins_millesimes_path}, {vins_ordinaires_path}")
-    except Exception as e:
-        logger.error(f"❌ Erreur lors de l'export local : {e}")
-        sys.exit(1)
-
     # ☁️ Connexion MinIO
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
     DESTINATION_PREFIX = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
 
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO établie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
         sys.exit(1)
 
     # 🚀 Upload des fichiers vers MinIO
-    try:
-        for local_file in [vins_millesimes_path, vins_ordinaires_path]:
-            s3_key = f"{DESTINATION_PREFIX}{local_file.name}"
-            s3_client.upload_file(str(local_file), BUCKET_NAME, s3_key)
+    items = [(local_file, f"{DESTINATION_PREFIX}{local_file.name}") for local_file in exported]
+    failed = False
+    for local_file, s3_key, unchanged, error in upload_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Erreur lors de l'upload MinIO ({local_file.name}) : {error}")
+            failed = True
+        elif unchanged:
+            logger.info(f"⏭️ Inchangé, upload ignoré : {local_file.name} ➔ {s3_key}")
+        else:
             logger.success(f"🚀 Upload réussi : {local_file.name} ➔ {s3_key}")
-    except ClientError as e:
-        logger.error(f"❌ Erreur lors de l'upload MinIO : {e}")
+    if failed:
         sys.exit(1)
 
     # ✅ Tests de validation interne
     try:
         assert nb_millesimes == 30, f"❌ Nombre incorrect de vins millésimés : {nb_millesimes} (attendu : 30)"
-        assert df[["price", "z_score"]].isnull().sum().sum() == 0, "❌ Valeurs nulles détectées dans price/z_score"
-        assert df["z_score"].isin([float("inf"), float("-inf")]).sum() == 0, "❌ Valeurs infinies détectées dans z_score"
+        assert nb_invalides == 0, f"❌ {nb_invalides} valeur(s) nulle(s) ou infinie(s) détectée(s) dans z_score"
         logger.success("🧪 Validation des résultats Z-score : OK")
     except Exception as e:
         logger.error(f"❌ Échec des tests de validation Z-score : {e}")
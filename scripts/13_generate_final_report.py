@@ -6,12 +6,13 @@ import os
 import sys
 import duckdb
 import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
 from pathlib import Path
 from loguru import logger
 import warnings
 
+from interchange import count_rows, data_file
+from storage import BUCKET_NAME, upload_files
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -53,9 +54,9 @@ def main():
         logger.info("📋 Récupération des métriques du pipeline...")
 
         metrics = {
-            "ERP_brut": pd.read_csv(RAW_PATH / "erp.csv").shape[0],
-            "Web_brut": pd.read_csv(RAW_PATH / "web.csv").shape[0],
-            "Liaison_brut": pd.read_csv(RAW_PATH / "liaison.csv").shape[0],
+            "ERP_brut": count_rows(con, RAW_PATH / data_file("erp")),
+            "Web_brut": count_rows(con, RAW_PATH / data_file("web")),
+            "Liaison_brut": count_rows(con, RAW_PATH / data_file("liaison")),
             "ERP_nettoye": con.execute("SELECT COUNT(*) FROM erp_clean").fetchone()[0],
             "Web_nettoye": con.execute("SELECT COUNT(*) FROM web_clean").fetchone()[0],
             "Liaison_nettoye": con.execute("SELECT COUNT(*) FROM liaison_clean").fetchone()[0],
@@ -65,7 +66,7 @@ def main():
             "Fusion": con.execute("SELECT COUNT(*) FROM fusion").fetchone()[0],
             "CA_total": con.execute("SELECT ca_total FROM ca_total").fetchone()[0],
             "Produits_CA": con.execute("SELECT COUNT(*) FROM ca_par_produit").fetchone()[0],
-            "Vins_millesimes": pd.read_csv(OUTPUTS_PATH / "vins_millesimes.csv").shape[0],
+            "Vins_millesimes": count_rows(con, OUTPUTS_PATH / data_file("vins_millesimes")),
         }
 
         logger.success("✅ Données récupérées avec succès.")
@@ -99,24 +100,18 @@ def main():
         sys.exit(1)
 
     # ☁️ Upload vers MinIO
-    try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=os.getenv("MINIO_ENDPOINT", "http://minio:9000"),
-            aws_access_key_id=os.getenv("MINIO_ACCESS_KEY", "admin"),
-            aws_secret_access_key=os.getenv("MINIO_SECRET_KEY", "admin1234"),
-            region_name="us-east-1",
-        )
-        bucket_name = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
-        prefix = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
-
-        for filename in ["rapport_final.csv", "rapport_final.xlsx"]:
-            local_path = OUTPUTS_PATH / filename
-            s3_key = f"{prefix}{filename}"
-            s3_client.upload_file(str(local_path), bucket_name, s3_key)
-            logger.success(f"🚀 Upload réussi : {filename} ➔ {s3_key}")
-    except Exception as e:
-        logger.error(f"❌ Échec de l’upload vers MinIO : {e}")
+    prefix = os.getenv("MINIO_DESTINATION_PREFIX", "data/outputs/")
+    items = [(OUTPUTS_PATH / f, f"{prefix}{f}") for f in ["rapport_final.csv", "rapport_final.xlsx"]]
+    failed = False
+    for local_path, s3_key, unchanged, error in upload_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Échec de l’upload vers MinIO ({local_path.name}) : {error}")
+            failed = True
+        elif unchanged:
+            logger.info(f"⏭️ Inchangé, upload ignoré : {local_path.name} ➔ {s3_key}")
+        else:
+            logger.success(f"🚀 Upload réussi : {local_path.name} ➔ {s3_key}")
+    if failed:
         sys.exit(1)
 
     logger.success("🎯 Rapport final archivé avec succès dans MinIO.")
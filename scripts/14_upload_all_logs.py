@@ -4,11 +4,11 @@
 
 import os
 import sys
-import boto3
-from botocore.exceptions import ClientError
 from pathlib import Path
 from loguru import logger
 
+from storage import BUCKET_NAME, get_s3_client, log_transfer_summary, upload_files
+
 # ==============================================================================
 # 🔧 Initialisation des logs d'exécution
 # ==============================================================================
@@ -25,21 +25,9 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 📤 Fonction principale : upload des logs
 # ==============================================================================
 def main():
-    # 🌍 Configuration MinIO (via .env ou Airflow)
-    MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
-    ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
-    SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
-    BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
-
-    # ✅ Connexion à MinIO
+    # ✅ Connexion à MinIO (configuration via .env ou Airflow, cf. storage.py)
     try:
-        s3_client = boto3.client(
-            "s3",
-            endpoint_url=MINIO_ENDPOINT,
-            aws_access_key_id=ACCESS_KEY,
-            aws_secret_access_key=SECRET_KEY,
-            region_name="us-east-1",
-        )
+        get_s3_client()
         logger.success("✅ Connexion à MinIO établie.")
     except Exception as e:
         logger.error(f"❌ Connexion à MinIO échouée : {e}")
@@ -54,15 +42,20 @@ def main():
     logger.info(f"📂 {len(logs_files)} fichier(s) log trouvé(s) à uploader.")
 
     # 🚀 Upload vers MinIO
-    for log_file in logs_files:
-        s3_key = f"logs/{log_file.name}"
-        try:
-            s3_client.upload_file(str(log_file), BUCKET_NAME, s3_key)
+    items = [(log_file, f"logs/{log_file.name}") for log_file in logs_files]
+    failed = False
+    for log_file, s3_key, unchanged, error in upload_files(items, BUCKET_NAME):
+        if error:
+            logger.error(f"❌ Échec de l’upload de {log_file.name} : {error}")
+            failed = True
+        elif unchanged:
+            logger.info(f"⏭️ Inchangé, upload ignoré : {log_file.name} ➔ {s3_key}")
+        else:
             logger.success(f"📤 Upload réussi : {log_file.name} ➔ {s3_key}")
-        except ClientError as e:
-            logger.error(f"❌ Échec de l’upload de {log_file.name} : {e}")
-            sys.exit(1)
+    if failed:
+        sys.exit(1)
 
+    log_transfer_summary()
     logger.success("🎯 Tous les fichiers logs ont été uploadés avec succès.")
 
 # ==============================================================================
@@ -0,0 +1,116 @@
+# === Module commun - Règles de nettoyage déclaratives ===
+# Les règles de qualité de chaque source sont déclarées ici une seule fois
+# (non-nullité, plage, énumération, expression régulière) puis compilées en SQL
+# DuckDB : masque de rejet évalué en un seul parcours par le script 05, et
+# requête de validation unique (une agrégation, un compteur par règle) pour les tests.
+
+# ==============================================================================
+# 🧱 Constructeurs de règles
+# Une règle est un dict {name, column, check, ...} ; 'name' sert de code de rejet.
+# Une valeur NULL ne viole que les règles not_null.
+# ==============================================================================
+def not_null(column: str, name: str = None) -> dict:
+    return {"name": name or f"{column}_null", "column": column, "check": "not_null"}
+
+
+def in_range(column: str, min_value=None, max_value=None, min_inclusive: bool = True,
+             max_inclusive: bool = True, name: str = None) -> dict:
+    return {
+        "name": name or f"{column}_out_of_range", "column": column, "check": "range",
+        "min": min_value, "max": max_value, "min_inclusive": min_inclusive, "max_inclusive": max_inclusive,
+    }
+
+
+def one_of(column: str, values: list, name: str = None) -> dict:
+    return {"name": name or f"{column}_unexpected_value", "column": column, "check": "enum", "values": list(values)}
+
+
+def matches(column: str, pattern: str, name: str = None) -> dict:
+    return {"name": name or f"{column}_bad_format", "column": column, "check": "regex", "pattern": pattern}
+
+# ==============================================================================
+# 📏 Règles par source (le bit de chaque règle suit l'ordre de déclaration)
+# ==============================================================================
+CLEAN_RULES = {
+    "erp": [
+        not_null("product_id"),
+        not_null("onsale_web"),
+        not_null("price"),
+        in_range("price", min_value=0, min_inclusive=False, name="price_non_positive"),
+        not_null("stock_quantity"),
+        not_null("stock_status"),
+    ],
+    "web": [
+        not_null("sku"),
+    ],
+    "liaison": [
+        not_null("product_id"),
+        not_null("id_web"),
+    ],
+}
+
+# ==============================================================================
+# ⚙️ Compilation en SQL DuckDB
+# ==============================================================================
+def _literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def condition_sql(rule: dict) -> str:
+    """Condition SQL que doit respecter une ligne pour satisfaire la règle."""
+    column = f'"{rule["column"]}"'
+    check = rule["check"]
+    if check == "not_null":
+        return f"{column} IS NOT NULL"
+    if check == "range":
+        bounds = []
+        if rule["min"] is not None:
+            bounds.append(f"{column} {'>=' if rule['min_inclusive'] else '>'} {_literal(rule['min'])}")
+        if rule["max"] is not None:
+            bounds.append(f"{column} {'<=' if rule['max_inclusive'] else '<'} {_literal(rule['max'])}")
+        return f"{column} IS NULL OR ({' AND '.join(bounds) or 'TRUE'})"
+    if check == "enum":
+        return f"{column} IS NULL OR {column} IN ({', '.join(_literal(v) for v in rule['values'])})"
+    if check == "regex":
+        return f"{column} IS NULL OR regexp_full_match(CAST({column} AS VARCHAR), {_literal(rule['pattern'])})"
+    raise ValueError(f"Type de règle inconnu : {check} ({rule['name']})")
+
+
+def violation_sql(rule: dict) -> str:
+    """Une condition NULL (non évaluable) compte comme une violation."""
+    return f"({condition_sql(rule)}) IS NOT TRUE"
+
+
+def rejection_mask_sql(rules: list) -> str:
+    """Masque de bits des règles enfreintes, évalué en une seule expression par ligne."""
+    return " | ".join(
+        f"(CASE WHEN {violation_sql(rule)} THEN {1 << bit} ELSE 0 END)"
+        for bit, rule in enumerate(rules)
+    )
+
+
+def rejection_reasons_sql(rules: list, mask_column: str = "rejection_mask") -> str:
+    """Liste des noms de règles enfreintes, déduite de la colonne masque."""
+    reasons = ", ".join(
+        f"CASE WHEN {mask_column} & {1 << bit} <> 0 THEN {_literal(rule['name'])} END"
+        for bit, rule in enumerate(rules)
+    )
+    return f"list_filter([{reasons}], r -> r IS NOT NULL)"
+
+
+def rule_counts_sql(rules: list, mask_column: str = "rejection_mask") -> str:
+    """Agrégats comptant, à partir du masque, les lignes rejetées par chaque règle."""
+    return ", ".join(
+        f"COUNT(*) FILTER (WHERE {mask_column} & {1 << bit} <> 0)" for bit in range(len(rules))
+    )
+
+# ==============================================================================
+# 🧪 Validation
+# ==============================================================================
+def count_violations(con, table: str, rules: list) -> dict:
+    """Nombre de lignes de 'table' violant chaque règle, en une seule agrégation."""
+    counts = ", ".join(f"COUNT(*) FILTER (WHERE {violation_sql(rule)})" for rule in rules)
+    row = con.execute(f"SELECT {counts} FROM {table}").fetchone()
+    return {rule["name"]: n for rule, n in zip(rules, row)}
@@ -0,0 +1,57 @@
+# === Module commun - Tables DuckDB à clé déclarée ===
+# Les tables dédoublonnées et la table de fusion sont créées avec une clé primaire
+# (unicité garantie à l'écriture, index ART pour les recherches ponctuelles) et,
+# au besoin, des index secondaires sur les clés de jointure. Les tests vérifient
+# ensuite l'unicité par simple lecture des métadonnées (duckdb_constraints/duckdb_indexes).
+
+# ==============================================================================
+# 🏗️ Création
+# ==============================================================================
+def create_keyed_table(con, table: str, query: str, primary_key: str):
+    """Crée (ou remplace) 'table', vide, avec le schéma de 'query' et une clé primaire."""
+    columns = con.execute(f"DESCRIBE {query}").fetchall()
+    definitions = ", ".join(f'"{name}" {type_}' for name, type_, *_ in columns)
+    con.execute(f"CREATE OR REPLACE TABLE {table} ({definitions}, PRIMARY KEY ({primary_key}))")
+
+
+def build_keyed_table(con, table: str, query: str, primary_key: str, indexes: list = ()) -> int:
+    """
+    Crée 'table' avec sa clé primaire puis la remplit avec 'query' ; les index
+    secondaires sont construits après le chargement. Retourne le nombre de lignes.
+    """
+    create_keyed_table(con, table, query, primary_key)
+    con.execute(f"INSERT INTO {table} {query}")
+    create_indexes(con, table, indexes)
+    return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def index_name(table: str, column: str) -> str:
+    return f"idx_{table}_{column}"
+
+
+def create_indexes(con, table: str, columns: list):
+    for column in columns:
+        con.execute(f"CREATE INDEX IF NOT EXISTS {index_name(table, column)} ON {table} ({column})")
+
+
+def drop_indexes(con, table: str, columns: list):
+    for column in columns:
+        con.execute(f"DROP INDEX IF EXISTS {index_name(table, column)}")
+
+# ==============================================================================
+# 🔎 Métadonnées
+# ==============================================================================
+def primary_key(con, table: str) -> list:
+    """Colonnes de la clé primaire déclarée de 'table' (liste vide si aucune)."""
+    row = con.execute("""
+        SELECT constraint_column_names FROM duckdb_constraints()
+        WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'
+    """, [table]).fetchone()
+    return list(row[0]) if row else []
+
+
+def indexes(con, table: str) -> list:
+    """Noms des index secondaires (hors clé primaire) de 'table'."""
+    return [row[0] for row in con.execute(
+        "SELECT index_name FROM duckdb_indexes() WHERE table_name = ?", [table]
+    ).fetchall()]
@@ -0,0 +1,214 @@
+# === Module commun - Lecture Excel en streaming (backends interchangeables) ===
+# Ce module lit la première feuille d'un classeur Excel ligne par ligne via un
+# backend enregistré ("calamine" par défaut, épinglé dans requirements.txt, ou
+# "openpyxl" en mode read-only), supprime les lignes/colonnes vides pendant le
+# parcours et écrit le CSV une seule fois, sans jamais matérialiser le classeur
+# complet en mémoire.
+
+import os
+import csv
+import pickle
+import tempfile
+from datetime import date, datetime
+from pathlib import Path
+
+try:
+    import python_calamine
+except ImportError:  # Environnement sans requirements.txt : repli sur openpyxl
+    python_calamine = None
+
+# ==============================================================================
+# ⚙️ Paramètres par défaut
+# ==============================================================================
+EXCEL_READER = os.getenv("EXCEL_READER", "auto")
+BATCH_SIZE = int(os.getenv("EXCEL_BATCH_SIZE", "10000"))
+
+# ==============================================================================
+# 🔌 Registre des backends de lecture
+# ==============================================================================
+READERS = {}
+
+
+def register_reader(name: str):
+    def decorator(func):
+        READERS[name] = func
+        return func
+    return decorator
+
+
+@register_reader("openpyxl")
+def iter_rows_openpyxl(path: Path):
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+if python_calamine is not None:
+    @register_reader("calamine")
+    def iter_rows_calamine(path: Path):
+        workbook = python_calamine.CalamineWorkbook.from_path(str(path))
+        yield from workbook.get_sheet_by_index(0).iter_rows()
+
+
+def available_readers() -> list:
+    return list(READERS)
+
+
+def resolve_reader(name: str = EXCEL_READER) -> str:
+    if name == "auto":
+        return "calamine" if "calamine" in READERS else "openpyxl"
+    if name not in READERS:
+        raise ValueError(f"Backend Excel inconnu ou indisponible : {name} (disponibles : {available_readers()})")
+    return name
+
+# ==============================================================================
+# 🧹 Normalisation des cellules et de l'en-tête
+# ==============================================================================
+def _normalize_cell(value):
+    """
+    Cellule vide -> None ; flottant entier -> int ; date -> datetime
+    (les backends diffèrent sur ces points, openpyxl sert de référence).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _build_header(row: tuple) -> list:
+    """Reproduit les noms de colonnes de pd.read_excel ('Unnamed: i', suffixes '.1' des doublons)."""
+    header, seen = [], {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None or value == "" else str(_normalize_cell(value))
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f"{base}.{seen[base]}"
+        seen[name] = 0
+        header.append(name)
+    return header
+
+
+def iter_batches(rows, width: int, batch_size: int = BATCH_SIZE, stats: dict = None):
+    """
+    Regroupe les lignes par lots en écartant les lignes entièrement vides.
+    Si 'stats' est fourni, y compte les lignes vides situées avant une ligne
+    non vide (pandas les lit comme des NaN avant de les supprimer).
+    """
+    batch, pending_empty = [], 0
+    for row in rows:
+        values = [_normalize_cell(v) for v in row[:width]]
+        if len(values) < width:
+            values.extend([None] * (width - len(values)))
+        if all(v is None for v in values):
+            pending_empty += 1
+            continue
+        if stats is not None and pending_empty:
+            stats["interior_empty_rows"] = stats.get("interior_empty_rows", 0) + pending_empty
+        pending_empty = 0
+        batch.append(values)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ==============================================================================
+# 📄 Conversion Excel ➔ CSV incrémentale
+# ==============================================================================
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def convert_excel_to_csv(excel_path: Path, csv_path: Path, reader: str = EXCEL_READER,
+                         batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Convertit la première feuille de 'excel_path' en CSV.
+    Le parcours écarte les lignes vides et relève, colonne par colonne, les vides et
+    les types rencontrés ; les lots sont mis de côté dans un fichier temporaire binaire
+    (valeurs Python telles que lues, sans formatage). Le CSV est ensuite écrit une seule
+    fois, sans les colonnes vides, avec le format définitif de chaque colonne : les
+    colonnes numériques contenant des vides (ou des décimaux) sont écrites en flottants,
+    comme le faisait pd.read_excel + to_csv.
+    Retourne les statistiques de conversion (backend, lignes, colonnes).
+    """
+    reader = resolve_reader(reader)
+    rows = iter(READERS[reader](Path(excel_path)))
+    csv_path = Path(csv_path)
+    tmp_path = csv_path.with_name(csv_path.name + ".tmp")
+
+    try:
+        header = _build_header(next(rows, ()))
+        width = len(header)
+        non_empty, has_null = [False] * width, [False] * width
+        numeric, has_decimal = [True] * width, [False] * width
+        scan = {}
+        nb_rows = 0
+
+        with tempfile.TemporaryFile(dir=csv_path.parent) as spill:
+            for batch in iter_batches(rows, width, batch_size, scan):
+                for values in batch:
+                    for i, v in enumerate(values):
+                        if v is None:
+                            has_null[i] = True
+                        else:
+                            non_empty[i] = True
+                            if not _is_number(v):
+                                numeric[i] = False
+                            elif isinstance(v, float):
+                                has_decimal[i] = True
+                pickle.dump(batch, spill, protocol=pickle.HIGHEST_PROTOCOL)
+                nb_rows += len(batch)
+
+            kept = [i for i in range(width) if non_empty[i]]
+            interior_nulls = scan.get("interior_empty_rows", 0) > 0
+            float_cols = {
+                i for i in kept
+                if numeric[i] and (has_null[i] or has_decimal[i] or interior_nulls)
+            }
+
+            spill.seek(0)
+            _write_csv(_load_batches(spill), tmp_path, [header[i] for i in kept],
+                       [(i, i in float_cols) for i in kept])
+        tmp_path.replace(csv_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return {
+        "reader": reader,
+        "rows": nb_rows,
+        "columns": len(kept),
+        "dropped_columns": [header[i] for i in range(width) if not non_empty[i]],
+    }
+
+
+def _load_batches(spill):
+    """Relit les lots mis de côté par convert_excel_to_csv."""
+    while True:
+        try:
+            yield pickle.load(spill)
+        except EOFError:
+            return
+
+
+def _write_csv(batches, dest_path: Path, header: list, columns: list):
+    """
+    Écrit le CSV en une fois : 'columns' liste les colonnes conservées
+    (indice, écrite en flottant ou non).
+    """
+    with open(dest_path, "w", newline="", encoding="utf-8") as dest:
+        writer = csv.writer(dest, lineterminator="\n")
+        writer.writerow(header)
+        for batch in batches:
+            writer.writerows(
+                [float(values[i]) if as_float and values[i] is not None else values[i] for i, as_float in columns]
+                for values in batch
+            )
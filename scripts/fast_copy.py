@@ -0,0 +1,113 @@
+# === Module commun - Copie rapide de fichiers (reflink, zero-copy, tampon) ===
+# Copie d'un fichier par la stratégie la plus économique disponible, essayées dans l'ordre :
+#   1. reflink  : clone copy-on-write (ioctl FICLONE, XFS/Btrfs/...) - instantané, aucun bloc dupliqué ;
+#   2. copy_file_range : copie dans le noyau, sans passer par l'espace utilisateur ;
+#   3. sendfile : idem via sendfile(2) pour les noyaux/systèmes de fichiers plus anciens ;
+#   4. buffered : copie classique par blocs.
+# Une stratégie non supportée (EOPNOTSUPP, EXDEV, EINVAL...) fait passer à la suivante ;
+# la stratégie retenue et la durée sont retournées à l'appelant pour journalisation.
+
+import os
+import time
+import uuid
+import shutil
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ==============================================================================
+# 🔧 Configuration
+# ==============================================================================
+STRATEGIES = ("reflink", "copy_file_range", "sendfile", "buffered")
+COPY_STRATEGIES = tuple(
+    s.strip() for s in os.getenv("COPY_STRATEGIES", ",".join(STRATEGIES)).split(",") if s.strip()
+)
+COPY_BUFFER_SIZE = int(os.getenv("COPY_BUFFER_SIZE", str(8 * 1024 * 1024)))
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int), linux/fs.h
+
+# ==============================================================================
+# 🧩 Stratégies (src et dst sont des descripteurs ouverts, dst vide)
+# ==============================================================================
+def _reflink(src: int, dst: int, size: int):
+    if fcntl is None:
+        raise OSError("reflink indisponible sur cette plateforme")
+    fcntl.ioctl(dst, FICLONE, src)
+
+
+def _copy_file_range(src: int, dst: int, size: int):
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("copy_file_range indisponible sur cette plateforme")
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(src, dst, min(size - copied, 1 << 30))
+        if n == 0:
+            break
+        copied += n
+    if copied != size:
+        raise OSError(f"copy_file_range incomplet ({copied}/{size} octets)")
+
+
+def _sendfile(src: int, dst: int, size: int):
+    copied = 0
+    while copied < size:
+        n = os.sendfile(dst, src, copied, min(size - copied, 1 << 30))
+        if n == 0:
+            break
+        copied += n
+    if copied != size:
+        raise OSError(f"sendfile incomplet ({copied}/{size} octets)")
+
+
+def _buffered(src: int, dst: int, size: int):
+    with open(src, "rb", closefd=False) as fsrc, open(dst, "wb", closefd=False) as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+
+
+_IMPLEMENTATIONS = {
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _sendfile,
+    "buffered": _buffered,
+}
+
+# ==============================================================================
+# 📄 Copie
+# ==============================================================================
+def copy_file(src, dst, strategies: tuple = COPY_STRATEGIES, preserve_metadata: bool = True) -> tuple:
+    """
+    Copie 'src' vers 'dst' (remplacement atomique) avec la première stratégie
+    qui réussit. Avec 'preserve_metadata', les dates et permissions sont reprises
+    comme avec shutil.copy2. Retourne (stratégie utilisée, durée en secondes).
+    """
+    src, dst = Path(src), Path(dst)
+    unknown = [s for s in strategies if s not in _IMPLEMENTATIONS]
+    if unknown:
+        raise ValueError(f"Stratégie(s) de copie inconnue(s) : {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+    errors = []
+    try:
+        with open(src, "rb") as fsrc:
+            size = os.fstat(fsrc.fileno()).st_size
+            for strategy in strategies:
+                try:
+                    with open(tmp, "wb") as fdst:
+                        _IMPLEMENTATIONS[strategy](fsrc.fileno(), fdst.fileno(), size)
+                except OSError as e:
+                    errors.append(f"{strategy} : {e}")
+                    fsrc.seek(0)
+                    continue
+                break
+            else:
+                raise OSError(f"Aucune stratégie de copie n'a abouti ({'; '.join(errors)})")
+        if preserve_metadata:
+            shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return strategy, time.perf_counter() - started
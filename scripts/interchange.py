@@ -0,0 +1,193 @@
+# === Module commun - Format d'échange entre les étapes du pipeline ===
+# Les étapes se transmettent leurs données en CSV (par défaut) ou en Parquet
+# (INTERCHANGE_FORMAT=parquet) : schéma typé, compression zstd et statistiques
+# min/max par row group. En mode Parquet, l'export CSV devient optionnel (CSV_EXPORT=1).
+# Les tables nettoyées restent dans DuckDB pour le dédoublonnage ; leur export en
+# fichiers (puis upload MinIO) peut être désactivé (CLEAN_EXPORT=0).
+
+import os
+import shutil
+from pathlib import Path
+
+# ==============================================================================
+# ⚙️ Configuration (variables d'environnement)
+# ==============================================================================
+INTERCHANGE_FORMAT = os.getenv("INTERCHANGE_FORMAT", "csv").lower()
+if INTERCHANGE_FORMAT not in ("csv", "parquet"):
+    raise ValueError(f"INTERCHANGE_FORMAT invalide : {INTERCHANGE_FORMAT} (csv | parquet)")
+
+CSV_EXPORT = INTERCHANGE_FORMAT == "csv" or os.getenv("CSV_EXPORT", "0") == "1"
+CLEAN_EXPORT = os.getenv("CLEAN_EXPORT", "1") == "1"
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", "122880"))
+XLSX_BATCH_SIZE = int(os.getenv("XLSX_BATCH_SIZE", "10000"))
+
+# ==============================================================================
+# 🧱 Schémas typés des sources (colonnes de jointure / règles métier)
+# Les autres colonnes restent inférées, une seule fois, à la conversion.
+# ==============================================================================
+SCHEMAS = {
+    "erp": {
+        "product_id": "BIGINT",
+        "onsale_web": "BIGINT",
+        "price": "DOUBLE",
+        "stock_quantity": "BIGINT",
+        "stock_status": "VARCHAR",
+    },
+    "liaison": {
+        "product_id": "BIGINT",
+        "id_web": "VARCHAR",
+    },
+    "web": {
+        "sku": "VARCHAR",
+        "post_date": "TIMESTAMP",
+        "post_modified": "TIMESTAMP",
+        "post_type": "VARCHAR",
+    },
+}
+
+# ==============================================================================
+# 📄 Noms de fichiers et lecture
+# ==============================================================================
+def data_file(stem: str, fmt: str = INTERCHANGE_FORMAT) -> str:
+    return f"{stem}.{fmt}"
+
+
+def read_sql(path, types: dict = None) -> str:
+    """
+    Expression DuckDB de lecture du fichier (format déduit de l'extension).
+    'path' peut être un chemin local ou une URI s3:// (lecture directe via httpfs).
+    'types' force le type de colonnes d'un CSV ; il ne sert qu'à la conversion vers
+    Parquet (csv_to_interchange), les étapes en CSV gardant les types inférés.
+    Un dossier partitionné (export_table avec 'partition_by') est lu comme un seul
+    jeu de données, colonnes de partition en fin de schéma.
+    """
+    if Path(path).is_dir():
+        fmt = Path(path).suffix.lstrip(".")
+        reader = "read_parquet" if fmt == "parquet" else "read_csv_auto"
+        return f"{reader}('{Path(path) / '**' / f'*.{fmt}'}', hive_partitioning = true)"
+    path = str(path)
+    if path.endswith(".parquet"):
+        return f"read_parquet('{path}')"
+    if types:
+        columns = ", ".join(f"'{name}': '{type_}'" for name, type_ in types.items())
+        return f"read_csv_auto('{path}', types={{{columns}}})"
+    return f"read_csv_auto('{path}')"
+
+
+def count_rows(con, path: Path) -> int:
+    """Nombre de lignes d'un fichier d'échange (métadonnées seules en Parquet)."""
+    return con.execute(f"SELECT COUNT(*) FROM {read_sql(path)}").fetchone()[0]
+
+# ==============================================================================
+# 💾 Écriture
+# ==============================================================================
+def export_formats() -> list:
+    """Formats écrits par un export : format d'échange, puis CSV si demandé."""
+    formats = [INTERCHANGE_FORMAT]
+    if CSV_EXPORT and "csv" not in formats:
+        formats.append("csv")
+    return formats
+
+
+def copy_options(fmt: str, partition_by: list = None) -> str:
+    if fmt == "parquet":
+        options = [f"FORMAT PARQUET, COMPRESSION {PARQUET_COMPRESSION}, ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE}"]
+    else:
+        options = ["HEADER, DELIMITER ','"]
+    if partition_by:
+        options.append(f"PARTITION_BY ({', '.join(partition_by)})")
+    return f"({', '.join(options)})"
+
+
+def export_table(con, source: str, directory: Path, stem: str, partition_by: list = None) -> list:
+    """
+    Exporte une table (ou une requête entre parenthèses) via COPY ... TO, en streaming,
+    au format d'échange et, si demandé, en CSV. Retourne les fichiers écrits.
+    Avec 'partition_by', chaque format est écrit en dossier partitionné (Hive :
+    <stem>.<format>/<colonne>=<valeur>/...) au lieu d'un fichier unique.
+    """
+    written = []
+    for fmt in export_formats():
+        path = Path(directory) / data_file(stem, fmt)
+        # L'export précédent est retiré (fichier, ou dossier partitionné et ses partitions obsolètes)
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif partition_by:
+            path.unlink(missing_ok=True)
+        con.execute(f"COPY {source} TO '{path}' {copy_options(fmt, partition_by)}")
+        written.append(path)
+    return written
+
+
+def open_batch_writers(directory: Path, stem: str, schema) -> list:
+    """
+    Ouvre un écrivain Arrow par format d'export (mêmes fichiers que export_table),
+    pour écrire un résultat lot par lot (write_batch) sans le matérialiser.
+    Retourne des tuples (chemin, écrivain) ; chaque écrivain doit être fermé (close).
+    """
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    writers = []
+    for fmt in export_formats():
+        path = Path(directory) / data_file(stem, fmt)
+        if path.is_dir():
+            shutil.rmtree(path)
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+        else:
+            writer = pa_csv.CSVWriter(path, schema)
+        writers.append((path, writer))
+    return writers
+
+
+def export_xlsx(con, source: str, path: Path, batch_size: int = XLSX_BATCH_SIZE) -> Path:
+    """
+    Écrit une table (ou une requête entre parenthèses) en XLSX par lots de lignes
+    (openpyxl en mode write-only), sans matérialiser le résultat en DataFrame.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    cursor = con.execute(f"SELECT * FROM {source}")
+    header = []
+    for column in cursor.description:
+        cell = WriteOnlyCell(ws, value=column[0])
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    while rows := cursor.fetchmany(batch_size):
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return Path(path)
+
+
+def export_frame(con, df, directory: Path, stem: str) -> list:
+    """Exporte un DataFrame pandas via DuckDB (même formats que export_table)."""
+    con.register("_export_frame", df)
+    try:
+        return export_table(con, "(SELECT * FROM _export_frame)", directory, stem)
+    finally:
+        con.unregister("_export_frame")
+
+
+def csv_to_interchange(con, csv_path: Path, stem: str) -> Path:
+    """
+    Convertit un CSV brut au format d'échange en appliquant le schéma typé de 'stem'.
+    En mode Parquet, le CSV est supprimé sauf si CSV_EXPORT=1.
+    """
+    csv_path = Path(csv_path)
+    if INTERCHANGE_FORMAT == "csv":
+        return csv_path
+
+    target = csv_path.with_name(data_file(stem))
+    source = f"(SELECT * FROM {read_sql(csv_path, SCHEMAS.get(stem))})"
+    con.execute(f"COPY {source} TO '{target}' {copy_options(INTERCHANGE_FORMAT)}")
+    if not CSV_EXPORT:
+        csv_path.unlink()
+    return target
@@ -0,0 +1,177 @@
+# === Module commun - Scores d'anomalie segmentés (Z-score, MAD, IQR) ===
+# Les segmentations (global, par stock_status, par tranche de prix...) et les méthodes
+# de score sont déclarées ici puis compilées en SQL DuckDB :
+#   - une seule agrégation GROUP BY GROUPING SETS calcule les statistiques de toutes
+#     les segmentations (moyenne, écart-type, médiane, MAD, quartiles) -> table <prefix>_stats ;
+#   - une jointure attribue à chaque ligne, pour chaque segmentation, les scores de
+#     toutes les méthodes et l'indicateur d'anomalie (seuil configurable) -> table <prefix>_scores.
+# Méthodes : 'zscore' (moyenne/écart-type), 'mad' (Z-score robuste 0.6745·(x - médiane)/MAD),
+# 'iqr' (distance hors de [Q1, Q3] en nombre d'IQR ; 0 à l'intérieur).
+
+import os
+
+# ==============================================================================
+# 🔧 Configuration
+# ==============================================================================
+DEFAULT_THRESHOLDS = {"zscore": 2.0, "mad": 3.5, "iqr": 1.5}
+
+
+def parse_thresholds(value: str) -> dict:
+    """'zscore=2,mad=3.5' -> {'zscore': 2.0, 'mad': 3.5} (méthodes absentes : seuil par défaut)."""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        method, _, threshold = item.partition("=")
+        if method not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"Méthode de score inconnue : {method}")
+        thresholds[method] = float(threshold)
+    return thresholds
+
+
+OUTLIER_THRESHOLDS = parse_thresholds(os.getenv("OUTLIER_THRESHOLDS", ""))
+OUTLIER_TAIL = os.getenv("OUTLIER_TAIL", "upper")  # upper (prix anormalement élevés) | lower | both
+PRICE_BANDS = [float(b) for b in os.getenv("PRICE_BANDS", "15,30,60").split(",") if b.strip()]
+
+# ==============================================================================
+# 🧱 Segmentations (nom -> expression SQL du segment ; None = population entière)
+# ==============================================================================
+def bands(column: str, bounds: list) -> str:
+    """Expression SQL de tranche : '<15', '15-30', ..., '>=60' pour bounds=[15, 30, 60]."""
+    bounds = sorted(bounds)
+    cases = [f"WHEN \"{column}\" < {bounds[0]} THEN '<{bounds[0]:g}'"]
+    cases += [f"WHEN \"{column}\" < {high} THEN '{low:g}-{high:g}'" for low, high in zip(bounds, bounds[1:])]
+    return f"CASE {' '.join(cases)} WHEN \"{column}\" IS NOT NULL THEN '>={bounds[-1]:g}' END"
+
+
+SEGMENTATIONS = {
+    "global": None,
+    "stock_status": '"stock_status"',
+    "price_band": bands("price", PRICE_BANDS),
+}
+
+# ==============================================================================
+# ⚙️ Compilation en SQL DuckDB
+# ==============================================================================
+def _segment_column(name: str) -> str:
+    return f'"seg_{name}"'
+
+
+def _source_sql(source: str, key: str, value: str, segmentations: dict) -> str:
+    segments = "".join(
+        f", {expression} AS {_segment_column(name)}"
+        for name, expression in segmentations.items() if expression is not None
+    )
+    return f'SELECT "{key}" AS item_key, "{value}" AS value{segments} FROM {source} WHERE "{value}" IS NOT NULL'
+
+
+def stats_sql(source: str, key: str, value: str, segmentations: dict) -> str:
+    """Statistiques de toutes les segmentations en une seule agrégation (GROUPING SETS)."""
+    grouped = [name for name, expression in segmentations.items() if expression is not None]
+    grouping_sets = ", ".join(
+        "()" if expression is None else f"({_segment_column(name)})"
+        for name, expression in segmentations.items()
+    )
+    # Une seule segmentation groupée par ensemble : GROUPING(col) = 0 identifie laquelle.
+    global_name = next((n for n, e in segmentations.items() if e is None), "global")
+    segmentation, segment = f"'{global_name}'", "'all'"
+    if grouped:
+        segmentation = "CASE " + " ".join(
+            f"WHEN GROUPING({_segment_column(n)}) = 0 THEN '{n}'" for n in grouped
+        ) + f" ELSE {segmentation} END"
+        segment = "CASE " + " ".join(
+            f"WHEN GROUPING({_segment_column(n)}) = 0 THEN COALESCE(CAST({_segment_column(n)} AS VARCHAR), 'NULL')"
+            for n in grouped
+        ) + f" ELSE {segment} END"
+    return f"""
+        WITH src AS ({_source_sql(source, key, value, segmentations)})
+        SELECT
+            {segmentation} AS segmentation,
+            {segment} AS segment,
+            COUNT(*) AS n,
+            AVG(value) AS mean,
+            STDDEV_SAMP(value) AS std,
+            MEDIAN(value) AS median,
+            MAD(value) AS mad,
+            QUANTILE_CONT(value, 0.25) AS q1,
+            QUANTILE_CONT(value, 0.75) AS q3
+        FROM src
+        GROUP BY GROUPING SETS ({grouping_sets})
+    """
+
+
+def score_sql(method: str, value: str = "l.value", stats: str = "s") -> str:
+    """Expression du score d'une ligne pour 'method' (NULL si la dispersion du segment est nulle)."""
+    if method == "zscore":
+        return f"({value} - {stats}.mean) / NULLIF({stats}.std, 0)"
+    if method == "mad":
+        return f"0.6745 * ({value} - {stats}.median) / NULLIF({stats}.mad, 0)"
+    if method == "iqr":
+        iqr = f"NULLIF({stats}.q3 - {stats}.q1, 0)"
+        return (
+            f"CASE WHEN {value} > {stats}.q3 THEN ({value} - {stats}.q3) / {iqr} "
+            f"WHEN {value} < {stats}.q1 THEN ({value} - {stats}.q1) / {iqr} ELSE 0 END"
+        )
+    raise ValueError(f"Méthode de score inconnue : {method}")
+
+
+def outlier_sql(score: str, threshold: float, tail: str) -> str:
+    """Indicateur d'anomalie selon la queue considérée (un score NULL n'est jamais une anomalie)."""
+    if tail == "upper":
+        condition = f"{score} > {threshold}"
+    elif tail == "lower":
+        condition = f"{score} < -{threshold}"
+    elif tail == "both":
+        condition = f"abs({score}) > {threshold}"
+    else:
+        raise ValueError(f"Queue inconnue : {tail} (upper | lower | both)")
+    return f"COALESCE({condition}, FALSE)"
+
+
+def scores_sql(source: str, key: str, value: str, segmentations: dict, stats_table: str,
+               thresholds: dict, tail: str) -> str:
+    """Une ligne par (segmentation, élément) avec score_<méthode> et outlier_<méthode>."""
+    rows = " UNION ALL ".join(
+        f"SELECT item_key, value, '{name}' AS segmentation, "
+        + ("'all'" if expression is None else f"COALESCE(CAST({_segment_column(name)} AS VARCHAR), 'NULL')")
+        + " AS segment FROM src"
+        for name, expression in segmentations.items()
+    )
+    columns = ", ".join(
+        f"{score_sql(method)} AS score_{method}, {outlier_sql(score_sql(method), threshold, tail)} AS outlier_{method}"
+        for method, threshold in thresholds.items()
+    )
+    return f"""
+        WITH src AS ({_source_sql(source, key, value, segmentations)}),
+             long AS ({rows})
+        SELECT l.segmentation, l.segment, l.item_key AS "{key}", l.value AS "{value}", {columns}
+        FROM long l
+        JOIN {stats_table} s USING (segmentation, segment)
+    """
+
+# ==============================================================================
+# 🚀 Exécution
+# ==============================================================================
+def score_outliers(con, source: str, key: str, value: str, segmentations: dict = None,
+                   thresholds: dict = None, tail: str = OUTLIER_TAIL, prefix: str = "outlier") -> dict:
+    """
+    Calcule les scores de 'value' (une table ou une requête entre parenthèses) pour
+    toutes les segmentations et méthodes, dans les tables <prefix>_stats et <prefix>_scores.
+    Retourne {(segmentation, méthode): nombre d'anomalies}.
+    """
+    segmentations = SEGMENTATIONS if segmentations is None else segmentations
+    thresholds = OUTLIER_THRESHOLDS if thresholds is None else thresholds
+    stats_table, scores_table = f"{prefix}_stats", f"{prefix}_scores"
+
+    con.execute(f"CREATE OR REPLACE TABLE {stats_table} AS {stats_sql(source, key, value, segmentations)}")
+    con.execute(
+        f"CREATE OR REPLACE TABLE {scores_table} AS "
+        f"{scores_sql(source, key, value, segmentations, stats_table, thresholds, tail)}"
+    )
+
+    counts = ", ".join(f"COUNT(*) FILTER (WHERE outlier_{method})" for method in thresholds)
+    result = {}
+    for segmentation, *row in con.execute(
+        f"SELECT segmentation, {counts} FROM {scores_table} GROUP BY segmentation ORDER BY segmentation"
+    ).fetchall():
+        for method, n in zip(thresholds, row):
+            result[(segmentation, method)] = n
+    return result
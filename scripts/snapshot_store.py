@@ -0,0 +1,315 @@
+# === Module commun - Magasin de snapshots DuckDB adressé par contenu ===
+# Un snapshot est un manifeste JSON (manifests/<id>.json) qui référence, pour chaque
+# table de la base, un fichier Parquet compressé nommé par son SHA-256 (objects/<sha>.parquet).
+# Une table dont l'empreinte (schéma + nombre de lignes + somme des hash de lignes,
+# calculée dans DuckDB) est déjà connue n'est pas réexportée : son objet est réutilisé.
+# Seules les tables modifiées sont donc écrites sur disque, et l'historique est conservé
+# jusqu'à la politique de rétention (N derniers snapshots et/ou âge maximal).
+# Avec SNAPSHOT_MODE=clone, le fichier DuckDB entier est cloné (clones/<id>.duckdb)
+# par la copie la plus économique disponible (reflink, puis zero-copy : voir fast_copy.py).
+
+import os
+import json
+import uuid
+import hashlib
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from fast_copy import copy_file
+
+# ==============================================================================
+# 🔧 Configuration
+# ==============================================================================
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "/opt/airflow/data/snapshots"))
+SNAPSHOT_MODE = os.getenv("SNAPSHOT_MODE", "parquet")                    # parquet | clone
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "zstd")
+SNAPSHOT_KEEP_LAST = int(os.getenv("SNAPSHOT_KEEP_LAST", "10"))           # 0 = illimité
+SNAPSHOT_MAX_AGE_DAYS = float(os.getenv("SNAPSHOT_MAX_AGE_DAYS", "0"))    # 0 = pas de limite d'âge
+# Clones sans reflink : chacun est une copie complète de la base, rétention plus courte
+SNAPSHOT_CLONE_KEEP_LAST = int(os.getenv("SNAPSHOT_CLONE_KEEP_LAST", "2"))  # 0 = illimité
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+ID_FORMAT = "%Y%m%dT%H%M%S%fZ"
+
+
+def objects_dir(store: Path = SNAPSHOT_DIR) -> Path:
+    return Path(store) / "objects"
+
+
+def manifests_dir(store: Path = SNAPSHOT_DIR) -> Path:
+    return Path(store) / "manifests"
+
+
+def clones_dir(store: Path = SNAPSHOT_DIR) -> Path:
+    return Path(store) / "clones"
+
+
+def new_snapshot_id() -> str:
+    return datetime.now(timezone.utc).strftime(ID_FORMAT)
+
+
+def created_at(snapshot_id: str) -> datetime:
+    return datetime.strptime(snapshot_id, ID_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def _resolve(ids: list, at=None) -> str:
+    """
+    Identifiant retenu parmi 'ids' (triés) : 'at' exact, ou dernier snapshot créé
+    à l'instant 'at' ou avant (datetime ou date ISO 8601). Sans 'at', le plus récent.
+    """
+    if not ids:
+        raise FileNotFoundError("Aucun snapshot disponible")
+    if at is None:
+        return ids[-1]
+    if isinstance(at, str):
+        if at in ids:
+            return at
+        at = datetime.fromisoformat(at)
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    candidates = [i for i in ids if created_at(i) <= at]
+    if not candidates:
+        raise FileNotFoundError(f"Aucun snapshot antérieur à {at.isoformat()}")
+    return candidates[-1]
+
+
+def _expired(ids: list, keep_last: int, max_age_days: float) -> list:
+    """Identifiants hors politique de rétention ; le plus récent est toujours conservé."""
+    now = datetime.now(timezone.utc)
+    expired = []
+    for position, snapshot_id in enumerate(reversed(ids)):
+        if position == 0:
+            continue
+        too_many = keep_last > 0 and position >= keep_last
+        too_old = max_age_days > 0 and now - created_at(snapshot_id) > timedelta(days=max_age_days)
+        if too_many or too_old:
+            expired.append(snapshot_id)
+    return expired
+
+
+def _write_json(path: Path, data: dict):
+    """Écriture atomique (fichier temporaire puis renommage)."""
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# ==============================================================================
+# 🔎 Tables et empreintes
+# ==============================================================================
+def list_tables(con) -> list:
+    """Tables persistantes de la base courante : (nom, DDL avec contraintes)."""
+    return con.execute("""
+        SELECT table_name, sql FROM duckdb_tables()
+        WHERE database_name = current_database() AND NOT temporary AND NOT internal
+        ORDER BY table_name
+    """).fetchall()
+
+
+def list_indexes(con) -> list:
+    """Index secondaires {table, sql} (recréés après chargement à la restauration)."""
+    return [{"table": table, "sql": sql} for table, sql in con.execute("""
+        SELECT table_name, sql FROM duckdb_indexes()
+        WHERE database_name = current_database() AND sql IS NOT NULL
+        ORDER BY table_name, index_name
+    """).fetchall()]
+
+
+def table_fingerprint(con, table: str, ddl: str) -> tuple:
+    """
+    Empreinte du contenu de 'table', indépendante de l'ordre des lignes :
+    un seul parcours en lecture, sans écriture. Retourne (empreinte, nb lignes).
+    """
+    columns = ", ".join(f'"{row[0]}"' for row in con.execute(f'DESCRIBE "{table}"').fetchall())
+    row_hash = f"hash({columns})"
+    rows, total = con.execute(
+        f'SELECT COUNT(*), COALESCE(SUM({row_hash}::HUGEINT), 0) FROM "{table}"'
+    ).fetchone()
+    fingerprint = hashlib.sha256(f"{ddl}\n{rows}\n{total}".encode("utf-8")).hexdigest()
+    return fingerprint, rows
+
+# ==============================================================================
+# 📚 Manifestes
+# ==============================================================================
+def list_snapshots(store: Path = SNAPSHOT_DIR) -> list:
+    """Manifestes du magasin, du plus ancien au plus récent."""
+    directory = manifests_dir(store)
+    if not directory.exists():
+        return []
+    manifests = [json.loads(p.read_text(encoding="utf-8")) for p in directory.glob("*.json")]
+    return sorted(manifests, key=lambda m: m["id"])
+
+
+def resolve_snapshot(at=None, store: Path = SNAPSHOT_DIR) -> dict:
+    """Manifeste du snapshot à restaurer (identifiant exact ou instant, voir _resolve)."""
+    snapshots = {manifest["id"]: manifest for manifest in list_snapshots(store)}
+    return snapshots[_resolve(sorted(snapshots), at)]
+
+
+def known_objects(store: Path = SNAPSHOT_DIR) -> dict:
+    """Index empreinte -> objet Parquet, construit à partir des manifestes existants."""
+    index = {}
+    for manifest in list_snapshots(store):
+        for entry in manifest["tables"].values():
+            if (objects_dir(store) / entry["object"]).exists():
+                index[entry["fingerprint"]] = entry["object"]
+    return index
+
+# ==============================================================================
+# 💾 Création
+# ==============================================================================
+def export_object(con, table: str, store: Path = SNAPSHOT_DIR) -> tuple:
+    """Exporte 'table' en Parquet compressé sous son SHA-256. Retourne (objet, octets écrits)."""
+    directory = objects_dir(store)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f".{table}.{uuid.uuid4().hex}.parquet.tmp"
+    try:
+        con.execute(
+            f"COPY \"{table}\" TO '{tmp.as_posix()}' "
+            f"(FORMAT PARQUET, COMPRESSION {SNAPSHOT_COMPRESSION})"
+        )
+        name = f"{_sha256(tmp)}.parquet"
+        target = directory / name
+        if target.exists():
+            return name, 0
+        size = tmp.stat().st_size
+        os.replace(tmp, target)
+        return name, size
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def create_snapshot(con, source: str = None, store: Path = SNAPSHOT_DIR) -> dict:
+    """
+    CHECKPOINT de la base puis snapshot incrémental : seules les tables dont
+    l'empreinte est inconnue du magasin sont exportées. Retourne le manifeste,
+    complété des statistiques de la création ('stats').
+    """
+    con.execute("CHECKPOINT")
+    index = known_objects(store)
+    snapshot_id = new_snapshot_id()
+    manifest = {
+        "id": snapshot_id,
+        "created_at": created_at(snapshot_id).isoformat(),
+        "source": source,
+        "tables": {},
+        "indexes": list_indexes(con),
+    }
+    stats = {"exported": [], "reused": [], "bytes_written": 0}
+
+    for table, ddl in list_tables(con):
+        fingerprint, rows = table_fingerprint(con, table, ddl)
+        name = index.get(fingerprint)
+        if name is None:
+            name, written = export_object(con, table, store)
+            index[fingerprint] = name
+            stats["exported"].append(table)
+            stats["bytes_written"] += written
+        else:
+            stats["reused"].append(table)
+        manifest["tables"][table] = {
+            "object": name,
+            "fingerprint": fingerprint,
+            "rows": rows,
+            "bytes": (objects_dir(store) / name).stat().st_size,
+            "sql": ddl,
+        }
+
+    manifests_dir(store).mkdir(parents=True, exist_ok=True)
+    _write_json(manifests_dir(store) / f"{manifest['id']}.json", manifest)
+    return {**manifest, "stats": stats}
+
+
+def clone_database(source: Path, store: Path = SNAPSHOT_DIR) -> dict:
+    """
+    Clone le fichier DuckDB 'source' (préalablement CHECKPOINTé et fermé) en
+    clones/<id>.duckdb. Retourne {id, path, strategy, seconds, bytes}.
+    """
+    clones_dir(store).mkdir(parents=True, exist_ok=True)
+    snapshot_id = new_snapshot_id()
+    path = clones_dir(store) / f"{snapshot_id}.duckdb"
+    strategy, seconds = copy_file(source, path)
+    return {"id": snapshot_id, "path": path, "strategy": strategy, "seconds": seconds,
+            "bytes": path.stat().st_size}
+
+
+def list_clones(store: Path = SNAPSHOT_DIR) -> list:
+    """Identifiants des clones, du plus ancien au plus récent."""
+    directory = clones_dir(store)
+    return sorted(p.stem for p in directory.glob("*.duckdb")) if directory.exists() else []
+
+
+def resolve_clone(at=None, store: Path = SNAPSHOT_DIR) -> Path:
+    """Fichier du clone à restaurer (identifiant exact ou instant, voir _resolve)."""
+    return clones_dir(store) / f"{_resolve(list_clones(store), at)}.duckdb"
+
+# ==============================================================================
+# ♻️ Restauration
+# ==============================================================================
+def restore_snapshot(con, manifest: dict, store: Path = SNAPSHOT_DIR, tables: list = None) -> dict:
+    """
+    Recrée dans 'con' les tables du snapshot (DDL d'origine, clés primaires incluses),
+    les recharge depuis leurs objets Parquet puis reconstruit les index secondaires.
+    Retourne {table: nb lignes restaurées}.
+    """
+    selected = tables or list(manifest["tables"])
+    restored = {}
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for table in selected:
+            entry = manifest["tables"][table]
+            path = objects_dir(store) / entry["object"]
+            if not path.exists():
+                raise FileNotFoundError(f"Objet manquant pour {table} : {path}")
+            con.execute(f'DROP TABLE IF EXISTS "{table}"')
+            con.execute(entry["sql"])
+            con.execute(f"INSERT INTO \"{table}\" SELECT * FROM read_parquet('{path.as_posix()}')")
+            restored[table] = con.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        for index in manifest.get("indexes", []):
+            if index["table"] in selected:
+                con.execute(index["sql"])
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return restored
+
+# ==============================================================================
+# 🧹 Rétention
+# ==============================================================================
+def apply_retention(store: Path = SNAPSHOT_DIR, keep_last: int = SNAPSHOT_KEEP_LAST,
+                    max_age_days: float = SNAPSHOT_MAX_AGE_DAYS, clone_keep_last: int = None) -> dict:
+    """
+    Supprime les manifestes et les clones hors politique (au-delà des 'keep_last'
+    plus récents, 'clone_keep_last' pour les clones s'il est fourni, ou plus vieux que
+    'max_age_days'), puis les objets qui ne sont plus référencés. Le snapshot le plus
+    récent de chaque type est toujours conservé.
+    """
+    expired = _expired([manifest["id"] for manifest in list_snapshots(store)], keep_last, max_age_days)
+    for snapshot_id in expired:
+        (manifests_dir(store) / f"{snapshot_id}.json").unlink(missing_ok=True)
+
+    bytes_freed = 0
+    expired_clones = _expired(list_clones(store), keep_last if clone_keep_last is None else clone_keep_last,
+                              max_age_days)
+    for snapshot_id in expired_clones:
+        path = clones_dir(store) / f"{snapshot_id}.duckdb"
+        bytes_freed += path.stat().st_size
+        path.unlink()
+
+    referenced = {entry["object"] for manifest in list_snapshots(store) for entry in manifest["tables"].values()}
+    removed_objects = []
+    if objects_dir(store).exists():
+        for path in objects_dir(store).glob("*.parquet"):
+            if path.name not in referenced:
+                bytes_freed += path.stat().st_size
+                path.unlink()
+                removed_objects.append(path.name)
+    return {"snapshots": expired, "clones": expired_clones, "objects": removed_objects, "bytes_freed": bytes_freed}
@@ -0,0 +1,462 @@
+# === Module commun - Accès S3/MinIO mutualisé ===
+# Ce module fournit un client S3 unique par processus (pool de connexions,
+# keep-alive, retries adaptatifs, timeouts), une vérification du bucket mise
+# en cache et des fonctions d'upload/download instrumentées (octets, durée, débit).
+# Tous les scripts du pipeline passent par ici pour leurs transferts MinIO.
+# Avec S3_DIRECT_READ=1, DuckDB lit les objets en place (extension httpfs).
+# Les uploads sont multipart (TransferConfig réglable) et parallélisés entre fichiers ;
+# un objet dont le contenu est identique au fichier local n'est pas réécrit.
+# Les téléchargements passent par un cache local indexé par bucket/clé/ETag (LRU borné) ;
+# les gros objets sont récupérés par plages d'octets en parallèle.
+
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlparse
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from loguru import logger
+
+from fast_copy import copy_file
+
+# ==============================================================================
+# ☁️ Configuration MinIO (variables d'environnement)
+# ==============================================================================
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "http://minio:9000")
+ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "admin")
+SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "admin1234")
+BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "bottleneck")
+S3_DIRECT_READ = os.getenv("S3_DIRECT_READ", "0") == "1"
+
+# ==============================================================================
+# ⚙️ Réglages du client (pool HTTP, retries, timeouts)
+# ==============================================================================
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "60"))
+
+CLIENT_CONFIG = Config(
+    region_name="us-east-1",
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "adaptive"},
+    connect_timeout=S3_CONNECT_TIMEOUT,
+    read_timeout=S3_READ_TIMEOUT,
+)
+
+# ==============================================================================
+# 🚚 Réglages des transferts (multipart, concurrence)
+# ==============================================================================
+MB = 1024 * 1024
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * MB)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(8 * MB)))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))  # threads par fichier
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", "4"))  # fichiers en parallèle
+S3_DOWNLOAD_PART_SIZE = int(os.getenv("S3_DOWNLOAD_PART_SIZE", str(S3_MULTIPART_CHUNKSIZE)))
+S3_DOWNLOAD_CONCURRENCY = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", str(S3_MAX_CONCURRENCY)))  # GET par objet
+S3_DOWNLOAD_WORKERS = int(os.getenv("S3_DOWNLOAD_WORKERS", str(S3_UPLOAD_WORKERS)))  # fichiers en parallèle
+S3_SKIP_UNCHANGED = os.getenv("S3_SKIP_UNCHANGED", "1") == "1"
+HASH_CHUNK_SIZE = int(os.getenv("HASH_CHUNK_SIZE", str(1 * MB)))
+SHA256_METADATA_KEY = "sha256"  # Empreinte stockée dans les métadonnées x-amz-meta-sha256
+
+# Cache local des téléchargements (clé : bucket/clé/ETag), éviction LRU au-delà de la taille max
+DOWNLOAD_CACHE = os.getenv("DOWNLOAD_CACHE", "1") == "1"
+DOWNLOAD_CACHE_DIR = Path(os.getenv("DOWNLOAD_CACHE_DIR", "/opt/airflow/data/.cache/minio"))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(2048 * MB)))
+
+
+def transfer_config(threshold: int = S3_MULTIPART_THRESHOLD, chunksize: int = S3_MULTIPART_CHUNKSIZE,
+                    max_concurrency: int = S3_MAX_CONCURRENCY) -> TransferConfig:
+    return TransferConfig(
+        multipart_threshold=threshold,
+        multipart_chunksize=chunksize,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+
+
+TRANSFER_CONFIG = transfer_config()
+
+# Statistiques cumulées des transferts du processus (fenêtre début/fin en temps réel,
+# les transferts concurrents se chevauchant)
+TRANSFER_STATS = {
+    "uploads": 0, "downloads": 0, "bytes": 0, "started": None, "ended": None,
+    "skipped": 0, "bytes_saved": 0, "cache_hits": 0, "bytes_cached": 0,
+}
+_STATS_LOCK = threading.Lock()
+
+# ==============================================================================
+# 🔌 Client et bucket (mis en cache par processus)
+# ==============================================================================
+@lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client(
+        "s3",
+        endpoint_url=MINIO_ENDPOINT,
+        aws_access_key_id=ACCESS_KEY,
+        aws_secret_access_key=SECRET_KEY,
+        config=CLIENT_CONFIG,
+    )
+
+
+@lru_cache(maxsize=None)
+def ensure_bucket(bucket: str = BUCKET_NAME, create: bool = False) -> bool:
+    """
+    Vérifie l'accès au bucket (un seul head_bucket par processus).
+    Avec create=True, le bucket est créé s'il n'existe pas ; retourne True dans ce cas.
+    Lève ClientError si le bucket est inaccessible.
+    """
+    s3_client = get_s3_client()
+    try:
+        s3_client.head_bucket(Bucket=bucket)
+        return False
+    except ClientError as e:
+        if create and e.response["Error"]["Code"] in ("404", "NoSuchBucket"):
+            s3_client.create_bucket(Bucket=bucket)
+            return True
+        raise
+
+# ==============================================================================
+# 🦆 Lecture directe des objets depuis DuckDB (httpfs)
+# ==============================================================================
+def s3_uri(key: str, bucket: str = BUCKET_NAME) -> str:
+    return f"s3://{bucket}/{key}"
+
+
+def configure_duckdb_s3(con):
+    """
+    Charge l'extension httpfs et configure l'accès S3 de la connexion DuckDB
+    à partir des mêmes variables MINIO_* que le client boto3.
+    L'extension est préinstallée dans l'image (Dockerfile) : aucun INSTALL, donc
+    aucun accès réseau, à l'exécution.
+    """
+    endpoint = urlparse(MINIO_ENDPOINT)
+    con.execute("LOAD httpfs")
+    con.execute(f"SET s3_endpoint = '{endpoint.netloc}'")
+    con.execute(f"SET s3_use_ssl = {'true' if endpoint.scheme == 'https' else 'false'}")
+    con.execute("SET s3_url_style = 'path'")
+    con.execute(f"SET s3_region = '{CLIENT_CONFIG.region_name}'")
+    con.execute(f"SET s3_access_key_id = '{ACCESS_KEY}'")
+    con.execute(f"SET s3_secret_access_key = '{SECRET_KEY}'")
+    return con
+
+# ==============================================================================
+# 📤📥 Transferts instrumentés
+# ==============================================================================
+def _record(kind: str, size: int, started: float, ended: float):
+    with _STATS_LOCK:
+        TRANSFER_STATS[kind] += 1
+        TRANSFER_STATS["bytes"] += size
+        if TRANSFER_STATS["started"] is None or started < TRANSFER_STATS["started"]:
+            TRANSFER_STATS["started"] = started
+        if TRANSFER_STATS["ended"] is None or ended > TRANSFER_STATS["ended"]:
+            TRANSFER_STATS["ended"] = ended
+
+
+def file_digests(local_path: Path, algorithms=("md5", "sha256"), chunk_size: int = HASH_CHUNK_SIZE) -> dict:
+    """
+    Calcule les empreintes demandées ({algorithme: hexadécimal}) en une seule lecture
+    par blocs du fichier ; aucune lecture si aucun algorithme n'est demandé.
+    """
+    hashes = {name: hashlib.new(name) for name in algorithms}
+    if hashes:
+        with open(local_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                for h in hashes.values():
+                    h.update(chunk)
+    return {name: h.hexdigest() for name, h in hashes.items()}
+
+
+def head_object(key: str, bucket: str = BUCKET_NAME):
+    """Métadonnées d'un objet (taille, ETag, métadonnées utilisateur) ou None s'il n'existe pas."""
+    try:
+        return get_s3_client().head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def head_objects(keys: list, bucket: str = BUCKET_NAME, workers: int = S3_UPLOAD_WORKERS) -> dict:
+    """head_object en parallèle sur les clés attendues : {clé: métadonnées ou None}."""
+    keys = list(keys)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(keys) or 1))) as executor:
+        return dict(zip(keys, executor.map(lambda key: head_object(key, bucket), keys)))
+
+
+def list_objects(prefix: str, bucket: str = BUCKET_NAME) -> dict:
+    """
+    Liste paginée (au-delà de 1000 clés) des objets sous 'prefix' :
+    {clé: {"ContentLength", "ETag"}} (les métadonnées utilisateur ne sont pas listées).
+    """
+    objects = {}
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = {"ContentLength": obj["Size"], "ETag": obj["ETag"]}
+    return objects
+
+
+def comparable_digest(remote: dict):
+    """
+    Empreinte locale à calculer pour comparer le fichier à l'objet distant : 'sha256'
+    (métadonnée de l'objet), 'md5' (ETag hors upload multipart) ou None (ETag multipart seul).
+    """
+    if remote.get("Metadata", {}).get(SHA256_METADATA_KEY):
+        return "sha256"
+    if "-" in remote["ETag"].strip('"'):
+        return None
+    return "md5"
+
+
+def checksum_matches(remote: dict, digests: dict):
+    """
+    Compare les empreintes locales ({algorithme: hexadécimal}, cf. comparable_digest)
+    à l'objet distant : SHA-256 des métadonnées si présent, sinon ETag (MD5 du contenu).
+    Retourne None si aucune empreinte distante n'est comparable (ETag multipart seul).
+    """
+    algorithm = comparable_digest(remote)
+    if algorithm == "sha256":
+        return remote["Metadata"][SHA256_METADATA_KEY] == digests["sha256"]
+    if algorithm == "md5":
+        return remote["ETag"].strip('"') == digests["md5"]
+    return None
+
+
+def upload_file(local_path: Path, key: str, bucket: str = BUCKET_NAME, config: TransferConfig = None,
+                skip_unchanged: bool = S3_SKIP_UNCHANGED) -> bool:
+    """
+    Upload (multipart au-delà du seuil) d'un fichier, avec son SHA-256 en métadonnée.
+    Si skip_unchanged, l'upload est évité lorsque l'objet distant est identique.
+    Seules les empreintes utiles sont calculées : SHA-256 (métadonnée à écrire), plus
+    MD5 uniquement pour comparer à l'ETag d'un objet de même taille sans SHA-256.
+    Retourne True si le fichier a été envoyé, False s'il était inchangé.
+    """
+    size = Path(local_path).stat().st_size
+    remote = head_object(key, bucket) if skip_unchanged else None
+    if remote is not None and remote["ContentLength"] != size:
+        remote = None  # Taille différente : aucune empreinte à comparer
+    algorithm = comparable_digest(remote) if remote is not None else None
+    digests = file_digests(local_path, sorted({"sha256", algorithm} - {None}))
+    sha256 = digests["sha256"]
+
+    if remote is not None and checksum_matches(remote, digests) is True:
+        with _STATS_LOCK:
+            TRANSFER_STATS["skipped"] += 1
+            TRANSFER_STATS["bytes_saved"] += size
+        return False
+
+    started = time.perf_counter()
+    get_s3_client().upload_file(
+        str(local_path), bucket, key,
+        ExtraArgs={"Metadata": {SHA256_METADATA_KEY: sha256}},
+        Config=config or TRANSFER_CONFIG,
+    )
+    _record("uploads", size, started, time.perf_counter())
+    return True
+
+
+def upload_files(items: list, bucket: str = BUCKET_NAME, workers: int = S3_UPLOAD_WORKERS,
+                 config: TransferConfig = None, skip_unchanged: bool = S3_SKIP_UNCHANGED) -> list:
+    """
+    Upload concurrent d'une liste de (chemin local, clé S3).
+    Retourne, dans l'ordre d'entrée, des tuples (chemin, clé, inchangé, erreur) ;
+    'inchangé' vaut True si l'upload a été évité, l'erreur vaut None en cas de succès.
+    """
+    def _upload(item):
+        local_path, key = item
+        try:
+            uploaded = upload_file(local_path, key, bucket, config, skip_unchanged)
+            return local_path, key, not uploaded, None
+        except Exception as e:
+            return local_path, key, False, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items) or 1))) as executor:
+        return list(executor.map(_upload, items))
+
+
+def _preallocate(fd: int, size: int):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):  # Non supporté (plateforme ou système de fichiers)
+        os.ftruncate(fd, size)
+
+
+def _ranged_download(key: str, dest: Path, remote: dict, bucket: str,
+                     part_size: int = S3_DOWNLOAD_PART_SIZE, concurrency: int = S3_DOWNLOAD_CONCURRENCY):
+    """
+    Télécharge l'objet par plages d'octets en parallèle dans un fichier préalloué
+    (écritures positionnelles). IfMatch garantit que l'objet n'a pas changé entre les plages.
+    """
+    size = remote["ContentLength"]
+    fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        _preallocate(fd, size)
+
+        def _part(start: int):
+            end = min(start + part_size, size) - 1
+            body = get_s3_client().get_object(
+                Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=remote["ETag"],
+            )["Body"]
+            offset = start
+            for chunk in body.iter_chunks(HASH_CHUNK_SIZE):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+            if offset != end + 1:
+                raise IOError(f"Plage incomplète pour {key} : octets {start}-{offset - 1} sur {start}-{end}")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(_part, range(0, size, part_size)))
+    finally:
+        os.close(fd)
+
+
+def _fetch(key: str, dest: Path, remote: dict, bucket: str):
+    if remote["ContentLength"] > S3_DOWNLOAD_PART_SIZE and S3_DOWNLOAD_CONCURRENCY > 1:
+        _ranged_download(key, dest, remote, bucket, S3_DOWNLOAD_PART_SIZE, S3_DOWNLOAD_CONCURRENCY)
+    else:
+        get_s3_client().download_file(bucket, key, str(dest), Config=TRANSFER_CONFIG)
+
+
+def download_file(key: str, local_path: Path, bucket: str = BUCKET_NAME,
+                  use_cache: bool = DOWNLOAD_CACHE) -> float:
+    """
+    Téléchargement d'un objet ; retourne la durée du transfert en secondes.
+    Au-delà de S3_DOWNLOAD_PART_SIZE, l'objet est récupéré par plages parallèles.
+    Avec use_cache, un head_object suffit si l'objet (même ETag) est déjà en cache :
+    le fichier est alors lié (hardlink, ou copié) depuis le cache sans nouveau transfert.
+    """
+    local_path = Path(local_path)
+    started = time.perf_counter()
+    remote = head_object(key, bucket)
+    if remote is None:
+        raise ClientError({"Error": {"Code": "404", "Message": f"Objet introuvable : {key}"}}, "HeadObject")
+
+    target = local_path
+    if use_cache:
+        target = _cache_entry(bucket, key, remote["ETag"])
+        stamp = remote["LastModified"].timestamp()
+        if _cache_valid(target, remote["ContentLength"], stamp):
+            os.utime(target, (time.time(), stamp))  # atime = dernier accès (LRU)
+            _link_or_copy(target, local_path)
+            with _STATS_LOCK:
+                TRANSFER_STATS["cache_hits"] += 1
+                TRANSFER_STATS["bytes_cached"] += remote["ContentLength"]
+            return time.perf_counter() - started
+        DOWNLOAD_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = target.with_name(target.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        _fetch(key, tmp_path, remote, bucket)
+        if use_cache:
+            os.utime(tmp_path, (time.time(), stamp))
+        tmp_path.replace(target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    if use_cache:
+        _link_or_copy(target, local_path)
+        evict_cache()
+    ended = time.perf_counter()
+    _record("downloads", remote["ContentLength"], started, ended)
+    return ended - started
+
+
+def download_files(items: list, bucket: str = BUCKET_NAME, workers: int = S3_DOWNLOAD_WORKERS,
+                   use_cache: bool = DOWNLOAD_CACHE) -> list:
+    """
+    Téléchargement concurrent d'une liste de (clé S3, chemin local).
+    Retourne, dans l'ordre d'entrée, des tuples (clé, chemin, erreur) ;
+    l'erreur vaut None si le téléchargement a réussi.
+    """
+    def _download(item):
+        key, local_path = item
+        try:
+            download_file(key, local_path, bucket, use_cache)
+            return key, local_path, None
+        except Exception as e:
+            return key, local_path, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items) or 1))) as executor:
+        return list(executor.map(_download, items))
+
+
+# ==============================================================================
+# 🗄️ Cache local des téléchargements
+# ==============================================================================
+def _cache_entry(bucket: str, key: str, etag: str) -> Path:
+    digest = hashlib.sha256(f"{bucket}/{key}/{etag.strip(chr(34))}".encode()).hexdigest()
+    return DOWNLOAD_CACHE_DIR / f"{digest}{Path(key).suffix}"
+
+
+def _cache_valid(entry: Path, size: int, stamp: float) -> bool:
+    """
+    Une entrée n'est réutilisée que si sa taille et sa date correspondent à l'objet :
+    une réécriture en place du fichier lié (même inode) invalide ainsi l'entrée.
+    """
+    try:
+        stat = entry.stat()
+    except FileNotFoundError:
+        return False
+    if stat.st_size == size and stat.st_mtime == stamp:
+        return True
+    entry.unlink(missing_ok=True)
+    return False
+
+
+def _link_or_copy(entry: Path, local_path: Path):
+    """Remplace 'local_path' par un hardlink vers l'entrée (copie si autre système de fichiers)."""
+    local_path.unlink(missing_ok=True)
+    try:
+        os.link(entry, local_path)
+    except OSError:
+        copy_file(entry, local_path, preserve_metadata=False)
+
+
+def evict_cache(max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+    """Supprime les entrées les moins récemment utilisées au-delà de 'max_bytes'."""
+    entries = []
+    for path in DOWNLOAD_CACHE_DIR.glob("*"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if not path.name.endswith(".tmp"):
+            entries.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def log_transfer_summary():
+    if TRANSFER_STATS["skipped"]:
+        logger.info(
+            f"⏭️ {TRANSFER_STATS['skipped']} fichier(s) inchangé(s) non réécrit(s) : "
+            f"{TRANSFER_STATS['bytes_saved'] / MB:.2f} Mo économisés"
+        )
+    if TRANSFER_STATS["cache_hits"]:
+        logger.info(
+            f"🗄️ {TRANSFER_STATS['cache_hits']} fichier(s) servi(s) depuis le cache local : "
+            f"{TRANSFER_STATS['bytes_cached'] / MB:.2f} Mo non retéléchargés"
+        )
+    nb = TRANSFER_STATS["uploads"] + TRANSFER_STATS["downloads"]
+    if not nb:
+        return
+    size_mb = TRANSFER_STATS["bytes"] / MB
+    seconds = TRANSFER_STATS["ended"] - TRANSFER_STATS["started"]
+    logger.info(
+        f"📊 Transferts MinIO : {nb} fichier(s), {size_mb:.2f} Mo en {seconds:.2f} s "
+        f"({size_mb / seconds if seconds else 0:.2f} Mo/s)"
+    )
@@ -0,0 +1,149 @@
+# === Module commun - Statistiques en streaming sur lots Arrow (Welford) ===
+# Moyenne et variance d'une colonne calculées sans charger la source en mémoire :
+# la table DuckDB (ou le Parquet) est parcourue en RecordBatch Arrow, chaque lot
+# est réduit en moments (n, moyenne, M2) vectorisés, puis fusionné aux précédents
+# par la formule parallèle de Welford (Chan et al.), numériquement stable.
+# Les moments de partitions disjointes (rowid / numéro de ligne modulo N) se
+# fusionnent de la même façon : le premier passage peut être réparti sur N processus.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ==============================================================================
+# 🔧 Configuration
+# ==============================================================================
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "65536"))
+STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "1"))
+
+EMPTY_MOMENTS = (0, 0.0, 0.0)
+
+# ==============================================================================
+# 📐 Moments (n, moyenne, M2 = somme des carrés des écarts à la moyenne)
+# ==============================================================================
+def batch_moments(values) -> tuple:
+    """Moments d'un lot (tableau Arrow ou NumPy), valeurs nulles/NaN ignorées."""
+    array = np.asarray(pc.drop_null(values) if hasattr(values, "null_count") else values, dtype="float64")
+    array = array[~np.isnan(array)]
+    if array.size == 0:
+        return EMPTY_MOMENTS
+    mean = float(array.mean())
+    return int(array.size), mean, float(np.square(array - mean).sum())
+
+
+def merge_moments(a: tuple, b: tuple) -> tuple:
+    """Fusion de deux jeux de moments (partitions disjointes)."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return EMPTY_MOMENTS
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    return n, mean, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+
+def std(moments: tuple, ddof: int = 1) -> float:
+    """Écart-type (échantillon par défaut, comme STDDEV_SAMP) ; NaN si n <= ddof."""
+    n, _, m2 = moments
+    return float(np.sqrt(m2 / (n - ddof))) if n > ddof else float("nan")
+
+# ==============================================================================
+# 🌊 Lecture par lots
+# ==============================================================================
+def source_sql(source: str, columns: list, worker: int = 0, workers: int = 1) -> str:
+    """
+    Requête de lecture de 'source' (table DuckDB, ou fichier/glob/dossier partitionné
+    Parquet) limitée, si 'workers' > 1, à la partition 'worker' (rowid ou numéro de
+    ligne dans le fichier modulo 'workers').
+    """
+    selected = ", ".join(f'"{c}"' for c in columns)
+    if source.endswith(".parquet") and os.path.isdir(source):
+        relation = f"read_parquet('{os.path.join(source, '**', '*.parquet')}', hive_partitioning = true, file_row_number = true)"
+        row_number = "file_row_number"
+    elif source.endswith(".parquet"):
+        relation, row_number = f"read_parquet('{source}', file_row_number = true)", "file_row_number"
+    else:
+        relation, row_number = f'"{source}"', "rowid"
+    where = f" WHERE {row_number} % {workers} = {worker}" if workers > 1 else ""
+    return f"SELECT {selected} FROM {relation}{where}"
+
+
+def connect(db_path=None):
+    """Connexion en lecture seule à la base (ou en mémoire pour une source Parquet)."""
+    return duckdb.connect(str(db_path), read_only=True) if db_path else duckdb.connect()
+
+
+def iter_batches(con, query: str, batch_size: int = STREAM_BATCH_SIZE):
+    """RecordBatch Arrow successifs du résultat de 'query' (mémoire bornée par lot)."""
+    reader = con.execute(query).fetch_record_batch(batch_size)
+    for batch in reader:
+        if batch.num_rows:
+            yield batch
+
+# ==============================================================================
+# 🚀 Passages
+# ==============================================================================
+def scan_moments(db_path, source: str, column: str, worker: int = 0, workers: int = 1,
+                 batch_size: int = STREAM_BATCH_SIZE) -> tuple:
+    """Moments de 'column' sur une partition de la source (exécutable dans un processus du pool)."""
+    con = connect(db_path)
+    try:
+        moments = EMPTY_MOMENTS
+        for batch in iter_batches(con, source_sql(source, [column], worker, workers), batch_size):
+            moments = merge_moments(moments, batch_moments(batch.column(0)))
+        return moments
+    finally:
+        con.close()
+
+
+def parallel_moments(db_path, source: str, column: str, workers: int = STREAM_WORKERS,
+                     batch_size: int = STREAM_BATCH_SIZE) -> tuple:
+    """Moments de 'column' sur toute la source, partitions réparties sur 'workers' processus."""
+    if workers <= 1:
+        return scan_moments(db_path, source, column, batch_size=batch_size)
+    moments = EMPTY_MOMENTS
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(scan_moments, db_path, source, column, worker, workers, batch_size)
+            for worker in range(workers)
+        ]
+        for future in futures:
+            moments = merge_moments(moments, future.result())
+    return moments
+
+
+def stream_zscores(db_path, source: str, columns: list, column: str, moments: tuple,
+                   batch_size: int = STREAM_BATCH_SIZE):
+    """
+    Second passage : lots de 'columns' (lignes où 'column' est renseignée) complétés
+    de la colonne z_score = (x - moyenne) / écart-type, calculée de façon vectorisée.
+    """
+    _, mean, _ = moments
+    sigma = std(moments)
+    con = connect(db_path)
+    try:
+        query = f"SELECT * FROM ({source_sql(source, columns)}) WHERE \"{column}\" IS NOT NULL"
+        for batch in iter_batches(con, query, batch_size):
+            values = batch.column(columns.index(column))
+            z_scores = pc.divide(pc.subtract(pc.cast(values, "float64"), mean), sigma)
+            yield pa.RecordBatch.from_arrays(batch.columns + [z_scores], names=batch.schema.names + ["z_score"])
+    finally:
+        con.close()
+
+
+def exceeds(scores, threshold: float, tail: str):
+    """Masque Arrow des scores au-delà du seuil (même sémantique que outlier_scoring.outlier_sql)."""
+    if tail == "upper":
+        mask = pc.greater(scores, threshold)
+    elif tail == "lower":
+        mask = pc.less(scores, -threshold)
+    elif tail == "both":
+        mask = pc.greater(pc.abs(scores), threshold)
+    else:
+        raise ValueError(f"Queue inconnue : {tail} (upper | lower | both)")
+    return pc.fill_null(mask, False)
@@ -0,0 +1,133 @@
+# === Script de test 00 - Reprise et GET conditionnel du téléchargement ===
+# Ce script vérifie le téléchargement du script 00 contre un serveur HTTP local
+# (http.server dans un thread) : reprise avec Range + If-Range après une coupure,
+# fichier partiel abandonné si la source a changé (200 au lieu de 206), et
+# réponse 304 au GET conditionnel lorsque l'archive n'a pas été modifiée.
+# Test autonome (hors DAG) : python tests/test_00_download_resume.py
+
+import os
+import sys
+import tempfile
+import threading
+import importlib.util
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from loguru import logger
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+_spec = importlib.util.spec_from_file_location("download_and_extract", SCRIPTS_PATH / "00_download_and_extract.py")
+download_and_extract = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(download_and_extract)
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_00_download_resume.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+CHUNK_SIZE = 64 * 1024
+
+# ==============================================================================
+# 🌐 Serveur HTTP local (Range, If-Range, If-None-Match)
+# ==============================================================================
+class ArchiveHandler(BaseHTTPRequestHandler):
+    content = b""
+    etag = '"v1"'
+    truncate_next = False  # coupe la prochaine réponse à mi-parcours
+    received = []  # en-têtes des requêtes reçues
+
+    def do_GET(self):
+        handler = type(self)
+        handler.received.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == handler.etag:
+            self.send_response(304)
+            self.send_header("ETag", handler.etag)
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get("Range") and self.headers.get("If-Range", handler.etag) == handler.etag:
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+        body = handler.content[start:]
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", handler.etag)
+        self.send_header("Content-Length", str(len(body)))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(handler.content) - 1}/{len(handler.content)}")
+        self.end_headers()
+        if handler.truncate_next:
+            handler.truncate_next = False
+            body = body[: len(body) // 2]
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+# ==============================================================================
+# 🧪 Fonction principale : reprise, source modifiée, 304
+# ==============================================================================
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/bottleneck.zip"
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = Path(tmp) / "bottleneck.zip"
+            part_path = dest.with_name(dest.name + ".part")
+
+            # 🔁 Coupure à mi-parcours : la tentative suivante reprend avec Range + If-Range
+            ArchiveHandler.content, ArchiveHandler.etag = os.urandom(3 * 1024 * 1024), '"v1"'
+            ArchiveHandler.truncate_next, ArchiveHandler.received = True, []
+            path, validators = download_and_extract.download_zip(url, dest, chunk_size=CHUNK_SIZE)
+            assert path == dest and dest.read_bytes() == ArchiveHandler.content, "❌ Archive reprise corrompue"
+            resumed = ArchiveHandler.received[-1]
+            assert resumed.get("Range") and resumed.get("If-Range") == '"v1"', \
+                f"❌ Reprise sans Range/If-Range : {resumed}"
+            assert validators["etag"] == '"v1"', f"❌ Validateurs inattendus : {validators}"
+            assert not part_path.exists(), "❌ Fichier partiel non supprimé après le téléchargement"
+            logger.success("✅ Téléchargement interrompu repris avec Range + If-Range, archive intacte.")
+
+            # 🔄 Source modifiée entre deux tentatives : 200, fichier partiel abandonné
+            old_content = ArchiveHandler.content
+            part_path.write_bytes(old_content[: len(old_content) // 3])
+            download_and_extract._part_validators_path(part_path).write_text('{"etag": "\\"v1\\""}', encoding="utf-8")
+            ArchiveHandler.content, ArchiveHandler.etag = os.urandom(2 * 1024 * 1024), '"v2"'
+            ArchiveHandler.received = []
+            download_and_extract.download_zip(url, dest, chunk_size=CHUNK_SIZE)
+            assert ArchiveHandler.received[0].get("If-Range") == '"v1"', "❌ If-Range absent de la reprise"
+            assert dest.read_bytes() == ArchiveHandler.content, "❌ Archive mélangeant ancienne et nouvelle source"
+            logger.success("✅ Source modifiée : fichier partiel abandonné, nouvelle archive complète.")
+
+            # 🧩 Fichier partiel sans validateur conservé : pas de reprise à l'aveugle
+            part_path.write_bytes(ArchiveHandler.content[:1000])
+            ArchiveHandler.received = []
+            download_and_extract.download_zip(url, dest, chunk_size=CHUNK_SIZE)
+            assert "Range" not in ArchiveHandler.received[0], "❌ Reprise sans validateur If-Range"
+            assert dest.read_bytes() == ArchiveHandler.content, "❌ Archive incorrecte après téléchargement complet"
+            logger.success("✅ Fichier partiel sans validateur : téléchargement complet.")
+
+            # ♻️ Archive inchangée : 304 au GET conditionnel
+            path, validators = download_and_extract.download_zip(url, dest, validators={"etag": '"v2"'})
+            assert path is None and validators["etag"] == '"v2"', "❌ 304 non détecté"
+            logger.success("✅ Archive inchangée détectée (304 Not Modified).")
+
+        logger.success("🎯 Test de reprise du téléchargement passé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test de reprise du téléchargement : {e}")
+        sys.exit(1)
+    finally:
+        server.shutdown()
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-# === Script de test 05 - Vérification des NULLs après nettoyage ===
-# Ce script vérifie que les colonnes critiques des tables nettoyées
-# (erp_clean, web_clean, liaison_clean) ne contiennent aucune valeur NULL.
+# === Script de test 05 - Vérification des règles de nettoyage (dont NULLs) ===
+# Ce script vérifie que les tables nettoyées (erp_clean, web_clean, liaison_clean)
+# respectent toutes les règles déclarées dans cleaning_rules.py (colonnes critiques
+# non NULL, plages, ...), en une seule requête par table.
 
 import os
 import sys
@@ -9,6 +10,9 @@ from pathlib import Path
 from loguru import logger
 import warnings
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from cleaning_rules import CLEAN_RULES, count_violations  # noqa: E402
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -35,29 +39,12 @@ def main():
         sys.exit(1)
 
     try:
-        # Vérification table erp_clean
-        erp_nulls = con.execute("""
-            SELECT COUNT(*) FROM erp_clean
-            WHERE product_id IS NULL OR onsale_web IS NULL
-              OR price IS NULL OR stock_quantity IS NULL OR stock_status IS NULL
-        """).fetchone()[0]
-        assert erp_nulls == 0, f"❌ NULLs détectés dans 'erp_clean' : {erp_nulls}"
-
-        # Vérification table web_clean
-        web_nulls = con.execute("""
-            SELECT COUNT(*) FROM web_clean
-            WHERE sku IS NULL
-        """).fetchone()[0]
-        assert web_nulls == 0, f"❌ NULLs détectés dans 'web_clean' : {web_nulls}"
-
-        # Vérification table liaison_clean
-        liaison_nulls = con.execute("""
-            SELECT COUNT(*) FROM liaison_clean
-            WHERE product_id IS NULL OR id_web IS NULL
-        """).fetchone()[0]
-        assert liaison_nulls == 0, f"❌ NULLs détectés dans 'liaison_clean' : {liaison_nulls}"
+        for source, rules in CLEAN_RULES.items():
+            violations = {name: n for name, n in count_violations(con, f"{source}_clean", rules).items() if n}
+            assert not violations, f"❌ Règles enfreintes dans '{source}_clean' : {violations}"
+            logger.info(f"✅ {source}_clean : {len(rules)} règle(s) respectée(s)")
 
-        logger.success("✅ Aucune valeur NULL détectée dans les tables nettoyées.")
+        logger.success("✅ Aucune valeur NULL ni violation de règle dans les tables nettoyées.")
         logger.success("🎯 Test de validation des NULLs terminé avec succès.")
 
     except Exception as e:
@@ -0,0 +1,66 @@
+# === Script de test 05 - Lecture directe des fichiers bruts dans MinIO (httpfs) ===
+# Ce script vérifie que DuckDB lit les fichiers bruts en place dans le bucket
+# (s3://<bucket>/data/inputs/), avec la configuration MINIO_* de storage.py,
+# et que chaque objet contient le même nombre de lignes que le fichier local.
+# Exécutable contre un MinIO local ou un serveur moto (MINIO_ENDPOINT).
+# Le test est ignoré sans S3_DIRECT_READ=1, comme les scripts 04 et 07.
+
+import os
+import sys
+import duckdb
+from pathlib import Path
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from interchange import SCHEMAS, count_rows, data_file, read_sql  # noqa: E402
+from storage import S3_DIRECT_READ, configure_duckdb_s3, s3_uri  # noqa: E402
+
+# ==============================================================================
+# 🔧 Configuration des chemins de logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_05_s3_direct_read.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🧪 Fonction principale : lecture en place vs fichiers locaux
+# ==============================================================================
+def main():
+    if not S3_DIRECT_READ:
+        logger.info("⏭️ S3_DIRECT_READ=0 : fichiers lus en local par DuckDB, test ignoré.")
+        return
+
+    INPUTS_PATH = Path("/opt/airflow/data/inputs")
+
+    try:
+        con = configure_duckdb_s3(duckdb.connect())
+        logger.success("✅ Extension httpfs chargée et accès S3 configuré.")
+
+        for name, types in SCHEMAS.items():
+            uri = s3_uri(f"data/inputs/{data_file(name)}")
+            nb_s3 = con.execute(f"SELECT COUNT(*) FROM {read_sql(uri)}").fetchone()[0]
+            nb_local = count_rows(con, INPUTS_PATH / data_file(name))
+
+            assert nb_s3 == nb_local, f"❌ {uri} : {nb_s3} lignes (attendu : {nb_local})"
+            logger.success(f"✅ {uri} : {nb_s3} lignes lues en place.")
+
+            # Projection sur une seule colonne (seules ses données sont transférées en Parquet)
+            first_column = next(iter(types))
+            con.execute(f"SELECT {first_column} FROM {read_sql(uri)} LIMIT 1").fetchall()
+
+        logger.success("🎯 Lecture directe depuis MinIO validée.")
+
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du test de lecture directe : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
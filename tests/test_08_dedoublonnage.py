@@ -1,6 +1,7 @@
 # === Script de test 08 - Validation des tables dédoublonnées ===
 # Ce script vérifie que les tables dédoublonnées (erp_dedup, web_dedup, liaison_dedup)
-# existent dans la base DuckDB, contiennent des données, et sont prêtes pour la fusion.
+# existent dans la base DuckDB, contiennent des données, et sont prêtes pour la fusion,
+# et que la requête web retient, à post_date égale, la ligne au post_modified le plus récent.
 
 import os
 import sys
@@ -8,6 +9,13 @@ import duckdb
 from pathlib import Path
 from loguru import logger
 import warnings
+import importlib.util
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+_spec = importlib.util.spec_from_file_location("dedoublonnage", SCRIPTS_PATH / "08_dedoublonnage.py")
+dedoublonnage = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dedoublonnage)
 
 warnings.filterwarnings("ignore")
 
@@ -41,6 +49,22 @@ def main():
             assert count > 0, f"❌ La table {table_name} est vide ou n’a pas été créée."
             logger.success(f"✅ {table_name} : {count} lignes présentes.")
 
+        # 🌐 Départage web à post_date égale : le post_modified le plus récent l'emporte
+        #    (quel que soit l'ordre d'insertion des lignes)
+        for order in ("ASC", "DESC"):
+            kept = duckdb.connect().execute(f"""
+                WITH web AS (
+                    SELECT * FROM (VALUES
+                        ('sku-1', 'product', TIMESTAMP '2023-01-01', TIMESTAMP '2023-02-01', 'ancienne'),
+                        ('sku-1', 'product', TIMESTAMP '2023-01-01', TIMESTAMP '2023-03-01', 'récente')
+                    ) AS t(sku, post_type, post_date, post_modified, version)
+                    ORDER BY post_modified {order}
+                )
+                {dedoublonnage.web_dedup_sql("web")}
+            """).fetchall()
+            assert [row[4] for row in kept] == ["récente"], f"❌ Ligne web retenue à post_date égale : {kept}"
+        logger.success("✅ web_dedup : à post_date égale, la ligne au post_modified le plus récent est retenue.")
+
         logger.success("🎯 Toutes les tables dédoublonnées sont valides et prêtes à être utilisées.")
 
     except Exception as e:
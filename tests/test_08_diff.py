@@ -0,0 +1,154 @@
+# === Script de test 08c - Dédoublonnage en mode diff équivalent à la reconstruction complète ===
+# Ce script vérifie, sur une copie de la base, que le mode diff du script 08
+# produit exactement les tables d'une reconstruction complète après une modification
+# (prix baissé, id_web changé, ligne web mise à jour à post_date identique) et après
+# une suppression de lignes sources, et que dedup_seen ne garde que les lignes présentes.
+
+import os
+import sys
+import shutil
+import duckdb
+import tempfile
+import importlib.util
+from pathlib import Path
+from loguru import logger
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+_spec = importlib.util.spec_from_file_location("dedoublonnage", SCRIPTS_PATH / "08_dedoublonnage.py")
+dedoublonnage = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dedoublonnage)
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_08_diff.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+
+# ==============================================================================
+# 🔧 Fonctions utilitaires
+# ==============================================================================
+def run_diff(con) -> dict:
+    """Une exécution du script 08 en mode diff ; retourne {table: nombre de clés recalculées}."""
+    dedoublonnage.ensure_state_tables(con)
+    touched = {}
+    for table, spec in dedoublonnage.DEDUP_TABLES.items():
+        touched[table], _ = dedoublonnage.diff_dedup(con, table, spec, spec["source"])
+    return touched
+
+
+def simulated_failure(*args):
+    """Remplace une étape de la transaction d'écriture pour simuler un échec."""
+    raise RuntimeError("échec simulé")
+
+
+def assert_same_as_full(con, step: str):
+    """Chaque table dédoublonnée est identique (lignes et nombre) à la requête de reconstruction complète."""
+    for table, spec in dedoublonnage.DEDUP_TABLES.items():
+        full = spec["query"](spec["source"])
+        nb_diff, nb_rows, nb_full = con.execute(f"""
+            SELECT
+                (SELECT COUNT(*) FROM ((SELECT * FROM {table} EXCEPT SELECT * FROM ({full}))
+                                       UNION ALL (SELECT * FROM ({full}) EXCEPT SELECT * FROM {table}))),
+                (SELECT COUNT(*) FROM {table}),
+                (SELECT COUNT(*) FROM ({full}))
+        """).fetchone()
+        assert nb_diff == 0 and nb_rows == nb_full, \
+            f"❌ {step} : {table} diffère de la reconstruction complète ({nb_diff} ligne(s), {nb_rows} vs {nb_full})"
+    logger.success(f"✅ {step} : tables du mode diff identiques à la reconstruction complète.")
+
+# ==============================================================================
+# 🧪 Fonction principale : mise à jour et suppression en mode diff
+# ==============================================================================
+def main():
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_copy = Path(tmp) / "bottleneck.duckdb"
+            shutil.copyfile(DUCKDB_PATH, db_copy)
+            con = duckdb.connect(str(db_copy))
+            dedoublonnage.drop_state_tables(con)
+
+            # 🆕 Première exécution : toutes les clés sont calculées
+            run_diff(con)
+            assert_same_as_full(con, "Initialisation")
+            touched = run_diff(con)
+            assert not any(touched.values()), f"❌ Clés recalculées sans modification : {touched}"
+            logger.success("✅ Aucune clé recalculée sans modification de la source.")
+
+            # ✏️ Mises à jour : prix baissé (MAX), id_web changé (colonne indexée),
+            #    ligne web modifiée à post_date identique (départage par post_modified)
+            product_id = con.execute("SELECT product_id FROM erp_clean ORDER BY price DESC LIMIT 1").fetchone()[0]
+            con.execute("UPDATE erp_clean SET price = 1.0 WHERE product_id = ?", [product_id])
+            liaison_id = con.execute("SELECT MIN(product_id) FROM liaison_clean WHERE id_web IS NOT NULL").fetchone()[0]
+            con.execute("UPDATE liaison_clean SET id_web = 'zz-modifie' WHERE product_id = ?", [liaison_id])
+            sku = con.execute("SELECT MIN(sku) FROM web_dedup").fetchone()[0]
+            con.execute("""
+                UPDATE web_clean SET total_sales = 999, post_modified = post_modified + INTERVAL 1 DAY
+                WHERE sku = ? AND post_type = 'product'
+            """, [sku])
+
+            # 💥 Échec pendant l'écriture : table, index et état inchangés (une seule transaction)
+            old_price = con.execute("SELECT price FROM erp_dedup WHERE product_id = ?", [product_id]).fetchone()[0]
+            state = con.execute("SELECT * FROM dedup_state ORDER BY table_name").fetchall()
+            record_hashes = dedoublonnage.record_hashes
+            dedoublonnage.record_hashes = simulated_failure
+            try:
+                dedoublonnage.diff_dedup(con, "erp_dedup", dedoublonnage.DEDUP_TABLES["erp_dedup"], "erp_clean")
+                raise AssertionError("❌ Échec simulé non propagé")
+            except RuntimeError:
+                pass
+            finally:
+                dedoublonnage.record_hashes = record_hashes
+            price = con.execute("SELECT price FROM erp_dedup WHERE product_id = ?", [product_id]).fetchone()[0]
+            assert price == old_price, f"❌ Écriture partielle après échec : prix {price} (attendu : {old_price})"
+            assert con.execute("SELECT * FROM dedup_state ORDER BY table_name").fetchall() == state, \
+                "❌ dedup_state modifié malgré l'échec"
+            logger.success("✅ Échec en cours d'écriture : table et état inchangés.")
+
+            touched = run_diff(con)
+            assert all(touched.values()), f"❌ Mise à jour non détectée : {touched}"
+            assert_same_as_full(con, "Après mise à jour")
+            price = con.execute("SELECT price FROM erp_dedup WHERE product_id = ?", [product_id]).fetchone()[0]
+            total_sales = con.execute("SELECT total_sales FROM web_dedup WHERE sku = ?", [sku]).fetchone()[0]
+            assert price == 1.0 and total_sales == 999, f"❌ Valeurs non mises à jour : prix {price}, ventes {total_sales}"
+
+            # 🗑️ Suppressions : clés disparues de la source retirées des tables
+            con.execute("DELETE FROM erp_clean WHERE product_id = ?", [product_id])
+            con.execute("DELETE FROM liaison_clean WHERE product_id = ?", [liaison_id])
+            con.execute("DELETE FROM web_clean WHERE sku = ?", [sku])
+            run_diff(con)
+            assert_same_as_full(con, "Après suppression")
+
+            # 🧹 dedup_seen ne conserve que les empreintes des lignes encore présentes
+            for table, key, deleted in (("erp_dedup", "product_id", product_id), ("liaison_dedup", "product_id", liaison_id)):
+                source = dedoublonnage.DEDUP_TABLES[table]["source"]
+                columns = ", ".join(f'"{row[0]}"' for row in con.execute(f"DESCRIBE {source}").fetchall())
+                nb_seen, nb_deleted, nb_source = con.execute(f"""
+                    SELECT (SELECT COUNT(*) FROM dedup_seen WHERE table_name = '{table}'),
+                           (SELECT COUNT(*) FROM dedup_seen WHERE table_name = '{table}' AND row_key = '{deleted}'),
+                           (SELECT COUNT(DISTINCT hash({columns})) FROM {source})
+                """).fetchone()
+                assert nb_seen == nb_source and nb_deleted == 0, \
+                    f"❌ dedup_seen de {table} : {nb_seen} empreintes (attendu : {nb_source}), {nb_deleted} pour {key}={deleted}"
+            logger.success("✅ dedup_seen limité aux lignes présentes dans la source.")
+            con.close()
+
+        logger.success("🎯 Test du dédoublonnage en mode diff passé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test du dédoublonnage en mode diff : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
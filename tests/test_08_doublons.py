@@ -1,6 +1,7 @@
 # === Script de test 08b - Vérification de l'absence de doublons après dédoublonnage ===
-# Ce script contrôle que les tables dédoublonnées ne contiennent aucun doublon
-# en vérifiant l’unicité des clés primaires logiques : product_id ou sku.
+# Ce script contrôle que les tables dédoublonnées ne contiennent aucun doublon :
+# chaque table déclare sa clé primaire (product_id ou sku), dont DuckDB garantit
+# l'unicité à l'écriture. Le contrôle ne lit donc que les métadonnées du catalogue.
 
 import os
 import sys
@@ -9,6 +10,9 @@ from pathlib import Path
 from loguru import logger
 import warnings
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from duckdb_tables import index_name, indexes, primary_key  # noqa: E402
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -35,26 +39,16 @@ def main():
         sys.exit(1)
 
     try:
-        # 📦 Test sur erp_dedup (clé : product_id)
-        erp_dup = con.execute("""
-            SELECT COUNT(*) - COUNT(DISTINCT product_id) FROM erp_dedup
-        """).fetchone()[0]
-        assert erp_dup == 0, f"❌ Doublons détectés dans 'erp_dedup' : {erp_dup}"
-        logger.success("✅ Aucune duplication sur 'erp_dedup' (clé = product_id)")
-
-        # 🌐 Test sur web_dedup (clé : sku)
-        web_dup = con.execute("""
-            SELECT COUNT(*) - COUNT(DISTINCT sku) FROM web_dedup
-        """).fetchone()[0]
-        assert web_dup == 0, f"❌ Doublons détectés dans 'web_dedup' : {web_dup}"
-        logger.success("✅ Aucune duplication sur 'web_dedup' (clé = sku)")
-
-        # 🔗 Test sur liaison_dedup (clé : product_id)
-        liaison_dup = con.execute("""
-            SELECT COUNT(*) - COUNT(DISTINCT product_id) FROM liaison_dedup
-        """).fetchone()[0]
-        assert liaison_dup == 0, f"❌ Doublons détectés dans 'liaison_dedup' : {liaison_dup}"
-        logger.success("✅ Aucune duplication sur 'liaison_dedup' (clé = product_id)")
+        # 📦 Clés primaires déclarées (erp_dedup, liaison_dedup : product_id ; web_dedup : sku)
+        for table, key in [("erp_dedup", "product_id"), ("web_dedup", "sku"), ("liaison_dedup", "product_id")]:
+            declared = primary_key(con, table)
+            assert declared == [key], f"❌ Clé primaire de '{table}' : {declared or 'aucune'} (attendu : {key})"
+            logger.success(f"✅ Aucune duplication possible sur '{table}' (clé primaire = {key})")
+
+        # 🔗 Index de jointure de la fusion (liaison_dedup.id_web)
+        expected_index = index_name("liaison_dedup", "id_web")
+        assert expected_index in indexes(con, "liaison_dedup"), f"❌ Index manquant : {expected_index}"
+        logger.success("✅ Index présent sur 'liaison_dedup' (id_web)")
 
         logger.success("🎯 Test d’unicité post-dédoublonnage validé avec succès.")
 
@@ -1,6 +1,8 @@
 # === Script de test 09 - Validation de la fusion des données ===
 # Ce script vérifie que la table 'fusion' existe, contient exactement 714 lignes,
-# et inclut bien toutes les colonnes critiques nécessaires aux étapes suivantes.
+# et inclut bien toutes les colonnes critiques nécessaires aux étapes suivantes,
+# puis que chaque export (fichier, ou dossier partitionné avec FUSION_PARTITION_BY)
+# se relit avec les 714 lignes.
 
 import os
 import sys
@@ -9,6 +11,9 @@ from pathlib import Path
 from loguru import logger
 import warnings
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from interchange import count_rows, data_file, export_formats  # noqa: E402
+
 warnings.filterwarnings("ignore")
 
 # ==============================================================================
@@ -48,6 +53,13 @@ def main():
             assert col in columns, f"❌ Colonne manquante dans fusion : {col}"
         logger.success("✅ Toutes les colonnes critiques sont présentes : " + ", ".join(colonnes_attendues))
 
+        # 📁 Exports relus (fichier unique ou dossier partitionné)
+        for fmt in export_formats():
+            path = Path("/opt/airflow/data/outputs") / data_file("fusion", fmt)
+            nb_export = count_rows(con, path)
+            assert nb_export == 714, f"❌ Export {path} : {nb_export} lignes (attendu : 714)"
+            logger.success(f"✅ Export {path}{' (partitionné)' if path.is_dir() else ''} : {nb_export} lignes")
+
         logger.success("🎯 Test de validation de la table fusion passé avec succès.")
 
     except Exception as e:
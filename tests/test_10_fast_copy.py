@@ -0,0 +1,93 @@
+# === Script de test 10 - Validation des stratégies de copie rapide ===
+# Ce script vérifie, sur un fichier temporaire, que chaque stratégie de fast_copy.py
+# supportée par le système de fichiers produit une copie identique (contenu et dates),
+# et que la chaîne de repli passe à la stratégie suivante lorsqu'une stratégie
+# échoue (reflink sur ext4/tmpfs, ou stratégie forcée en échec).
+# FAST_COPY_TEST_DIR permet de viser un montage XFS/Btrfs (ex. loopback) pour tester le reflink.
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+import fast_copy  # noqa: E402
+from fast_copy import STRATEGIES, copy_file  # noqa: E402
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_10_fast_copy.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🧪 Fonction principale : stratégies et chaîne de repli
+# ==============================================================================
+def main():
+    try:
+        with tempfile.TemporaryDirectory(dir=os.getenv("FAST_COPY_TEST_DIR")) as tmp:
+            source = Path(tmp) / "source.bin"
+            content = os.urandom(3 * 1024 * 1024 + 123)
+            source.write_bytes(content)
+            os.utime(source, (1_700_000_000, 1_700_000_000))
+
+            # 📄 Chaque stratégie disponible copie à l'identique
+            for strategy in STRATEGIES:
+                target = Path(tmp) / f"copy_{strategy}.bin"
+                try:
+                    used, seconds = copy_file(source, target, strategies=(strategy,))
+                except OSError as e:
+                    logger.info(f"⏭️ {strategy} non supportée ici : {e}")
+                    continue
+                assert used == strategy, f"❌ Stratégie {used} utilisée (attendu : {strategy})"
+                assert target.read_bytes() == content, f"❌ Contenu différent avec {strategy}"
+                assert target.stat().st_mtime == source.stat().st_mtime, f"❌ Date non conservée avec {strategy}"
+                logger.success(f"✅ {strategy} : copie identique en {seconds * 1000:.1f} ms")
+
+            # 🔁 Repli : une stratégie en échec passe la main à la suivante
+            def failing(src, dst, size):
+                os.write(dst, b"partiel")
+                raise OSError("échec simulé")
+
+            fast_copy._IMPLEMENTATIONS["failing"] = failing
+            try:
+                target = Path(tmp) / "copy_fallback.bin"
+                used, _ = copy_file(source, target, strategies=("failing", "buffered"))
+                assert used == "buffered", f"❌ Repli sur {used} (attendu : buffered)"
+                assert target.read_bytes() == content, "❌ Copie de repli incorrecte (reste de l'échec ?)"
+            finally:
+                del fast_copy._IMPLEMENTATIONS["failing"]
+            logger.success("✅ Repli vers la stratégie suivante après un échec.")
+
+            # 🧬 Chaîne complète : la première stratégie supportée est retenue
+            used, seconds = copy_file(source, Path(tmp) / "copy_chain.bin")
+            assert Path(tmp, "copy_chain.bin").read_bytes() == content, "❌ Contenu différent (chaîne complète)"
+            logger.success(f"✅ Chaîne complète : stratégie {used} en {seconds * 1000:.1f} ms")
+
+            # 🚫 Aucune stratégie valide : erreur explicite, destination intacte
+            try:
+                copy_file(source, Path(tmp) / "copy_none.bin", strategies=("inconnue",))
+                raise AssertionError("❌ Stratégie inconnue acceptée")
+            except ValueError:
+                pass
+            assert not Path(tmp, "copy_none.bin").exists(), "❌ Fichier créé malgré l'échec"
+            logger.success("✅ Stratégie inconnue refusée sans fichier résiduel.")
+
+        logger.success("🎯 Test des stratégies de copie passé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test des stratégies de copie : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
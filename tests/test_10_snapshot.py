@@ -0,0 +1,121 @@
+# === Script de test 10 - Validation du snapshot incrémental DuckDB ===
+# Ce script vérifie le dernier snapshot d'après son propre manifeste (la base a pu
+# évoluer depuis) : objets Parquet présents et complets, restauration dans une base
+# vierge conforme aux empreintes, DDL (clés primaires) et index enregistrés, et
+# empreintes connues du magasin (aucune réexportation d'un contenu inchangé).
+# Avec SNAPSHOT_MODE=clone, il vérifie que les tables amont (scripts 05 à 09) du dernier
+# clone ont le même contenu que la base.
+
+import os
+import sys
+import duckdb
+import tempfile
+from pathlib import Path
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from snapshot_store import (  # noqa: E402
+    SNAPSHOT_MODE, known_objects, list_indexes, list_tables, objects_dir, resolve_clone, resolve_snapshot,
+    restore_snapshot, table_fingerprint,
+)
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_10_snapshot.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# Tables produites en amont du snapshot (scripts 05 à 09), que tout snapshot doit
+# contenir ; les scripts 11 et 12 ajoutent ou recréent d'autres tables après lui.
+SNAPSHOT_TABLES = [
+    "erp_clean", "web_clean", "liaison_clean",
+    "erp_quarantine", "web_quarantine", "liaison_quarantine",
+    "erp_dedup", "web_dedup", "liaison_dedup",
+    "fusion",
+]
+
+# ==============================================================================
+# 🧪 Fonction principale : snapshot, réutilisation et restauration
+# ==============================================================================
+def main():
+    try:
+        con = duckdb.connect("/opt/airflow/data/bottleneck.duckdb")
+        logger.info("🧪 Connexion à DuckDB établie.")
+    except Exception as e:
+        logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
+        sys.exit(1)
+
+    try:
+        if SNAPSHOT_MODE == "clone":
+            check_clone(con)
+            return
+
+        # 📸 Le dernier snapshot : objets Parquet présents et complets (d'après son manifeste,
+        #    la base ayant pu évoluer depuis, cf. scripts 11 et 12)
+        manifest = resolve_snapshot()
+        tables = manifest["tables"]
+        missing = [t for t in SNAPSHOT_TABLES if t not in tables]
+        assert not missing, f"❌ Tables absentes du snapshot {manifest['id']} : {missing}"
+        for table, entry in tables.items():
+            path = objects_dir() / entry["object"]
+            assert path.exists(), f"❌ Objet manquant pour {table}"
+            nb_rows = con.execute(f"SELECT COUNT(*) FROM read_parquet('{path.as_posix()}')").fetchone()[0]
+            assert entry["rows"] == nb_rows, f"❌ {table} : {nb_rows} lignes dans l'objet (manifeste : {entry['rows']})"
+        logger.success(f"✅ Snapshot {manifest['id']} : {len(tables)} tables présentes et complètes.")
+
+        # 🔁 Restauration dans une base vierge : contenu, DDL (clés primaires) et index du manifeste
+        known = known_objects()
+        with tempfile.TemporaryDirectory() as tmp:
+            restored_con = duckdb.connect(str(Path(tmp) / "restored.duckdb"))
+            restore_snapshot(restored_con, manifest)
+            restored_ddl = dict(list_tables(restored_con))
+            assert set(restored_ddl) == set(tables), \
+                f"❌ Tables restaurées {sorted(restored_ddl)} ≠ snapshot {sorted(tables)}"
+            for table, entry in tables.items():
+                assert restored_ddl[table] == entry["sql"], f"❌ DDL (clé primaire) non restauré pour {table}"
+                fingerprint, nb_rows = table_fingerprint(restored_con, table, entry["sql"])
+                assert (fingerprint, nb_rows) == (entry["fingerprint"], entry["rows"]), \
+                    f"❌ Contenu restauré différent pour {table}"
+                expected_indexes = sorted(i["sql"] for i in manifest.get("indexes", []) if i["table"] == table)
+                actual_indexes = sorted(i["sql"] for i in list_indexes(restored_con) if i["table"] == table)
+                assert actual_indexes == expected_indexes, f"❌ Index non restaurés pour {table}"
+            restored_con.close()
+        logger.success("✅ Restauration conforme : contenu, clés primaires et index identiques au snapshot.")
+
+        # ♻️ Contenu inchangé : un nouveau snapshot réutiliserait tous les objets
+        unknown = [t for t, entry in tables.items() if entry["fingerprint"] not in known]
+        assert not unknown, f"❌ Tables qui seraient réexportées sans modification : {unknown}"
+        logger.success(f"✅ Empreintes connues du magasin : {len(tables)} tables réutilisables sans export.")
+
+        logger.success("🎯 Test de validation du snapshot passé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test du snapshot : {e}")
+        sys.exit(1)
+
+
+def check_clone(con):
+    clone = resolve_clone()
+    clone_con = duckdb.connect(str(clone), read_only=True)
+    clone_tables = dict(list_tables(clone_con))
+    missing = [t for t in SNAPSHOT_TABLES if t not in clone_tables]
+    assert not missing, f"❌ Tables absentes du clone {clone.name} : {missing}"
+    for table in SNAPSHOT_TABLES:
+        ddl = clone_tables[table]
+        assert table_fingerprint(clone_con, table, ddl) == table_fingerprint(con, table, ddl), \
+            f"❌ Contenu du clone différent pour {table}"
+    clone_con.close()
+    logger.success(f"✅ Clone {clone.name} identique à la base pour les {len(SNAPSHOT_TABLES)} tables amont.")
+    logger.success("🎯 Test de validation du snapshot passé avec succès.")
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
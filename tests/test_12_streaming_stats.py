@@ -0,0 +1,77 @@
+# === Script de test 12 - Validation des statistiques en streaming (Welford) ===
+# Ce script vérifie que la moyenne et l'écart-type calculés par lots Arrow
+# (streaming_stats.py), sur un ou plusieurs processus, sont identiques à ceux de
+# DuckDB sur la table fusion, et que la fusion de moments reste numériquement
+# stable sur des valeurs de grande magnitude (là où la formule naïve échoue).
+
+import os
+import sys
+import numpy as np
+from pathlib import Path
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from streaming_stats import (  # noqa: E402
+    EMPTY_MOMENTS, batch_moments, connect, merge_moments, parallel_moments, std,
+)
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_12_streaming_stats.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+DUCKDB_PATH = Path("/opt/airflow/data/bottleneck.duckdb")
+
+# ==============================================================================
+# 🧪 Fonction principale : streaming vs DuckDB, stabilité numérique
+# ==============================================================================
+def main():
+    try:
+        con = connect(DUCKDB_PATH)
+        n_ref, mean_ref, std_ref = con.execute(
+            "SELECT COUNT(price), AVG(price), STDDEV_SAMP(price) FROM fusion"
+        ).fetchone()
+        con.close()
+
+        # 🌊 Lots de tailles variées, 1 ou plusieurs processus : mêmes moments que DuckDB
+        for workers, batch_size in [(1, 65536), (1, 7), (3, 50)]:
+            moments = parallel_moments(DUCKDB_PATH, "fusion", "price", workers=workers, batch_size=batch_size)
+            assert moments[0] == n_ref, f"❌ n={moments[0]} (attendu : {n_ref})"
+            assert abs(moments[1] - mean_ref) < 1e-9, f"❌ Moyenne {moments[1]} (attendu : {mean_ref})"
+            assert abs(std(moments) - std_ref) < 1e-9, f"❌ Écart-type {std(moments)} (attendu : {std_ref})"
+            logger.success(f"✅ {workers} processus, lots de {batch_size} : n={n_ref}, moyenne et écart-type exacts.")
+
+        # 🔢 Stabilité : valeurs ~1e9 à faible dispersion, fusionnées par petits lots
+        rng = np.random.default_rng(42)
+        values = 1e9 + rng.normal(0, 1, 100_000)
+        moments = EMPTY_MOMENTS
+        for chunk in np.array_split(values, 997):
+            moments = merge_moments(moments, batch_moments(chunk))
+        expected = values.std(ddof=1)
+        assert abs(std(moments) - expected) / expected < 1e-6, \
+            f"❌ Écart-type instable : {std(moments)} (attendu : {expected})"
+        logger.success(f"✅ Fusion stable sur valeurs de grande magnitude (écart-type {std(moments):.6f}).")
+
+        # ➕ Fusion avec un jeu vide : élément neutre
+        assert merge_moments(EMPTY_MOMENTS, moments) == moments == merge_moments(moments, EMPTY_MOMENTS), \
+            "❌ Les moments vides ne sont pas neutres pour la fusion"
+        logger.success("✅ Moments vides neutres pour la fusion.")
+
+        logger.success("🎯 Test des statistiques en streaming passé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test des statistiques en streaming : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# === Script de test 12 - Validation des scores d'anomalie segmentés ===
+# Ce script vérifie les tables outlier_stats et outlier_scores produites par le script 12 :
+# chaque segmentation couvre tous les vins avec un prix, les statistiques par segment
+# sont cohérentes, le Z-score global correspond au calcul direct (30 millésimés)
+# et les indicateurs d'anomalie respectent les seuils configurés.
+# Le test est ignoré si le script 12 n'a pas calculé les scores (OUTLIER_SCORING=0).
+
+import os
+import sys
+import duckdb
+import importlib.util
+from pathlib import Path
+from loguru import logger
+
+SCRIPTS_PATH = Path(__file__).resolve().parents[1] / "scripts"
+sys.path.insert(0, str(SCRIPTS_PATH))
+from outlier_scoring import OUTLIER_THRESHOLDS, SEGMENTATIONS, outlier_sql  # noqa: E402
+
+_spec = importlib.util.spec_from_file_location("calcul_zscore", SCRIPTS_PATH / "12_calcul_zscore_upload.py")
+calcul_zscore = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(calcul_zscore)
+
+# ==============================================================================
+# 🔧 Initialisation des logs
+# ==============================================================================
+AIRFLOW_LOG_PATH = os.getenv("AIRFLOW_LOG_PATH", "logs")
+LOGS_PATH = Path(AIRFLOW_LOG_PATH)
+LOGS_PATH.mkdir(parents=True, exist_ok=True)
+
+LOG_FILE = LOGS_PATH / "test_12_validate_outliers.log"
+logger.remove()
+logger.add(sys.stdout, level="INFO")
+logger.add(LOG_FILE, level="INFO", rotation="500 KB")
+
+# ==============================================================================
+# 🧪 Fonction principale : tests des tables de scores
+# ==============================================================================
+def main():
+    if not calcul_zscore.OUTLIER_SCORING:
+        logger.info("⏭️ Scores d'anomalie non calculés par le script 12 (OUTLIER_SCORING=0) : test ignoré.")
+        return
+
+    try:
+        con = duckdb.connect("/opt/airflow/data/bottleneck.duckdb", read_only=True)
+        logger.info("🧪 Connexion à DuckDB établie.")
+    except Exception as e:
+        logger.error(f"❌ Erreur de connexion à DuckDB : {e}")
+        sys.exit(1)
+
+    try:
+        nb_prix = con.execute("SELECT COUNT(*) FROM fusion WHERE price IS NOT NULL").fetchone()[0]
+
+        # 🧱 Couverture : chaque segmentation score tous les vins, une fois
+        for segmentation in SEGMENTATIONS:
+            nb_scores, nb_produits, nb_stats = con.execute("""
+                SELECT COUNT(*), COUNT(DISTINCT product_id),
+                       (SELECT SUM(n) FROM outlier_stats WHERE segmentation = $1)
+                FROM outlier_scores WHERE segmentation = $1
+            """, [segmentation]).fetchone()
+            assert nb_scores == nb_produits == nb_stats == nb_prix, \
+                f"❌ {segmentation} : {nb_scores} scores, {nb_stats} dans les stats (attendu : {nb_prix})"
+        logger.success(f"✅ {len(SEGMENTATIONS)} segmentations couvrant chacune {nb_prix} vins.")
+
+        # 📐 Z-score global identique au calcul direct ; millésimés en queue haute (classement du script 12)
+        millesime = outlier_sql("s.score_zscore", OUTLIER_THRESHOLDS["zscore"], calcul_zscore.MILLESIME_TAIL)
+        ecart_max, nb_millesimes = con.execute(f"""
+            SELECT MAX(abs(s.score_zscore - d.z)), COUNT(*) FILTER (WHERE {millesime})
+            FROM outlier_scores s
+            JOIN (
+                SELECT product_id, (price - AVG(price) OVER ()) / STDDEV_SAMP(price) OVER () AS z
+                FROM fusion WHERE price IS NOT NULL
+            ) d USING (product_id)
+            WHERE s.segmentation = 'global'
+        """).fetchone()
+        assert ecart_max < 1e-9, f"❌ Z-score global différent du calcul direct (écart max : {ecart_max})"
+        assert nb_millesimes == 30, f"❌ {nb_millesimes} millésimés en Z-score global (attendu : 30)"
+        logger.success("✅ Z-score global conforme : 30 vins millésimés.")
+
+        # 🎯 Indicateurs cohérents avec les scores et les seuils ; IQR nul entre les quartiles
+        for method, threshold in OUTLIER_THRESHOLDS.items():
+            incoherents = con.execute(f"""
+                SELECT COUNT(*) FROM outlier_scores
+                WHERE outlier_{method} AND NOT {outlier_sql(f"score_{method}", threshold, "both")}
+            """).fetchone()[0]
+            assert incoherents == 0, f"❌ {incoherents} indicateur(s) {method} sans dépassement du seuil {threshold}"
+        hors_zero = con.execute("""
+            SELECT COUNT(*) FROM outlier_scores s JOIN outlier_stats t USING (segmentation, segment)
+            WHERE s.price BETWEEN t.q1 AND t.q3 AND s.score_iqr <> 0
+        """).fetchone()[0]
+        assert hors_zero == 0, f"❌ {hors_zero} score(s) IQR non nuls entre Q1 et Q3"
+        logger.success("✅ Indicateurs d'anomalie cohérents avec les seuils.")
+
+        logger.success("🎯 Test de validation des scores d'anomalie passé avec succès.")
+
+    except Exception as e:
+        logger.error(f"❌ Échec du test des scores d'anomalie : {e}")
+        sys.exit(1)
+
+# ==============================================================================
+# 🚀 Lancement
+# ==============================================================================
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-# === Script de test 12 - Validation du fichier vins_millesimes.csv ===
+# === Script de test 12 - Validation du fichier vins_millesimes (CSV ou Parquet) ===
 # Ce script teste que le fichier contenant les vins millésimés a bien été généré,
 # qu’il contient exactement 30 lignes, et que les colonnes 'price' et 'z_score'
 # ne contiennent ni valeurs nulles, ni infinies.
@@ -9,6 +9,9 @@ import pandas as pd
 from pathlib import Path
 from loguru import logger
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+from interchange import data_file  # noqa: E402
+
 # ==============================================================================
 # 🔧 Configuration des chemins de logs
 # ==============================================================================
@@ -25,15 +28,15 @@ logger.add(LOG_FILE, level="INFO", rotation="500 KB")
 # 🧪 Fonction principale : tests de validation du Z-score
 # ==============================================================================
 def main():
-    path = Path("/opt/airflow/data/outputs/vins_millesimes.csv")
+    path = Path("/opt/airflow/data/outputs") / data_file("vins_millesimes")
 
     # 📁 Vérification de la présence du fichier
     if not path.exists():
-        logger.error("❌ Fichier manquant : vins_millesimes.csv introuvable.")
+        logger.error(f"❌ Fichier manquant : {path.name} introuvable.")
         sys.exit(1)
 
     try:
-        df = pd.read_csv(path)
+        df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
         nb_lignes = df.shape[0]
         logger.info(f"📄 Fichier chargé : {nb_lignes} lignes")
 
@@ -51,7 +54,7 @@ def main():
 
             logger.success(f"✅ Colonne '{col}' : pas de NaN, pas d'inf.")
 
-        logger.success("🎯 Test de validation du fichier vins_millesimes.csv terminé avec succès.")
+        logger.success(f"🎯 Test de validation du fichier {path.name} terminé avec succès.")
 
     except Exception as e:
         logger.error(f"❌ Erreur lors du test de validation Z-score : {e}")